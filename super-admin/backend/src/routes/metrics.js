@@ -1,5 +1,6 @@
 const express = require('express');
 const { register, getWebMetricsService } = require('../services/metricsService');
+const { AgentPayloadDecoder, PayloadError } = require('../services/agentPayloadDecoder');
 
 // Función para obtener el Map de agentes activos (para evitar dependencias circulares)
 const getActiveAgents = () => {
@@ -54,57 +55,92 @@ router.get('/metrics/json', async (req, res) => {
   }
 });
 
+// Formato de los lotes multiciclo enviados por los agentes (varios ciclos por petición)
+const BATCH_FORMAT = 'zienshield-batch';
+
+// Estado por agente de los payloads incrementales (keyframe + delta)
+const payloadDecoder = new AgentPayloadDecoder();
+
+// Registrar un ciclo de métricas de un agente y reenviarlo a Prometheus
+const processAgentMetrics = (metrics) => {
+  console.log(`📈 Métricas de ${metrics.agent_id}${metrics.timestamp ? ` (${metrics.timestamp})` : ''}:`);
+  console.log(`   - Conexiones: ${metrics.total_connections || 0}`);
+  console.log(`   - Dominios: ${metrics.total_domains || 0}`);
+  console.log(`   - Navegadores: ${metrics.active_browsers || 0}`);
+  
+  if (metrics.top_domains && metrics.top_domains.length > 0) {
+    console.log(`   - Top dominio: ${metrics.top_domains[0][0]} (${metrics.top_domains[0][1]} conexiones)`);
+  }
+
+  // NUEVO: Registrar/actualizar agente activo en el Map para el dashboard
+  const activeAgents = getActiveAgents();
+  activeAgents.set(metrics.agent_id, {
+    agent_id: metrics.agent_id,
+    hostname: metrics.hostname || metrics.agent_id,
+    username: metrics.username || 'unknown',
+    status: 'active',
+    last_seen: new Date().toISOString(),
+    last_metrics: metrics,
+    os_info: metrics.os_info || { 
+      system: 'Windows',
+      release: 'Unknown'
+    }
+  });
+  
+  console.log(`✅ Agente ${metrics.agent_id} registrado en activeAgents`);
+
+  // Procesar métricas para Prometheus
+  const webService = getWebMetricsService();
+  if (webService && webService.parser) {
+    // Emitir evento para actualizar métricas Prometheus
+    webService.parser.emit('webTrafficData', metrics);
+    console.log('📊 Métricas enviadas al servicio Prometheus');
+  } else {
+    console.log('⚠️ Servicio de métricas web no disponible aún');
+  }
+};
+
 // Endpoint público para recibir métricas de agentes (sin autenticación)
 router.post('/agent-metrics', async (req, res) => {
   try {
     console.log('📊 Recibiendo métricas de agente (público)...');
     
-    const metrics = req.body;
+    const body = req.body || {};
+    
+    // Un lote trae los ciclos en orden, cada uno con su propio timestamp
+    const received = body.format === BATCH_FORMAT && Array.isArray(body.cycles) ? body.cycles : [body];
+    
+    // Todos los ciclos a v1 antes de procesar ninguno: un delta sin su base
+    // rechaza la petición entera y el agente la reenvía empezando por un keyframe
+    let cycles;
+    try {
+      cycles = received.map((cycle) => payloadDecoder.decode(cycle));
+    } catch (error) {
+      if (!(error instanceof PayloadError)) {
+        throw error;
+      }
+      console.warn(`⚠️ Payload rechazado (${error.code}): ${error.message}`);
+      return res.status(error.status).json({
+        success: false,
+        error: error.message,
+        code: error.code
+      });
+    }
     
     // Validar datos básicos
-    if (!metrics.agent_id) {
+    if (cycles.length === 0 || cycles.some((metrics) => !metrics || !metrics.agent_id)) {
       return res.status(400).json({
         success: false,
         error: 'agent_id es requerido'
       });
     }
 
-    console.log(`📈 Métricas de ${metrics.agent_id}:`);
-    console.log(`   - Conexiones: ${metrics.total_connections || 0}`);
-    console.log(`   - Dominios: ${metrics.total_domains || 0}`);
-    console.log(`   - Navegadores: ${metrics.active_browsers || 0}`);
-    
-    if (metrics.top_domains && metrics.top_domains.length > 0) {
-      console.log(`   - Top dominio: ${metrics.top_domains[0][0]} (${metrics.top_domains[0][1]} conexiones)`);
-    }
-
-    // NUEVO: Registrar/actualizar agente activo en el Map para el dashboard
-    const activeAgents = getActiveAgents();
-    activeAgents.set(metrics.agent_id, {
-      agent_id: metrics.agent_id,
-      hostname: metrics.hostname || metrics.agent_id,
-      username: metrics.username || 'unknown',
-      status: 'active',
-      last_seen: new Date().toISOString(),
-      last_metrics: metrics,
-      os_info: metrics.os_info || { 
-        system: 'Windows',
-        release: 'Unknown'
-      }
-    });
-    
-    console.log(`✅ Agente ${metrics.agent_id} registrado en activeAgents`);
-
-    // Procesar métricas para Prometheus
-    const webService = getWebMetricsService();
-    if (webService && webService.parser) {
-      // Emitir evento para actualizar métricas Prometheus
-      webService.parser.emit('webTrafficData', metrics);
-      console.log('📊 Métricas enviadas al servicio Prometheus');
-    } else {
-      console.log('⚠️ Servicio de métricas web no disponible aún');
+    if (cycles.length > 1) {
+      console.log(`📦 Lote de ${cycles.length} ciclos de ${body.agent_id || cycles[0].agent_id}`);
     }
+    cycles.forEach(processAgentMetrics);
 
+    const metrics = cycles[cycles.length - 1];
     res.json({
       success: true,
       message: 'Métricas recibidas correctamente',
@@ -112,7 +148,8 @@ router.post('/agent-metrics', async (req, res) => {
       processed: {
         agent_id: metrics.agent_id,
         connections: metrics.total_connections || 0,
-        domains: metrics.total_domains || 0
+        domains: metrics.total_domains || 0,
+        cycles: cycles.length
       }
     });
 
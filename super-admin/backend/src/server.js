@@ -86,7 +86,7 @@ app.use('*', (req, res) => {
 });
 
 // Iniciar servidor
-app.listen(PORT, "0.0.0.0", () => {
+const server = app.listen(PORT, "0.0.0.0", () => {
   console.log(`🚀 ZienSHIELD Super Admin Backend funcionando en puerto ${PORT}`);
   console.log(`📊 Dashboard disponible en: http://localhost:${PORT}/api/health`);
   console.log(`🔗 Frontend URL configurada: ${process.env.FRONTEND_URL}`);
@@ -95,4 +95,8 @@ app.listen(PORT, "0.0.0.0", () => {
   startVulnerabilityUpdateService();
 });
 
+// Keep-alive más largo que el intervalo de los agentes (30 s) para que reutilicen la conexión
+server.keepAliveTimeout = parseInt(process.env.KEEP_ALIVE_TIMEOUT_MS, 10) || 65000;
+server.headersTimeout = server.keepAliveTimeout + 1000;
+
 module.exports = app;
@@ -0,0 +1,287 @@
+/**
+ * Decodificación de los payloads de /agent-metrics al formato v1
+ * Keyframes y deltas (zienshield-delta) y payloads compactos v2
+ * (zienshield-slim), con estado por agente; los ciclos sin "format" ya están
+ * en v1. Equivale a zienshield_agent/delta.py y zienshield_agent/slim.py
+ */
+
+const DELTA_FORMAT = 'zienshield-delta';
+const DELTA_VERSION = 1;
+const SLIM_FORMAT = 'zienshield-slim';
+const SLIM_VERSION = 2;
+
+// Columnas cuyas cadenas viajan como índices del diccionario de sesión
+const STRING_COLUMNS = ['category', 'browser', 'name', 'cmdline'];
+const STRING_LIST_COLUMNS = ['processes'];
+const STRING_KEY_COLUMNS = ['bytes_by_process'];
+
+/**
+ * Error de payload con el código HTTP que debe devolver la ruta
+ * (422: formato desconocido, 409: falta el estado previo y el agente debe resincronizar)
+ */
+class PayloadError extends Error {
+  constructor(message, status, code) {
+    super(message);
+    this.name = 'PayloadError';
+    this.status = status;
+    this.code = code;
+  }
+}
+
+/**
+ * Top dominios por conexiones (desempate alfabético), como get_top_domains del agente
+ */
+function getTopDomains(domainStats, limit = 10) {
+  return Object.entries(domainStats)
+    .map(([domain, stats]) => [domain, stats.connections])
+    .sort((a, b) => (b[1] - a[1]) || (a[0] < b[0] ? -1 : a[0] > b[0] ? 1 : 0))
+    .slice(0, limit);
+}
+
+/**
+ * Dominios y conexiones por categoría, como get_category_summary del agente
+ */
+function getCategorySummary(domainStats) {
+  const categories = {};
+  Object.values(domainStats).forEach((stats) => {
+    const summary = categories[stats.category] || (categories[stats.category] = { domains: 0, connections: 0 });
+    summary.domains += 1;
+    summary.connections += stats.connections;
+  });
+  return categories;
+}
+
+const flowKey = (key) => JSON.stringify(key);
+
+/**
+ * Valor v1 de un agregado que el payload v2 omite por ser derivable
+ */
+function derivedValue(field, domainStats, browserProcesses, topDomainsLimit = 10) {
+  switch (field) {
+    case 'top_domains':
+      return getTopDomains(domainStats, topDomainsLimit);
+    case 'categories_summary':
+    case 'category_summary':
+      return getCategorySummary(domainStats);
+    case 'total_domains':
+      return Object.keys(domainStats).length;
+    case 'total_bytes_sent':
+    case 'total_bytes_recv': {
+      const key = field.slice('total_'.length);
+      return Object.values(domainStats).reduce((sum, stats) => sum + (stats[key] || 0), 0);
+    }
+    case 'active_browsers':
+      // Windows agrega los procesos por navegador en process_count
+      if (browserProcesses.length && browserProcesses.every((browser) => 'process_count' in browser)) {
+        return browserProcesses.reduce((sum, browser) => sum + browser.process_count, 0);
+      }
+      return browserProcesses.length;
+    case 'browser_types':
+      return browserProcesses.length;
+    default:
+      throw new PayloadError(`Agregado derivado desconocido: ${field}`, 422, 'unsupported_format');
+  }
+}
+
+const isIndex = (value) => Number.isInteger(value);
+
+function decodeValue(key, value, strings) {
+  if (STRING_COLUMNS.includes(key) && isIndex(value)) {
+    return strings[value];
+  }
+  if (STRING_LIST_COLUMNS.includes(key) && Array.isArray(value) && value.every(isIndex)) {
+    return value.map((index) => strings[index]);
+  }
+  if (STRING_KEY_COLUMNS.includes(key) && Array.isArray(value)) {
+    return Object.fromEntries(value.map(([index, count]) => [strings[index], count]));
+  }
+  return value;
+}
+
+/**
+ * Filas a partir de columnas; "missing" indica qué filas no tienen un campo
+ */
+function decodeRows(encoded, strings) {
+  const missing = {};
+  Object.entries(encoded.missing || {}).forEach(([key, indexes]) => { missing[key] = new Set(indexes); });
+  const rows = [];
+  for (let index = 0; index < encoded.count; index += 1) {
+    const row = {};
+    Object.entries(encoded.columns).forEach(([key, column]) => {
+      if (!(missing[key] && missing[key].has(index))) {
+        row[key] = decodeValue(key, column[index], strings);
+      }
+    });
+    rows.push(row);
+  }
+  return rows;
+}
+
+/**
+ * Sesión v2 de un agente: diccionario de cadenas y datos del host
+ */
+class SlimExpander {
+  constructor() {
+    this.session = null;
+    this.sequence = null;
+    this.strings = [];
+    this.host = {};
+  }
+
+  expand(payload) {
+    if (payload.version !== SLIM_VERSION) {
+      throw new PayloadError(`Versión de payload compacto no soportada: ${payload.version}`, 422, 'unsupported_format');
+    }
+
+    const strings = payload.strings;
+    if (payload.session !== this.session) {
+      if (payload.sequence !== 1 || strings.base !== 0) {
+        throw new PayloadError(
+          `Sesión ${payload.session} recibida a partir de la secuencia ${payload.sequence}`, 409, 'resync_required'
+        );
+      }
+      this.session = payload.session;
+      this.strings = [];
+      this.host = {};
+    } else if (payload.sequence !== this.sequence + 1 || strings.base !== this.strings.length) {
+      throw new PayloadError(
+        `Payload ${payload.sequence} de la sesión ${this.session} tras la secuencia ${this.sequence}`,
+        409, 'resync_required'
+      );
+    }
+    this.strings.push(...strings.add);
+    this.sequence = payload.sequence;
+    if (payload.host) {
+      this.host = { ...payload.host };
+    }
+
+    const metrics = {
+      timestamp: payload.timestamp,
+      agent_id: payload.agent_id,
+      ...this.host,
+      ...payload.fields
+    };
+    let domainStats = {};
+    let browserProcesses = [];
+    if (payload.domains) {
+      const rows = decodeRows(payload.domains, this.strings);
+      domainStats = {};
+      payload.domains.keys.forEach((index, position) => { domainStats[this.strings[index]] = rows[position]; });
+      metrics.domain_stats = domainStats;
+    }
+    if (payload.browsers) {
+      browserProcesses = decodeRows(payload.browsers, this.strings);
+      metrics.browser_processes = browserProcesses;
+    }
+    const limit = payload.top_domains_limit || 10;
+    (payload.derived || []).forEach((field) => {
+      metrics[field] = derivedValue(field, domainStats, browserProcesses, limit);
+    });
+    return metrics;
+  }
+}
+
+/**
+ * Estado de keyframe + deltas de un agente
+ */
+class DeltaDecoder {
+  constructor() {
+    this.sequence = null;
+    this.topDomainsLimit = 10;
+    this.fields = {};
+    this.domainStats = {};
+    this.browserProcesses = [];
+    this.flows = new Map();
+  }
+
+  apply(payload) {
+    if (payload.version !== DELTA_VERSION) {
+      throw new PayloadError(`Versión de delta no soportada: ${payload.version}`, 422, 'unsupported_format');
+    }
+
+    if (payload.type === 'keyframe') {
+      this.topDomainsLimit = payload.top_domains_limit || 10;
+      this.fields = { ...payload.fields };
+      this.domainStats = { ...payload.domain_stats };
+      this.browserProcesses = [...(payload.browser_processes || [])];
+      this.flows = new Map((payload.flows || []).map((flow) => [flowKey(flow.key), flow]));
+    } else if (payload.type === 'delta') {
+      if (this.sequence === null || payload.base_sequence !== this.sequence) {
+        throw new PayloadError(
+          `Delta ${payload.sequence} requiere la secuencia ${payload.base_sequence}, última aplicada: ${this.sequence}`,
+          409, 'resync_required'
+        );
+      }
+      Object.assign(this.fields, payload.fields);
+      (payload.domains_removed || []).forEach((domain) => { delete this.domainStats[domain]; });
+      Object.assign(this.domainStats, payload.domains_changed);
+      if (payload.browser_processes) {
+        this.browserProcesses = [...payload.browser_processes];
+      }
+      (payload.flows_closed || []).forEach((key) => this.flows.delete(flowKey(key)));
+      (payload.flows_opened || []).forEach((flow) => this.flows.set(flowKey(flow.key), flow));
+    } else {
+      throw new PayloadError(`Tipo de payload desconocido: ${payload.type}`, 422, 'unsupported_format');
+    }
+
+    this.sequence = payload.sequence;
+    return this.getMetrics();
+  }
+
+  getMetrics() {
+    return {
+      ...this.fields,
+      domain_stats: { ...this.domainStats },
+      browser_processes: [...this.browserProcesses],
+      top_domains: getTopDomains(this.domainStats, this.topDomainsLimit),
+      categories_summary: getCategorySummary(this.domainStats)
+    };
+  }
+}
+
+/**
+ * Decodificadores por agente: el estado de un agente no afecta a los demás
+ */
+class AgentPayloadDecoder {
+  constructor() {
+    this.deltaDecoders = new Map();
+    this.slimExpanders = new Map();
+  }
+
+  /**
+   * Ciclo en formato v1 a partir de un ciclo tal como lo envía el agente
+   */
+  decode(cycle) {
+    if (!cycle || cycle.format === undefined) {
+      return cycle;
+    }
+    if (cycle.format === DELTA_FORMAT) {
+      if (!cycle.agent_id) {
+        return cycle;
+      }
+      if (!this.deltaDecoders.has(cycle.agent_id)) {
+        this.deltaDecoders.set(cycle.agent_id, new DeltaDecoder());
+      }
+      return this.deltaDecoders.get(cycle.agent_id).apply(cycle);
+    }
+    if (cycle.format === SLIM_FORMAT) {
+      if (!cycle.agent_id) {
+        return cycle;
+      }
+      if (!this.slimExpanders.has(cycle.agent_id)) {
+        this.slimExpanders.set(cycle.agent_id, new SlimExpander());
+      }
+      return this.slimExpanders.get(cycle.agent_id).expand(cycle);
+    }
+    throw new PayloadError(`Formato de payload no soportado: ${cycle.format}`, 422, 'unsupported_format');
+  }
+}
+
+module.exports = {
+  AgentPayloadDecoder,
+  DeltaDecoder,
+  SlimExpander,
+  PayloadError,
+  getTopDomains,
+  getCategorySummary
+};
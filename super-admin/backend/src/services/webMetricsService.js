@@ -94,6 +94,37 @@ class WebMetricsService {
       registers: [this.register]
     });
 
+    // 11. Coste del propio agente por fase del ciclo (bloque agent_self)
+    this.agentPhaseGauge = new client.Gauge({
+      name: 'zienshield_web_agent_phase_milliseconds',
+      help: 'Agent cycle time by phase over its recent cycles (p50, p95, max)',
+      labelNames: ['agent', 'phase', 'stat'],
+      registers: [this.register]
+    });
+
+    // 12. CPU y memoria del propio agente
+    this.agentCpuGauge = new client.Gauge({
+      name: 'zienshield_web_agent_cpu_percent',
+      help: 'CPU used by the monitoring agent itself (100 = one core)',
+      labelNames: ['agent'],
+      registers: [this.register]
+    });
+
+    this.agentRssGauge = new client.Gauge({
+      name: 'zienshield_web_agent_rss_bytes',
+      help: 'Resident memory of the monitoring agent itself',
+      labelNames: ['agent'],
+      registers: [this.register]
+    });
+
+    // 13. Nivel de degradación por presupuesto de CPU/RSS del agente
+    this.agentDegradationGauge = new client.Gauge({
+      name: 'zienshield_web_agent_degradation_level',
+      help: 'Agent budget degradation level (0 none, 1 no cmdline, 2 browser-only rDNS, 3 longer interval, 4 smaller caches)',
+      labelNames: ['agent'],
+      registers: [this.register]
+    });
+
     console.log('📊 Métricas web de Prometheus creadas');
   }
 
@@ -193,6 +224,22 @@ class WebMetricsService {
         });
       }
 
+      // Coste del agente: percentiles por fase de sus últimos ciclos
+      const agentSelf = data.agent_self;
+      if (agentSelf && agentSelf.phases_ms) {
+        Object.entries(agentSelf.phases_ms).forEach(([phase, summary]) => {
+          if (!summary || !summary.count) return;
+          ['p50', 'p95', 'max'].forEach((stat) => {
+            this.agentPhaseGauge.set({ agent, phase, stat }, summary[stat] || 0);
+          });
+        });
+        this.agentCpuGauge.set({ agent }, agentSelf.cpu_percent || 0);
+        this.agentRssGauge.set({ agent }, (agentSelf.rss_mb || 0) * 1024 * 1024);
+        if (agentSelf.governor) {
+          this.agentDegradationGauge.set({ agent }, agentSelf.governor.level || 0);
+        }
+      }
+
       console.log(`📊 Métricas actualizadas para agente ${agent}`);
 
     } catch (error) {
@@ -1,12 +1,31 @@
 const fs = require('fs').promises;
 const path = require('path');
+const zlib = require('zlib');
 const { EventEmitter } = require('events');
 
+// Secuencia de una línea del agente ('{"seq":N,...}', con o sin prefijo de texto)
+const SEQUENCE_PATTERN = /^[^{]*\{"seq":(\d+)[,}]/;
+
+const lineSequence = (line) => {
+  const match = SEQUENCE_PATTERN.exec(line);
+  return match ? Number(match[1]) : null;
+};
+
 class WebTrafficParser extends EventEmitter {
-  constructor(logFilePath = '/home/gacel/zienshield-web-traffic.log') {
+  constructor(logFilePath = '/home/gacel/zienshield-web-traffic.log', stateFilePath = null) {
     super();
     this.logFilePath = logFilePath;
+    // Última secuencia procesada, conservada entre reinicios del backend
+    this.stateFilePath = stateFilePath || `${logFilePath}.parser-state`;
+    this.stateWarned = false;
     this.lastProcessedSize = 0;
+    // Lectura incremental: fichero abierto (se conserva tras una rotación hasta
+    // terminar de leerlo), su inodo, línea a medias y última secuencia del agente
+    this.handle = null;
+    this.lastInode = null;
+    this.pendingBytes = Buffer.alloc(0);
+    this.lastSequence = null;
+    this.savedSequence = null;
     this.isWatching = false;
     this.watchInterval = null;
     
@@ -55,16 +74,57 @@ class WebTrafficParser extends EventEmitter {
       clearInterval(this.watchInterval);
       this.watchInterval = null;
     }
+    await this.closeHandle();
+    await this.saveState();
     this.isWatching = false;
     console.log('🛑 Parser de logs detenido');
   }
 
+  async loadState() {
+    try {
+      const state = JSON.parse(await fs.readFile(this.stateFilePath, 'utf8'));
+      if (typeof state.sequence === 'number') {
+        this.lastSequence = state.sequence;
+        this.savedSequence = state.sequence;
+      }
+    } catch (error) {
+      if (error.code !== 'ENOENT') {
+        console.warn(`⚠️ Estado del parser ilegible (${this.stateFilePath}), se procesa el log completo`);
+      }
+    }
+  }
+
+  async saveState() {
+    if (this.lastSequence === this.savedSequence) return;
+    try {
+      await fs.writeFile(`${this.stateFilePath}.tmp`, JSON.stringify({ sequence: this.lastSequence }));
+      await fs.rename(`${this.stateFilePath}.tmp`, this.stateFilePath);
+      this.savedSequence = this.lastSequence;
+    } catch (error) {
+      // Sin permisos junto al log: se sigue funcionando, pero un reinicio volverá a leerlo entero
+      if (!this.stateWarned) {
+        console.warn(`⚠️ No se puede guardar el estado del parser en ${this.stateFilePath}: ${error.message}`);
+        this.stateWarned = true;
+      }
+    }
+  }
+
+  async closeHandle() {
+    if (this.handle) {
+      await this.handle.close();
+      this.handle = null;
+    }
+  }
+
   async processExistingLogs() {
     try {
-      const stats = await fs.stat(this.logFilePath);
-      this.lastProcessedSize = 0; // Procesar todo el archivo
+      await this.loadState();
+      await fs.stat(this.logFilePath);
+      // Procesar todo el archivo; lo ya procesado antes del reinicio se salta por secuencia
+      await this.closeHandle();
+      this.lastProcessedSize = 0;
+      this.lastInode = null;
       await this.processLogFile();
-      this.lastProcessedSize = stats.size;
     } catch (error) {
       if (error.code === 'ENOENT') {
         console.log('ℹ️ Archivo de logs no existe aún, esperando...');
@@ -78,9 +138,9 @@ class WebTrafficParser extends EventEmitter {
     try {
       const stats = await fs.stat(this.logFilePath);
       
-      if (stats.size > this.lastProcessedSize) {
+      // El agente rota el log: fichero nuevo (otro inodo) o más corto que lo ya leído
+      if (stats.ino !== this.lastInode || stats.size !== this.lastProcessedSize) {
         await this.processLogFile();
-        this.lastProcessedSize = stats.size;
       }
     } catch (error) {
       if (error.code !== 'ENOENT') {
@@ -90,25 +150,140 @@ class WebTrafficParser extends EventEmitter {
   }
 
   async processLogFile() {
+    // Leer solo lo añadido desde la última pasada, no el fichero completo
     try {
-      const data = await fs.readFile(this.logFilePath, 'utf8');
-      const lines = data.split('\n').filter(line => line.trim());
+      const stats = await fs.stat(this.logFilePath);
       
-      for (const line of lines) {
-        await this.processLogLine(line);
+      if (this.handle && stats.ino !== this.lastInode) {
+        // Rotación: terminar el fichero anterior (ya renombrado) antes de pasar al nuevo,
+        // para no perder lo escrito entre la última pasada y la rotación
+        await this.readAppended(false);
+        await this.closeHandle();
+        console.log('🔄 Log rotado, leyendo el fichero nuevo desde el principio');
       }
+      
+      let fromStart = false;
+      if (!this.handle) {
+        this.handle = await fs.open(this.logFilePath, 'r');
+        this.lastInode = (await this.handle.stat()).ino;
+        this.lastProcessedSize = 0;
+        this.pendingBytes = Buffer.alloc(0);
+        fromStart = true;
+      } else if (stats.size < this.lastProcessedSize) {
+        // Truncado en el sitio: se relee desde el principio y la secuencia evita duplicados
+        this.lastProcessedSize = 0;
+        this.pendingBytes = Buffer.alloc(0);
+        fromStart = true;
+      }
+      
+      await this.readAppended(fromStart);
     } catch (error) {
       console.error('❌ Error procesando archivo de logs:', error);
+    } finally {
+      await this.saveState();
+    }
+  }
+
+  async readAppended(fromStart) {
+    const { size } = await this.handle.stat();
+    const length = size - this.lastProcessedSize;
+    if (length <= 0) return;
+    
+    const buffer = Buffer.alloc(length);
+    const { bytesRead } = await this.handle.read(buffer, 0, length, this.lastProcessedSize);
+    this.lastProcessedSize += bytesRead;
+    
+    // La última línea puede estar a medias: se completa en la siguiente pasada
+    const data = Buffer.concat([this.pendingBytes, buffer.subarray(0, bytesRead)]);
+    const end = data.lastIndexOf(0x0a);
+    this.pendingBytes = Buffer.from(data.subarray(end + 1));
+    if (end < 0) return;
+    
+    const lines = data.subarray(0, end).toString('utf8').split('\n').filter(line => line.trim());
+    const sequences = lines.map(lineSequence).filter((sequence) => sequence !== null);
+    if (sequences.length > 0 && this.lastSequence !== null) {
+      if (fromStart && sequences[sequences.length - 1] < this.lastSequence) {
+        // El log entero es anterior al estado guardado: el agente empezó una secuencia nueva
+        console.log(`🔄 Secuencia del agente reiniciada (${sequences[sequences.length - 1]} < ${this.lastSequence})`);
+        this.lastSequence = null;
+      } else if (sequences[0] > this.lastSequence + 1) {
+        // Hueco (backend parado durante una rotación): recuperarlo de los segmentos rotados
+        await this.processRotatedSegments(sequences[0]);
+      }
+    }
+    for (const line of lines) {
+      await this.processLogLine(line);
+    }
+  }
+
+  async listRotatedSegments() {
+    // Segmentos '<log>.<primera secuencia>' y '.gz' una vez comprimidos, del más antiguo al más reciente
+    const prefix = `${path.basename(this.logFilePath)}.`;
+    const segments = new Map();
+    for (const name of await fs.readdir(path.dirname(this.logFilePath))) {
+      if (!name.startsWith(prefix)) continue;
+      const match = /^(\d+)(\.gz)?$/.exec(name.substring(prefix.length));
+      if (!match) continue;
+      const first = Number(match[1]);
+      if (!segments.has(first)) segments.set(first, []);
+      // Sin comprimir primero: mientras se comprime existen los dos
+      segments.get(first)[match[2] ? 'push' : 'unshift'](path.join(path.dirname(this.logFilePath), name));
+    }
+    return [...segments.entries()].sort((a, b) => a[0] - b[0]);
+  }
+
+  async readSegment(files) {
+    for (const file of files) {
+      try {
+        const data = await fs.readFile(file);
+        return file.endsWith('.gz') ? zlib.gunzipSync(data) : data;
+      } catch (error) {
+        // Comprimido y borrado mientras se leía: probar la versión .gz
+        if (error.code !== 'ENOENT') throw error;
+      }
+    }
+    return null;
+  }
+
+  async processRotatedSegments(untilSequence) {
+    const segments = await this.listRotatedSegments();
+    for (let i = 0; i < segments.length; i++) {
+      const [first, files] = segments[i];
+      const next = i + 1 < segments.length ? segments[i + 1][0] : untilSequence;
+      if (first >= untilSequence) break;
+      if (next <= this.lastSequence + 1) continue;
+      
+      const data = await this.readSegment(files);
+      if (!data) continue;
+      console.log(`📂 Recuperando líneas del segmento rotado ${path.basename(files[0])}`);
+      const lines = data.toString('utf8').split('\n').filter(line => line.trim());
+      for (const line of lines) {
+        const sequence = lineSequence(line);
+        if (sequence !== null && sequence >= untilSequence) break;
+        await this.processLogLine(line);
+      }
     }
   }
 
   async processLogLine(line) {
     try {
-      // Buscar JSON en la línea
-      const jsonMatch = line.match(/ZienShield-WebTraffic.*?: (.+)$/);
-      if (!jsonMatch) return;
-
-      const logData = JSON.parse(jsonMatch[1]);
+      // NDJSON (una línea = un evento JSON) o formato antiguo 'ZienShield-WebTraffic...: {json}'
+      let jsonText = null;
+      if (line.startsWith('{')) {
+        jsonText = line;
+      } else {
+        const jsonMatch = line.match(/ZienShield-WebTraffic.*?: (.+)$/);
+        if (jsonMatch) jsonText = jsonMatch[1];
+      }
+      if (!jsonText) return;
+
+      const logData = JSON.parse(jsonText);
+      // Secuencia por línea del agente: lo ya procesado (reinicio del backend,
+      // relectura tras truncado) se salta para no contarlo dos veces
+      if (typeof logData.seq === 'number') {
+        if (this.lastSequence !== null && logData.seq <= this.lastSequence) return;
+        this.lastSequence = logData.seq;
+      }
       const webTrafficData = logData.zienshield_web_traffic;
 
       if (!webTrafficData) return;
@@ -5,11 +5,13 @@ Versión portable que funciona con Python preinstalado
 """
 
 import subprocess
-import socket
 import json
 import time
 import os
 import sys
+import argparse
+import shutil
+import tempfile
 from datetime import datetime
 from collections import defaultdict
 import platform
@@ -29,17 +31,90 @@ except ImportError:
         input("Presiona Enter para continuar...")
         sys.exit(1)
 
+# Módulos compartidos del agente: junto al script (paquete portable)
+# o en el directorio de agentes del repositorio
+AGENT_DIR = os.path.dirname(os.path.abspath(__file__))
+for _candidate_dir in (AGENT_DIR, os.path.dirname(AGENT_DIR)):
+    if os.path.isdir(os.path.join(_candidate_dir, 'zienshield_agent')):
+        sys.path.insert(0, _candidate_dir)
+        break
+
+from zienshield_agent.cache import TTLCache
+from zienshield_agent.cachestore import CacheStore
+from zienshield_agent.categories import CategoryMatcher
+from zienshield_agent.domains import registrable_domain
+from zienshield_agent.resolver import ReverseResolver
+from zienshield_agent.sender import BackgroundSender
+from zienshield_agent.paths import get_data_dir
+from zienshield_agent.uploader import UploadClient
+from zienshield_agent.batch import build_batch
+from zienshield_agent.payload import get_top_domains, UNSUPPORTED_FORMAT_STATUS
+from zienshield_agent.slim import SlimEncoder
+from zienshield_agent.logwriter import RotatingLogWriter
+from zienshield_agent.events import build_event
+from zienshield_agent.selfmetrics import CycleTimer, timed_upload
+from zienshield_agent.exporter import MetricsExporter
+from zienshield_agent.governor import BudgetGovernor, dns_targets, assign_domains
+from zienshield_agent.replay import open_session, instrument, instrument_metrics, command_stream, run_replay
+from zienshield_agent.streaming import (
+    CommandStream, stream_records, parse_windows_netstat_line, parse_tasklist_csv_line
+)
+
 class ZienShieldWebMonitorWindows:
-    def __init__(self, backend_url="http://194.164.172.92:3001"):
+    def __init__(self, backend_url="http://194.164.172.92:3001", dns_cycle_timeout=5.0, data_dir=None,
+                 send_queue_size=10, send_overflow='drop-oldest', upload_encoding='gzip',
+                 batch_cycles=1, batch_interval=0, upload_schema=1, metrics_port=None,
+                 cpu_budget=None, rss_budget_mb=None):
         self.session_data = defaultdict(lambda: {
             'start_time': None,
             'bytes_sent': 0,
             'bytes_recv': 0,
             'connections': 0
         })
-        self.domain_cache = {}
+        # Caché IP -> dominio acotada (LRU) con TTL positivo y negativo
+        self.domain_cache = TTLCache(max_entries=10000, ttl=3600, negative_ttl=300)
+        # Persistencia en disco (Documents/ZienShield/data): arranques en caliente
+        self.data_dir = get_data_dir(data_dir)
+        self.dns_store = CacheStore(os.path.join(self.data_dir, 'dns_cache.sqlite'))
+        self.dns_store.attach(self.domain_cache)
         self.process_cache = {}
         self.backend_url = backend_url
+        # Backup local en Documents/ZienShield abierto entre ciclos y rotado por tamaño/edad
+        self.local_log = None
+        
+        # Conexión keep-alive reutilizada entre ciclos y payload comprimido (con vuelta a JSON plano)
+        self.upload_client = UploadClient(backend_url, timeout=15, user_agent='ZienShield-Windows-Monitor/1.0',
+                                          encoding=upload_encoding)
+        
+        # Payload v2: os_info y demás datos del host una vez por sesión, sin agregados derivables
+        self.slim_encoder = SlimEncoder(top_domains_limit=15) if upload_schema == 2 else None
+        
+        # Envío al backend en segundo plano: un servidor lento no retrasa la recolección
+        # Con lotes, N ciclos (o T segundos) viajan en una sola petición; lo que no
+        # se puede enviar queda en el spool de disco y se reenvía al volver el backend
+        batching = batch_cycles > 1 or batch_interval > 0
+        self.sender = BackgroundSender(
+            self.deliver_to_backend,
+            max_queue=send_queue_size,
+            overflow=send_overflow,
+            spool_dir=os.path.join(self.data_dir, 'spool'),
+            send_batch=self.send_batch_to_backend if batching else None,
+            batch_size=batch_cycles,
+            batch_interval=batch_interval
+        )
+        
+        # netstat/tasklist en streaming; --record/--replay lo sustituyen en attach_session
+        self.command_stream = CommandStream
+        # Resolución inversa concurrente con plazo por ciclo
+        self.resolver = ReverseResolver(
+            self.domain_cache,
+            transform=self.extract_domain,
+            cycle_timeout=dns_cycle_timeout
+        )
+        # Tiempo por fase de los últimos 120 ciclos y consumo propio: bloque agent_self
+        self.cycle_timer = CycleTimer(window=120)
+        # /metrics para Prometheus (opcional, solo local), generado una vez por ciclo
+        self.exporter = MetricsExporter(metrics_port, 'windows') if metrics_port is not None else None
         
         # Categorías de sitios web
         self.site_categories = {
@@ -54,123 +129,121 @@ class ZienShieldWebMonitorWindows:
             'cloud': ['drive.google.com', 'dropbox.com', 'onedrive.com', 'icloud.com'],
             'dev': ['github.com', 'stackoverflow.com', 'gitlab.com', 'bitbucket.org']
         }
+        # Emparejador compilado (sufijos por etiqueta, memoizado por dominio)
+        self.category_matcher = CategoryMatcher(self.site_categories)
+        
+        # Ejecutables de navegador (tasklist) y su nombre en las métricas
+        self.browser_executables = {
+            'chrome.exe': 'chrome', 
+            'firefox.exe': 'firefox', 
+            'msedge.exe': 'edge', 
+            'iexplore.exe': 'ie',
+            'opera.exe': 'opera', 
+            'brave.exe': 'brave',
+            'vivaldi.exe': 'vivaldi',
+            'waterfox.exe': 'waterfox'
+        }
+        
+        # Presupuesto de CPU/RSS del agente: por encima, degradación por niveles
+        # (netstat -an no da el proceso: con browser_dns solo se usa la caché DNS)
+        self.governor = BudgetGovernor(cpu_budget, rss_budget_mb)
+        self.governor.attach(domain_cache=self.domain_cache, category_matcher=self.category_matcher)
+
+    def extract_domain(self, hostname):
+        """Extraer el dominio registrable de un hostname (p.ej. www.bbc.co.uk -> bbc.co.uk)"""
+        return registrable_domain(hostname)
 
     def resolve_ip_to_domain(self, ip):
         """Resolver IP a dominio y cachear resultado"""
-        if ip in self.domain_cache:
-            return self.domain_cache[ip]
-        
-        try:
-            hostname = socket.gethostbyaddr(ip)[0]
-            domain_parts = hostname.split('.')
-            if len(domain_parts) >= 2:
-                domain = '.'.join(domain_parts[-2:])
+        return self.resolver.resolve(ip)
+
+    def attach_session(self, session):
+        """Grabar (--record) o reproducir (--replay) la salida de netstat/tasklist y el DNS del ciclo"""
+        self.command_stream = command_stream(session, self.command_stream)
+        instrument(session, self.resolver, 'resolve_many', 'dns')
+        instrument_metrics(session, self, 'collect_web_metrics')
+
+    def replay_sinks(self):
+        """Salidas del ciclo sin red ni disco: backup local y payload del backend"""
+        def backup(metrics):
+            json.dumps(build_event(metrics, 'windows', 'ZienShield Web Traffic Metrics (Windows Portable)'),
+                       separators=(',', ':'))
+
+        def backend(metrics):
+            payload = self.encode_for_backend(metrics)
+            if self.upload_client.encoder:
+                self.upload_client.encoder.encode(payload)
             else:
-                domain = hostname
-                
-            self.domain_cache[ip] = domain
-            return domain
-        except:
-            self.domain_cache[ip] = ip
-            return ip
+                json.dumps(payload, separators=(',', ':'))
+
+        return [('backup', backup), ('backend', backend)]
+
+    def save_dns_cache(self, force=False):
+        """Volcar la caché DNS a disco (periódicamente o de inmediato con force)"""
+        saved = self.dns_store.flush(self.domain_cache) if force else self.dns_store.maybe_flush(self.domain_cache)
+        if saved is False:
+            print(f"⚠️ No se pudo guardar la caché DNS: {self.dns_store.last_error}")
+        return saved
 
     def get_active_connections_windows(self):
         """Obtener conexiones usando netstat en Windows"""
         connections = []
         try:
-            # Usar netstat con parámetros de Windows
-            result = subprocess.run(['netstat', '-an'], capture_output=True, text=True, timeout=15)
-            
-            if result.returncode == 0:
-                lines = result.stdout.split('\n')
-                for line in lines:
-                    if 'ESTABLISHED' in line and 'TCP' in line:
-                        parts = line.split()
-                        if len(parts) >= 4:
-                            try:
-                                local_addr = parts[1]
-                                remote_addr = parts[2]
-                                
-                                # Extraer IP y puerto (formato IPv4)
-                                if ':' in remote_addr and not remote_addr.startswith('['):
-                                    remote_parts = remote_addr.rsplit(':', 1)
-                                    if len(remote_parts) == 2:
-                                        remote_ip, remote_port = remote_parts
-                                        
-                                        # Filtrar conexiones locales y privadas
-                                        if (not remote_ip.startswith('127.') and 
-                                            not remote_ip.startswith('192.168.') and 
-                                            not remote_ip.startswith('10.') and
-                                            not remote_ip.startswith('172.16.') and
-                                            not remote_ip.startswith('169.254.')):
-                                            
-                                            connection_info = {
-                                                'local_ip': local_addr.split(':')[0] if ':' in local_addr else local_addr,
-                                                'local_port': int(local_addr.split(':')[1]) if ':' in local_addr and local_addr.split(':')[1].isdigit() else 0,
-                                                'remote_ip': remote_ip,
-                                                'remote_port': int(remote_port) if remote_port.isdigit() else 0,
-                                                'pid': 0,
-                                                'process_name': 'unknown',
-                                                'process_cmdline': 'unknown',
-                                                'domain': self.resolve_ip_to_domain(remote_ip)
-                                            }
-                                            connections.append(connection_info)
-                            except Exception:
-                                continue
+            # Usar netstat con parámetros de Windows, filtrando línea a línea
+            stream = self.command_stream(['netstat', '-an'], timeout=15)
+            for record in stream_records(stream, parse_windows_netstat_line):
+                remote_ip = record['remote_ip']
+                
+                # Filtrar conexiones locales y privadas (y las IPv6, como hasta ahora)
+                if (':' not in remote_ip and
+                    not remote_ip.startswith('127.') and 
+                    not remote_ip.startswith('192.168.') and 
+                    not remote_ip.startswith('10.') and
+                    not remote_ip.startswith('172.16.') and
+                    not remote_ip.startswith('169.254.')):
+                    
+                    connection_info = {
+                        'local_ip': record['local_ip'],
+                        'local_port': record['local_port'],
+                        'remote_ip': remote_ip,
+                        'remote_port': record['remote_port'],
+                        'pid': 0,
+                        'process_name': 'unknown',
+                        'process_cmdline': 'unknown'
+                    }
+                    connections.append(connection_info)
                                 
         except Exception as e:
             print(f"Error obteniendo conexiones: {e}")
         
+        # Resolver todas las IPs del ciclo de una vez, en paralelo y con plazo
+        # (bajo presupuesto, solo las de navegadores; el resto desde la caché)
+        with self.cycle_timer.phase('dns'):
+            domains = self.resolver.resolve_many(dns_targets(connections, self.governor, self.browser_executables))
+        assign_domains(connections, domains, self.domain_cache)
+        
         return connections
 
     def get_browser_processes_windows(self):
         """Detectar procesos de navegadores usando tasklist en Windows"""
-        browsers = {
-            'chrome.exe': 'chrome', 
-            'firefox.exe': 'firefox', 
-            'msedge.exe': 'edge', 
-            'iexplore.exe': 'ie',
-            'opera.exe': 'opera', 
-            'brave.exe': 'brave',
-            'vivaldi.exe': 'vivaldi',
-            'waterfox.exe': 'waterfox'
-        }
         active_browsers = []
         
         try:
-            # Usar tasklist para obtener procesos
-            result = subprocess.run(['tasklist', '/FO', 'CSV'], capture_output=True, text=True, timeout=10)
+            # Usar tasklist para obtener procesos, parseando el CSV línea a línea
+            stream = self.command_stream(['tasklist', '/FO', 'CSV'], timeout=10)
+            browser_counts = defaultdict(int)
+            browser_memory = defaultdict(int)
             
-            if result.returncode == 0:
-                lines = result.stdout.split('\n')
-                browser_counts = defaultdict(int)
-                browser_memory = defaultdict(int)
-                
-                for line in lines[1:]:  # Saltar header
-                    if line.strip():
-                        try:
-                            # Parsear CSV - usar split más robusto
-                            if '","' in line:
-                                parts = line.split('","')
-                                if len(parts) >= 5:
-                                    process_name = parts[0].strip('"').lower()
-                                    pid = parts[1].strip('"')
-                                    memory_str = parts[4].strip('"')
-                                    
-                                    for browser_exe, browser_name in browsers.items():
-                                        if browser_exe in process_name:
-                                            browser_counts[browser_name] += 1
-                                            
-                                            # Extraer memoria (formato: "1,234 K")
-                                            try:
-                                                memory_kb = int(memory_str.replace(',', '').replace(' K', ''))
-                                                browser_memory[browser_name] += memory_kb
-                                            except:
-                                                pass
-                                            break
-                        except:
-                            continue
+            for process in stream_records(stream, parse_tasklist_csv_line):
+                process_name = process['name'].lower()
                 
+                for browser_exe, browser_name in self.browser_executables.items():
+                    if browser_exe in process_name:
+                        browser_counts[browser_name] += 1
+                        browser_memory[browser_name] += process['memory_kb']
+                        break
+            
+            if stream.returncode == 0:
                 # Convertir a formato esperado
                 for browser, count in browser_counts.items():
                     memory_mb = browser_memory.get(browser, 0) / 1024
@@ -190,23 +263,21 @@ class ZienShieldWebMonitorWindows:
         return active_browsers
 
     def categorize_domain(self, domain):
-        """Categorizar dominio según tipo de sitio"""
-        domain_lower = domain.lower()
-        for category, domains in self.site_categories.items():
-            for site in domains:
-                if site in domain_lower:
-                    return category
-        return 'other'
+        """Categorizar dominio según tipo de sitio (sufijo más específico)"""
+        return self.category_matcher.match(domain)
 
     def collect_web_metrics(self):
         """Recopilar todas las métricas web"""
         timestamp = datetime.now().isoformat()
+        timer = self.cycle_timer
         
         print("🔍 Recopilando conexiones activas...")
-        connections = self.get_active_connections_windows()
+        with timer.phase('enumeration'):
+            connections = self.get_active_connections_windows()
         
         print("🌐 Detectando navegadores...")
-        browsers = self.get_browser_processes_windows()
+        with timer.phase('process_lookup'):
+            browsers = self.get_browser_processes_windows()
         
         print("📊 Procesando estadísticas de dominios...")
         domain_stats = defaultdict(lambda: {
@@ -216,17 +287,19 @@ class ZienShieldWebMonitorWindows:
             'category': 'other'
         })
         
-        for conn in connections:
-            domain = conn['domain']
-            domain_stats[domain]['connections'] += 1
-            domain_stats[domain]['processes'].add(conn['process_name'])
-            domain_stats[domain]['ports'].add(conn['remote_port'])
-            domain_stats[domain]['category'] = self.categorize_domain(domain)
+        with timer.phase('aggregation'):
+            for conn in connections:
+                domain = conn['domain']
+                domain_stats[domain]['connections'] += 1
+                domain_stats[domain]['processes'].add(conn['process_name'])
+                domain_stats[domain]['ports'].add(conn['remote_port'])
         
-        # Convertir sets a listas para JSON
-        for domain in domain_stats:
-            domain_stats[domain]['processes'] = list(domain_stats[domain]['processes'])
-            domain_stats[domain]['ports'] = list(domain_stats[domain]['ports'])
+        # Categorizar una vez por dominio y convertir sets a listas para JSON
+        with timer.phase('categorization'):
+            for domain in domain_stats:
+                domain_stats[domain]['category'] = self.categorize_domain(domain)
+                domain_stats[domain]['processes'] = list(domain_stats[domain]['processes'])
+                domain_stats[domain]['ports'] = list(domain_stats[domain]['ports'])
         
         # Generar ID único del agente
         try:
@@ -237,31 +310,32 @@ class ZienShieldWebMonitorWindows:
             agent_id = f"windows-agent-{hash(str(datetime.now())) % 100000:05d}"
         
         # Estructurar datos para el backend
-        web_metrics = {
-            'timestamp': timestamp,
-            'agent_id': agent_id,
-            'hostname': os.environ.get('COMPUTERNAME', platform.node()),
-            'username': os.environ.get('USERNAME', 'unknown'),
-            'os_info': {
-                'system': platform.system(),
-                'release': platform.release(),
-                'version': platform.version(),
-                'architecture': platform.architecture()[0]
-            },
-            'total_connections': len(connections),
-            'total_domains': len(domain_stats),
-            'active_browsers': sum(b['process_count'] for b in browsers),
-            'browser_types': len(browsers),
-            'domain_stats': dict(domain_stats),
-            'browser_processes': browsers,
-            'top_domains': sorted(
-                [(domain, stats['connections']) for domain, stats in domain_stats.items()],
-                key=lambda x: x[1],
-                reverse=True
-            )[:15],
-            'categories_summary': self.get_category_summary(domain_stats),
-            'monitor_version': 'windows-portable-1.0'
-        }
+        with timer.phase('aggregation'):
+            web_metrics = {
+                'timestamp': timestamp,
+                'agent_id': agent_id,
+                'hostname': os.environ.get('COMPUTERNAME', platform.node()),
+                'username': os.environ.get('USERNAME', 'unknown'),
+                'os_info': {
+                    'system': platform.system(),
+                    'release': platform.release(),
+                    'version': platform.version(),
+                    'architecture': platform.architecture()[0]
+                },
+                'total_connections': len(connections),
+                'total_domains': len(domain_stats),
+                'active_browsers': sum(b['process_count'] for b in browsers),
+                'browser_types': len(browsers),
+                'domain_stats': dict(domain_stats),
+                'browser_processes': browsers,
+                'top_domains': get_top_domains(domain_stats, 15),
+                'categories_summary': self.get_category_summary(domain_stats),
+                'monitor_version': 'windows-portable-1.0'
+            }
+        
+        # Tiempos por fase de los ciclos anteriores y consumo propio del agente
+        web_metrics['agent_self'] = timer.snapshot()
+        web_metrics['agent_self']['governor'] = self.governor.observe(web_metrics['agent_self'])
         
         return web_metrics
 
@@ -283,15 +357,7 @@ class ZienShieldWebMonitorWindows:
             
             print(f"📡 Enviando métricas a: {endpoint}")
             
-            response = requests.post(
-                endpoint,
-                json=metrics,
-                headers={
-                    'Content-Type': 'application/json',
-                    'User-Agent': 'ZienShield-Windows-Monitor/1.0'
-                },
-                timeout=15
-            )
+            response = self.upload_client.post_payload('/agent-metrics', metrics)
             
             if response.status_code == 200:
                 print(f"✅ Métricas enviadas al backend ZienShield")
@@ -300,6 +366,11 @@ class ZienShieldWebMonitorWindows:
                     processed = resp_data['processed']
                     print(f"   📊 Procesado: {processed.get('connections', 0)} conexiones, {processed.get('domains', 0)} dominios")
                 return True
+            elif response.status_code == UNSUPPORTED_FORMAT_STATUS and self.slim_encoder:
+                # Backend sin expansor del payload v2: los siguientes envíos van en v1
+                print("⚠️ El backend no admite el formato del payload, se vuelve al formato v1")
+                self.slim_encoder = None
+                return False
             else:
                 print(f"⚠️ Backend respondió con código {response.status_code}")
                 try:
@@ -320,38 +391,64 @@ class ZienShieldWebMonitorWindows:
             print(f"❌ Error enviando métricas al backend: {e}")
             return False
     
+    def encode_for_backend(self, metrics):
+        """Payload de un ciclo: métricas completas o v2 compacto"""
+        if not self.slim_encoder:
+            return metrics
+        with self.cycle_timer.phase('serialization'):
+            return self.slim_encoder.encode(metrics)
+    
+    def deliver_to_backend(self, metrics):
+        """Enviar un ciclo encolado (se ejecuta en el hilo de envío)"""
+        success = timed_upload(self.cycle_timer, self.upload_client, self.send_to_backend,
+                               self.encode_for_backend(metrics))
+        if not success and self.slim_encoder:
+            # El backend pudo perder el payload: sesión nueva con host y diccionario completos
+            self.slim_encoder.reset()
+        return success
+    
+    def send_batch_to_backend(self, cycles):
+        """Enviar varios ciclos como un único lote (timestamps por ciclo)"""
+        print(f"📦 Lote de {len(cycles)} ciclos")
+        success = timed_upload(self.cycle_timer, self.upload_client, self.send_to_backend,
+                               build_batch([self.encode_for_backend(metrics) for metrics in cycles]))
+        if not success and self.slim_encoder:
+            self.slim_encoder.reset()
+        return success
+
     def save_local_log(self, metrics):
         """Guardar métricas en log local como backup"""
         try:
-            # Crear directorio de logs en Documents si no existe
-            documents_path = os.path.join(os.path.expanduser('~'), 'Documents', 'ZienShield')
-            os.makedirs(documents_path, exist_ok=True)
-            
-            log_file = os.path.join(documents_path, 'zienshield-web-traffic.log')
+            # Abrir el log en Documents la primera vez (el escritor crea el directorio)
+            if self.local_log is None:
+                documents_path = os.path.join(os.path.expanduser('~'), 'Documents', 'ZienShield')
+                self.local_log = RotatingLogWriter(os.path.join(documents_path, 'zienshield-web-traffic.log'))
             
-            log_entry = {
-                'zienshield_web_traffic': metrics,
-                'rule_id': 100001,
-                'level': 3,
-                'description': 'ZienShield Web Traffic Metrics (Windows Portable)'
-            }
-            
-            log_message = f"ZienShield-Windows: {json.dumps(log_entry, indent=2)}"
+            log_entry = build_event(metrics, 'windows', 'ZienShield Web Traffic Metrics (Windows Portable)')
             
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(f"{log_message}\n\n")
+            # Una línea NDJSON por ciclo (sin indentación ni prefijo) con su número de secuencia
+            with self.cycle_timer.phase('sink_backup'):
+                sequence = self.local_log.write(log_entry)
             
-            print(f"💾 Backup guardado en {log_file}")
+            print(f"💾 Backup guardado en {self.local_log.path} (#{sequence})")
             return True
             
         except Exception as e:
             print(f"❌ Error guardando backup: {e}")
             return False
 
+    def close_log(self):
+        """Volcar y cerrar el backup local y detener /metrics"""
+        if self.local_log is not None:
+            self.local_log.close()
+        if self.exporter is not None:
+            self.exporter.close()
+
     def run_monitoring_cycle(self):
         """Ejecutar un ciclo completo de monitoreo"""
         print(f"🔍 Iniciando ciclo de monitoreo web - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("=" * 70)
+        self.cycle_timer.start_cycle()
         
         try:
             # Recopilar métricas
@@ -387,21 +484,29 @@ class ZienShieldWebMonitorWindows:
                 for category, stats in sorted_categories[:6]:
                     print(f"   - {category.title()}: {stats['connections']} conexiones, {stats['domains']} dominios")
             
-            # Enviar al backend
-            print("\n🚀 Enviando métricas...")
-            backend_success = self.send_to_backend(metrics)
-            
             # Guardar backup local
             backup_success = self.save_local_log(metrics)
             
-            if backend_success:
-                print("✅ Integración con ZienShield completada exitosamente")
-            elif backup_success:
-                print("⚠️ Error enviando al servidor, pero backup local guardado")
-            else:
-                print("❌ Error en el monitoreo")
+            # Enviar al backend desde el hilo de envío (el ciclo no espera a la red)
+            print("\n🚀 Encolando métricas para envío...")
+            self.sender.put(metrics)
+            if self.exporter:
+                with self.cycle_timer.phase('sink_prometheus'):
+                    self.exporter.update(metrics)
+            send_stats = self.sender.stats()
+            print(f"📤 Cola de envío: {send_stats['depth']} pendientes, {send_stats['spill_depth']} en spool, "
+                  f"{send_stats['sent']} enviados, {send_stats['replayed']} reenviados, "
+                  f"{send_stats['failed']} fallidos, {send_stats['dropped']} descartados, "
+                  f"{send_stats['requests']} peticiones, latencia {send_stats['last_latency']:.2f} s")
+            
+            self.cycle_timer.end_cycle()
+            print(f"⏱️ Ciclo: {self.cycle_timer.describe_last_cycle()}, "
+                  f"CPU del agente {metrics['agent_self']['cpu_percent']}%, RSS {metrics['agent_self']['rss_mb']} MB")
+            if self.governor.level:
+                print(f"🐢 Presupuesto superado, degradación activa: {self.governor.describe()}")
             
-            return backend_success or backup_success
+            self.save_dns_cache()
+            return backup_success or send_stats['sent'] > 0
             
         except Exception as e:
             print(f"❌ Error en ciclo de monitoreo: {e}")
@@ -421,55 +526,19 @@ def show_banner():
     print("🌐 Servidor: http://194.164.172.92:3001")
     print("="*70)
 
-def main():
-    """Función principal"""
-    show_banner()
-    
-    monitor = ZienShieldWebMonitorWindows()
-    
-    if len(sys.argv) > 1:
-        if sys.argv[1] == '--once':
-            # Ejecutar una sola vez
-            print("🔄 Modo: Ejecución única")
-            print("-"*70)
-            success = monitor.run_monitoring_cycle()
-            
-            print("\n" + "="*70)
-            if success:
-                print("✅ MONITOREO EJECUTADO EXITOSAMENTE")
-            else:
-                print("❌ ERRORES EN EL MONITOREO")
-            print("="*70)
-            
-        elif sys.argv[1] == '--test':
-            # Modo test - solo mostrar información del sistema
-            print("🧪 Modo: Test del sistema")
-            print("-"*70)
-            print("🔍 Probando conectividad...")
-            
-            try:
-                response = requests.get("http://194.164.172.92:3001/api/health", timeout=5)
-                if response.status_code == 200:
-                    print("✅ Servidor ZienShield accesible")
-                else:
-                    print(f"⚠️ Servidor responde pero con error: {response.status_code}")
-            except:
-                print("❌ No se puede conectar al servidor ZienShield")
-            
-            print("\n🔍 Probando recopilación de datos...")
-            metrics = monitor.collect_web_metrics()
-            print(f"✅ Se detectaron {metrics['total_connections']} conexiones y {metrics['total_domains']} dominios")
-            
-        elif sys.argv[1] == '--help':
-            print("""
-🆘 AYUDA - ZienShield Web Monitor
-
-📋 Modos de uso:
-   python zienshield-web-monitor-windows.py           → Monitoreo continuo
-   python zienshield-web-monitor-windows.py --once    → Ejecutar una sola vez  
-   python zienshield-web-monitor-windows.py --test    → Probar configuración
-   python zienshield-web-monitor-windows.py --help    → Mostrar esta ayuda
+def replay_recording(path, output=None):
+    """Reproducir una grabación (de cualquier equipo) sin red, sin netstat/tasklist y sin tocar Documents"""
+    replay = open_session(path, 'replay', 'windows')
+    data_dir = tempfile.mkdtemp(prefix='zienshield-replay-')
+    monitor = ZienShieldWebMonitorWindows(data_dir=data_dir)
+    monitor.attach_session(replay)
+    try:
+        run_replay(replay, monitor.collect_web_metrics, monitor.replay_sinks(), output)
+    finally:
+        monitor.sender.close(timeout=0)
+        shutil.rmtree(data_dir, ignore_errors=True)
 
+HELP_EPILOG = """
 📊 Qué hace:
    • Monitorea conexiones de red activas
    • Detecta navegadores web en ejecución
@@ -484,11 +553,102 @@ def main():
 
 📁 Archivos de log:
    • Ubicación: ~/Documents/ZienShield/zienshield-web-traffic.log
-   • Formato: JSON estructurado para análisis
+   • Formato: NDJSON (un evento JSON por línea, con seq y schema_version)
 
 🌐 Servidor: http://194.164.172.92:3001/agent-metrics
-""")
-            return
+"""
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description='ZienShield Web Monitor para Windows (sin argumentos: monitoreo continuo)',
+                                     epilog=HELP_EPILOG, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--once', action='store_true', help='Ejecutar una sola vez')
+    mode.add_argument('--test', action='store_true', help='Probar configuración (conectividad y recopilación de datos)')
+    mode.add_argument('--record', metavar='FICHERO', default=None,
+                      help='Grabar la salida de netstat/tasklist y el DNS en FICHERO (monitoreo continuo hasta completar)')
+    mode.add_argument('--replay', metavar='FICHERO', default=None,
+                      help='Reproducir una grabación sin red y mostrar los tiempos por ciclo')
+    parser.add_argument('--record-cycles', type=int, default=10, metavar='N',
+                        help='Ciclos a grabar con --record')
+    parser.add_argument('--replay-output', metavar='FICHERO', default=None,
+                        help='Guardar las métricas reproducidas en NDJSON (para comparar reproducciones)')
+    parser.add_argument('--schema', type=int, choices=[1, 2], default=1,
+                        help='Esquema del payload: 1 completo, 2 compacto (host una vez por sesión, sin agregados derivables)')
+    parser.add_argument('--batch', type=int, default=1, metavar='N',
+                        help='Agrupar N ciclos por envío al servidor (crece hasta 4N si la cola se acumula)')
+    parser.add_argument('--batch-interval', type=float, default=0, metavar='SEG',
+                        help='Enviar el lote aunque no esté completo cuando su ciclo más antiguo supere SEG segundos '
+                             '(sin --batch, agrupa los ciclos de SEG segundos)')
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PUERTO',
+                        help='Servir /metrics (Prometheus) en 127.0.0.1:PUERTO')
+    parser.add_argument('--cpu-budget', type=float, default=None, metavar='PCT',
+                        help='CPU media máxima del monitor (100 = un núcleo); por encima se degrada por niveles')
+    parser.add_argument('--rss-budget', type=float, default=None, metavar='MB',
+                        help='Memoria residente máxima del monitor; por encima se degrada por niveles')
+    args = parser.parse_args()
+    
+    if args.replay:
+        replay_recording(args.replay, args.replay_output)
+        return
+    
+    show_banner()
+    
+    monitor = ZienShieldWebMonitorWindows(batch_cycles=args.batch, batch_interval=args.batch_interval,
+                                          upload_schema=args.schema, metrics_port=args.metrics_port,
+                                          cpu_budget=args.cpu_budget, rss_budget_mb=args.rss_budget)
+    if monitor.exporter:
+        print(f"📈 Métricas Prometheus en {monitor.exporter.address}")
+    if monitor.governor.enabled:
+        print(f"🎚️ Presupuesto del agente: CPU {args.cpu_budget or '-'}%, RSS {args.rss_budget or '-'} MB")
+    
+    recorder = None
+    if args.record:
+        # Monitoreo continuo que se detiene tras grabar N ciclos
+        recorder = open_session(args.record, 'record', 'windows', args.record_cycles)
+        monitor.attach_session(recorder)
+        print(f"⏺️ Grabando {args.record_cycles} ciclos en {args.record}")
+    
+    if args.once:
+        # Ejecutar una sola vez
+        print("🔄 Modo: Ejecución única")
+        print("-"*70)
+        success = monitor.run_monitoring_cycle()
+        # Esperar al envío antes de informar del resultado
+        monitor.sender.close(timeout=20)
+        backend_success = monitor.sender.stats()['sent'] > 0
+        if backend_success:
+            print("✅ Integración con ZienShield completada exitosamente")
+        success = success or backend_success
+        monitor.save_dns_cache(force=True)
+        monitor.close_log()
+        
+        print("\n" + "="*70)
+        if success:
+            print("✅ MONITOREO EJECUTADO EXITOSAMENTE")
+        else:
+            print("❌ ERRORES EN EL MONITOREO")
+        print("="*70)
+        
+    elif args.test:
+        # Modo test - solo mostrar información del sistema
+        print("🧪 Modo: Test del sistema")
+        print("-"*70)
+        print("🔍 Probando conectividad...")
+        
+        try:
+            response = requests.get("http://194.164.172.92:3001/api/health", timeout=5)
+            if response.status_code == 200:
+                print("✅ Servidor ZienShield accesible")
+            else:
+                print(f"⚠️ Servidor responde pero con error: {response.status_code}")
+        except:
+            print("❌ No se puede conectar al servidor ZienShield")
+        
+        print("\n🔍 Probando recopilación de datos...")
+        metrics = monitor.collect_web_metrics()
+        print(f"✅ Se detectaron {metrics['total_connections']} conexiones y {metrics['total_domains']} dominios")
+        
     else:
         # Ejecutar continuamente
         print("♾️  Modo: Monitoreo continuo (cada 30 segundos)")
@@ -497,6 +657,7 @@ def main():
         print("-"*70)
         
         cycle_count = 0
+        next_cycle = time.monotonic()
         try:
             while True:
                 cycle_count += 1
@@ -505,12 +666,17 @@ def main():
                 success = monitor.run_monitoring_cycle()
                 
                 if success:
-                    print("✅ Ciclo completado - Esperando 30 segundos...")
+                    print(f"✅ Ciclo completado - Esperando {monitor.governor.interval(30)} segundos...")
                 else:
-                    print("⚠️ Errores en el ciclo - Esperando 30 segundos...")
+                    print(f"⚠️ Errores en el ciclo - Esperando {monitor.governor.interval(30)} segundos...")
                 
                 print("-"*30)
-                time.sleep(30)
+                if recorder and recorder.done:
+                    print(f"⏹️ Grabación completa: {recorder.path}")
+                    break
+                # Cadencia fija (doble con el nivel long_interval): la duración del ciclo no se suma
+                next_cycle = max(next_cycle + monitor.governor.interval(30), time.monotonic())
+                time.sleep(max(0, next_cycle - time.monotonic()))
                 
         except KeyboardInterrupt:
             print("\n\n🛑 MONITOREO DETENIDO POR EL USUARIO")
@@ -522,6 +688,12 @@ def main():
             print(f"\n❌ ERROR FATAL: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            monitor.sender.close(timeout=5)
+            monitor.save_dns_cache(force=True)
+            monitor.close_log()
+            if recorder:
+                recorder.close()
         
         print("\n👋 Presiona Enter para cerrar...")
         try:
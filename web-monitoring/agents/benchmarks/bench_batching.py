@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Lotes multiciclo
+Peticiones al backend por ciclo con y sin lotes, y tamaño de lote adaptativo
+ante un backend lento o caído (intervalo de ciclo escalado)
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.batch import build_batch, split_batch
+from zienshield_agent.encoding import decode_payload
+from zienshield_agent.sender import BackgroundSender
+from zienshield_agent.uploader import UploadClient
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Sustituto de /agent-metrics que registra los ciclos recibidos"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        time.sleep(server.delay)
+        status = 503 if server.down else 200
+        if status == 200:
+            cycles = split_batch(decode_payload(body, self.headers))
+            with server.lock:
+                server.requests += 1
+                server.bytes += len(body)
+                server.cycles.extend(cycle['timestamp'] for cycle in cycles)
+        reply = b'{"success":true}'
+        self.wfile.write(
+            f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\nContent-Length: {len(reply)}\r\n\r\n".encode()
+            + reply
+        )
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.lock = threading.Lock()
+        self.delay = 0.0
+        self.down = False
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.bytes = 0
+        self.cycles = []
+
+
+def make_metrics(cycle, domains=50):
+    return {
+        'timestamp': (datetime(2025, 1, 1) + timedelta(seconds=30 * cycle)).isoformat(),
+        'agent_id': 'bench-host',
+        'total_domains': domains,
+        'domain_stats': {
+            f"site{i}.com": {'connections': (i + cycle) % 9 + 1, 'processes': ['firefox'], 'ports': [443], 'category': 'other'}
+            for i in range(domains)
+        }
+    }
+
+
+def run(label, server, url, cycles, period, batch, interval, outage=None):
+    server.reset()
+    client = UploadClient(url, encoding='gzip')
+
+    def send(payload):
+        return client.post_payload('/agent-metrics', payload).status_code == 200
+
+    def send_batch(payloads):
+        return send(build_batch(payloads))
+
+    sender = BackgroundSender(
+        send, max_queue=10,
+        send_batch=send_batch if batch > 1 or interval else None,
+        batch_size=batch, batch_interval=interval * period
+    )
+    for cycle in range(cycles):
+        if outage:
+            server.down = outage[0] <= cycle < outage[1]
+        sender.put(make_metrics(cycle))
+        time.sleep(period)
+    server.down = False
+    sender.close(timeout=10)
+    stats = sender.stats()
+
+    in_order = server.cycles == sorted(server.cycles)
+    print(f"{label:<34} peticiones: {server.requests:4d}  ciclos recibidos: {len(server.cycles):4d}/{cycles}  "
+          f"{server.bytes / 1024:7.1f} KB  lote máx: {stats['max_batch_size']:3d}  "
+          f"perdidos: {stats['failed'] + stats['dropped']:3d}  orden: {'ok' if in_order else 'NO'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de lotes multiciclo')
+    parser.add_argument('--cycles', type=int, default=100, help='Ciclos simulados')
+    parser.add_argument('--period', type=float, default=0.02, help='Intervalo de ciclo escalado (s, 30 s reales)')
+    parser.add_argument('--batch', type=int, default=10, help='Ciclos por lote')
+    args = parser.parse_args()
+
+    server = RecordingServer(('127.0.0.1', 0), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print("📊 ZienShield Benchmark - Lotes multiciclo")
+    print("=" * 110)
+    print(f"Ciclos: {args.cycles} | intervalo escalado: {args.period * 1000:.0f} ms | lote: {args.batch}")
+    print("-" * 110)
+    run('sin lotes (original)', server, url, args.cycles, args.period, 1, 0)
+    run(f"lote {args.batch} ciclos", server, url, args.cycles, args.period, args.batch, 0)
+    run(f"lote {args.batch} o {args.batch // 2} intervalos", server, url, args.cycles, args.period,
+        args.batch, args.batch // 2)
+    # Backend más lento que el plazo del lote: la cola crece y los lotes con ella
+    server.delay = args.period * args.batch
+    run(f"backend lento ({args.batch} intervalos/envío)", server, url, args.cycles, args.period,
+        args.batch, args.batch // 2)
+    server.delay = 0.0
+    run('backend caído 20 ciclos, sin lotes', server, url, args.cycles, args.period, 1, 0, outage=(30, 50))
+    run('backend caído 20 ciclos, con lotes', server, url, args.cycles, args.period, args.batch, args.batch // 2,
+        outage=(30, 50))
+    print("=" * 110)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Categorización de dominios
+Compara los bucles anidados con búsqueda de subcadena (original, por
+conexión) con CategoryMatcher (trie de sufijos, por dominio y memoizado)
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.categories import CategoryMatcher
+
+SITE_CATEGORIES = {
+    'social': ['facebook.com', 'twitter.com', 'instagram.com', 'linkedin.com', 'tiktok.com'],
+    'video': ['youtube.com', 'netflix.com', 'twitch.tv', 'vimeo.com', 'dailymotion.com'],
+    'work': ['office.com', 'google.com', 'gmail.com', 'slack.com', 'zoom.us'],
+    'news': ['cnn.com', 'bbc.com', 'reddit.com', 'news.google.com'],
+    'shopping': ['amazon.com', 'ebay.com', 'mercadolibre.com'],
+    'streaming': ['spotify.com', 'apple.com', 'soundcloud.com']
+}
+
+
+def old_categorize_domain(site_categories, domain):
+    """Implementación original"""
+    domain_lower = domain.lower()
+    for category, domains in site_categories.items():
+        for site in domains:
+            if site in domain_lower:
+                return category
+    return 'other'
+
+
+def build_categories(extra_sites, rng):
+    """Categorías base ampliadas con extra_sites sitios sintéticos"""
+    categories = {category: list(sites) for category, sites in SITE_CATEGORIES.items()}
+    names = list(categories)
+    for i in range(extra_sites):
+        categories[names[i % len(names)]].append(f"cat{rng.randint(0, 10 ** 9)}-{i}.{rng.choice(['com', 'net', 'org', 'es'])}")
+    return categories
+
+
+def build_connections(categories, domains, connections, rng):
+    """Conexiones (dominio por conexión) con un 30% de dominios categorizables"""
+    sites = [site for category_sites in categories.values() for site in category_sites]
+    pool = [
+        rng.choice(sites) if rng.random() < 0.3 else f"host{i}.example{i % 97}.net"
+        for i in range(domains)
+    ]
+    return [rng.choice(pool) for _ in range(connections)]
+
+
+def measure(function, items):
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de categorización')
+    parser.add_argument('--domains', type=int, default=5000, help='Dominios distintos por ciclo')
+    parser.add_argument('--connections', type=int, default=50000, help='Conexiones por ciclo')
+    parser.add_argument('--sizes', default='0,1000,10000,100000', help='Sitios extra en las categorías')
+    parser.add_argument('--old-budget', type=int, default=2000,
+                        help='Conexiones medidas con la implementación original (se extrapola el resto)')
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    print("📊 ZienShield Benchmark - Categorización de dominios")
+    print("=" * 78)
+    print(f"Dominios: {args.domains:,} | conexiones por ciclo: {args.connections:,}")
+    print(f"{'sitios':>8} {'original/ciclo':>16} {'compilar':>10} {'matcher/ciclo':>14} {'2º ciclo':>10} {'conex/s':>12}")
+    print("-" * 78)
+
+    for extra in (int(size) for size in args.sizes.split(',')):
+        categories = build_categories(extra, rng)
+        total_sites = sum(len(sites) for sites in categories.values())
+        connections = build_connections(categories, args.domains, args.connections, rng)
+
+        # Original: una categorización por conexión
+        sample = connections[:args.old_budget]
+        old_elapsed = measure(lambda domain: old_categorize_domain(categories, domain), sample)
+        old_cycle = old_elapsed * len(connections) / len(sample)
+
+        start = time.perf_counter()
+        matcher = CategoryMatcher(categories)
+        compile_elapsed = time.perf_counter() - start
+
+        # Nuevo: una categorización por dominio distinto del ciclo
+        cycle_domains = set(connections)
+        first_cycle = measure(matcher.match, cycle_domains)
+        second_cycle = measure(matcher.match, cycle_domains)
+
+        mismatches = sum(
+            1 for domain in list(cycle_domains)[:args.old_budget]
+            if matcher.match(domain) != old_categorize_domain(categories, domain)
+        )
+        print(f"{total_sites:>8,} {old_cycle * 1000:>13.1f} ms {compile_elapsed * 1000:>7.1f} ms "
+              f"{first_cycle * 1000:>11.2f} ms {second_cycle * 1000:>7.2f} ms "
+              f"{len(connections) / first_cycle:>12,.0f}  (difieren: {mismatches})")
+
+    print("-" * 78)
+    print("Diferencias: subcadenas fuera de frontera de etiqueta o un sufijo más específico")
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    main()
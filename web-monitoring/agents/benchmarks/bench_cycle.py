@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Ciclo de recolección con tablas de conexiones sintéticas
+Recorre la ruta de agregación de las cuatro variantes (Linux, Lite, Windows y
+el agente remoto que genera install-agent.py) con colectores falsos de 100 a
+1.000.000 conexiones y 10 a 100.000 dominios. Mide tiempo y memoria pico por
+fase, guarda líneas base y falla si hay regresiones por encima del umbral.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+import importlib.util
+from datetime import datetime
+from collections import defaultdict, namedtuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+AGENTS_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, AGENTS_DIR)
+
+from zienshield_agent.processes import ProcessTable, ProcessEntry
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+VARIANTS = ('linux', 'lite', 'windows', 'remote')
+DEFAULT_SCENARIOS = '100:10,10000:1000,100000:10000'
+FULL_SCENARIOS = DEFAULT_SCENARIOS + ',1000000:100000'
+# Orden de presentación; 'agregacion' es el tiempo propio de collect_web_metrics
+PHASES = ('procesos', 'conexiones', 'dns', 'navegadores', 'categorias', 'agregacion', 'serializacion')
+CYCLE_WINDOW = 30.0
+
+BROWSER_NAMES = ['chrome', 'firefox', 'msedge', 'brave']
+OTHER_NAMES = ['slack', 'teams', 'spotify', 'python3', 'sshd', 'code', 'dropbox', 'zoom']
+
+
+class SyntheticHost:
+    """Tabla de conexiones y de procesos sintética y reproducible"""
+
+    def __init__(self, connections, domains, processes=300, seed=42):
+        rng = random.Random(seed)
+        # IPs públicas distintas (los agentes descartan 10.x, 127.x y 192.168.x)
+        self.ips = [f"{11 + (i >> 16)}.{(i >> 8) & 255}.{i & 255}.7" for i in range(domains)]
+        self.hostnames = {ip: f"www.site{i}.com" for i, ip in enumerate(self.ips)}
+        self.processes = []
+        for k in range(processes):
+            name = BROWSER_NAMES[k % len(BROWSER_NAMES)] if k % 5 < 2 else OTHER_NAMES[k % len(OTHER_NAMES)]
+            self.processes.append(ProcessEntry(
+                1000 + k, 1.7e9 + k, name, f"/usr/bin/{name} --type=renderer --field-trial={k}",
+                (50 + k % 400) * 1024 * 1024, 10.0 + k
+            ))
+        # Cada dominio aparece al menos una vez; el resto sesgado hacia los primeros
+        self.rows = []
+        for n in range(connections):
+            domain = n if n < domains else int(domains * rng.random() ** 3)
+            self.rows.append((domain, rng.randrange(processes), 1024 + n % 60000, 80 if n % 5 == 0 else 443))
+
+    def lookup(self, ip):
+        """Sustituto de gethostbyaddr: respuesta PTR inmediata"""
+        return self.hostnames[ip]
+
+
+class FakeProcessTable(ProcessTable):
+    """ProcessTable alimentada con la tabla sintética en lugar de /proc o psutil"""
+
+    def __init__(self, host):
+        super().__init__(proc_root=os.devnull)
+        self.use_proc = False
+        self.host = host
+        self.tick = 0
+
+    def refresh(self):
+        # CPU acumulada creciente para que CpuSampler calcule porcentajes
+        self.tick += 1
+        processes = {entry.pid: entry._replace(cpu_time=entry.cpu_time + self.tick) for entry in self.host.processes}
+        self.processes = processes
+        self.cpu_sampler.update(processes)
+        self.stats['processes'] = len(processes)
+        return processes
+
+
+class FakeKernelCollector:
+    """Sustituto de SockDiagCollector/ProcNetCollector con las conexiones del host sintético"""
+
+    def __init__(self, host, with_bytes=True):
+        self.host = host
+        self.with_bytes = with_bytes
+
+    def collect(self):
+        ips = self.host.ips
+        processes = self.host.processes
+        connections = []
+        for domain, process, local_port, remote_port in self.host.rows:
+            entry = processes[process]
+            conn = {
+                'local_ip': '192.168.1.10',
+                'local_port': local_port,
+                'remote_ip': ips[domain],
+                'remote_port': remote_port,
+                'pid': entry.pid,
+                'process_name': entry.name,
+                'process_cmdline': entry.cmdline
+            }
+            if self.with_bytes:
+                conn['bytes_sent'] = local_port * 7 % 5000
+                conn['bytes_recv'] = local_port * 13 % 90000
+            connections.append(conn)
+        return connections
+
+
+def fake_command_stream(host):
+    """CommandStream que reproduce `netstat -an` y `tasklist /FO CSV` de Windows"""
+    netstat = ['', 'Active Connections', '', '  Proto  Local Address          Foreign Address        State']
+    netstat += [f"  TCP    192.168.1.10:{local_port}    {host.ips[domain]}:{remote_port}    ESTABLISHED"
+                for domain, _, local_port, remote_port in host.rows]
+    tasklist = ['"Image Name","PID","Session Name","Session#","Mem Usage"']
+    tasklist += [f'"{entry.name}.exe","{entry.pid}","Console","1","{entry.rss // 1024:,} K"'
+                 for entry in host.processes]
+
+    class FakeCommandStream:
+        def __init__(self, cmd, timeout=None, **kwargs):
+            self.lines = netstat if cmd[0] == 'netstat' else tasklist
+            self.returncode = None
+
+        def __iter__(self):
+            yield from self.lines
+            self.returncode = 0
+
+    return FakeCommandStream
+
+
+FakeAddress = namedtuple('FakeAddress', ['ip', 'port'])
+FakeConnection = namedtuple('FakeConnection', ['laddr', 'raddr', 'status', 'pid'])
+
+
+class FakeProcess:
+    def __init__(self, name):
+        self._name = name
+
+    def name(self):
+        return self._name
+
+
+class FakePsutil:
+    """psutil para el agente remoto: conexiones y procesos sintéticos, el resto el real"""
+
+    def __init__(self, host):
+        self.names = {entry.pid: entry.name for entry in host.processes}
+        self.connections = [
+            FakeConnection(FakeAddress('192.168.1.10', local_port), FakeAddress(host.ips[domain], remote_port),
+                           psutil.CONN_ESTABLISHED, host.processes[process].pid)
+            for domain, process, local_port, remote_port in host.rows
+        ]
+
+    def net_connections(self, kind='inet'):
+        return list(self.connections)
+
+    def Process(self, pid):
+        if pid not in self.names:
+            raise psutil.NoSuchProcess(pid)
+        return FakeProcess(self.names[pid])
+
+    def __getattr__(self, name):
+        return getattr(psutil, name)
+
+
+class PhaseRecorder:
+    """Tiempo propio (sin las fases anidadas) y memoria pico (con ellas) de cada fase"""
+
+    def __init__(self, memory=False):
+        self.reset(memory)
+
+    def reset(self, memory=False):
+        """Empezar una medida nueva (con tracemalloc activo si memory)"""
+        self.memory = memory
+        self.times = defaultdict(float)
+        self.peaks = {}
+        self.stack = []
+
+    def _fold_peak(self):
+        # Antes de reiniciar el pico de tracemalloc, anotarlo en todas las fases abiertas
+        peak = tracemalloc.get_traced_memory()[1]
+        for frame in self.stack:
+            if frame['memory']:
+                frame['peak'] = max(frame['peak'], peak)
+
+    @contextlib.contextmanager
+    def phase(self, name, memory=True):
+        memory = memory and self.memory
+        frame = {'name': name, 'memory': memory, 'children': 0.0}
+        if memory:
+            self._fold_peak()
+            tracemalloc.reset_peak()
+            frame['start_memory'] = frame['peak'] = tracemalloc.get_traced_memory()[0]
+        self.stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if memory:
+                self._fold_peak()
+            self.stack.pop()
+            self.times[name] += elapsed - frame['children']
+            if self.stack:
+                self.stack[-1]['children'] += elapsed
+            if memory:
+                self.peaks[name] = max(self.peaks.get(name, 0), frame['peak'] - frame['start_memory'])
+
+    def wrap(self, obj, attribute, name, memory=True):
+        """Medir cada llamada a obj.attribute como la fase name"""
+        original = getattr(obj, attribute)
+
+        def timed(*args, **kwargs):
+            with self.phase(name, memory):
+                return original(*args, **kwargs)
+
+        setattr(obj, attribute, timed)
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def prepare_resolver(agent, host):
+    """DNS sin red: PTR sintético y caché dimensionada para que el ciclo medido la encuentre caliente"""
+    agent.domain_cache.max_entries = max(agent.domain_cache.max_entries, len(host.ips) * 2)
+    agent.resolver.lookup = host.lookup
+    agent.resolver.max_pending = len(host.ips) + 1
+    agent.resolver.cycle_timeout = 600
+    agent.resolver.lookup_timeout = 600
+
+
+def build_linux(host, directory):
+    module = load_module('zienshield_web_monitor', os.path.join(AGENTS_DIR, 'zienshield-web-monitor.py'))
+    monitor = module.ZienShieldWebMonitor(connection_engine='psutil', data_dir=os.path.join(directory, 'data'),
+                                          log_path=os.path.join(directory, 'web-traffic.log'))
+    monitor.process_table = FakeProcessTable(host)
+    monitor.proc_collector = FakeKernelCollector(host)
+    monitor.connection_engine = 'sintético'
+    prepare_resolver(monitor, host)
+    phases = [
+        (monitor.process_table, 'refresh', 'procesos'),
+        (monitor.proc_collector, 'collect', 'conexiones'),
+        (monitor.resolver, 'resolve_many', 'dns'),
+        (monitor, 'get_browser_processes', 'navegadores')
+    ]
+    return monitor, monitor.collect_web_metrics, phases, monitor.close_log
+
+
+def build_lite(host, directory):
+    module = load_module('zienshield_web_monitor_lite', os.path.join(AGENTS_DIR, 'zienshield-web-monitor-lite.py'))
+    monitor = module.ZienShieldWebMonitorLite(data_dir=os.path.join(directory, 'data'),
+                                              log_path=os.path.join(directory, 'web-traffic.log'))
+    monitor.proc_available = True
+    monitor.process_table = FakeProcessTable(host)
+    monitor.proc_collector = FakeKernelCollector(host, with_bytes=False)
+    monitor.mem_total = 16 * 1024 * 1024 * 1024
+    prepare_resolver(monitor, host)
+    phases = [
+        (monitor.process_table, 'refresh', 'procesos'),
+        (monitor, 'get_active_connections_proc', 'conexiones'),
+        (monitor.resolver, 'resolve_many', 'dns'),
+        (monitor, 'get_browser_processes_proc', 'navegadores')
+    ]
+    return monitor, monitor.collect_web_metrics, phases, monitor.close_log
+
+
+def build_windows(host, directory):
+    module = load_module('zienshield_web_monitor_windows', os.path.join(
+        AGENTS_DIR, 'ZienShield-WebMonitor-Portable', 'zienshield-web-monitor-windows.py'))
+    monitor = module.ZienShieldWebMonitorWindows(data_dir=os.path.join(directory, 'data'))
+    monitor.command_stream = fake_command_stream(host)
+    prepare_resolver(monitor, host)
+    phases = [
+        (monitor, 'get_active_connections_windows', 'conexiones'),
+        (monitor.resolver, 'resolve_many', 'dns'),
+        (monitor, 'get_browser_processes_windows', 'navegadores')
+    ]
+    return monitor, monitor.collect_web_metrics, phases, None
+
+
+def build_remote(host, directory):
+    """Generar el agente remoto con install-agent.py en un directorio temporal"""
+    installer_module = load_module('zienshield_install_agent', os.path.join(AGENTS_DIR, 'install-agent.py'))
+    installer = installer_module.ZienShieldAgentInstaller()
+    installer.install_dir = directory
+    installer.agent_script = os.path.join(directory, 'zienshield-agent.py')
+    if not installer.create_agent_script():
+        raise RuntimeError('install-agent.py no pudo generar el agente remoto')
+    config_file = os.path.join(directory, 'config.json')
+    with open(config_file, 'w') as f:
+        json.dump({
+            'agent_id': 'bench-agent',
+            'hostname': 'bench-host',
+            'server_url': 'http://127.0.0.1:9',
+            'metrics_endpoint': '/api/web-traffic/metrics'
+        }, f)
+
+    module = load_module('zienshield_remote_agent', installer.agent_script)
+    agent = module.ZienShieldRemoteAgent(config_file)
+    module.psutil = FakePsutil(host)
+    agent.process_table = FakeProcessTable(host)
+    prepare_resolver(agent, host)
+    phases = [
+        (agent.process_table, 'refresh', 'procesos'),
+        (agent, 'get_network_connections', 'conexiones'),
+        (agent.resolver, 'resolve_many', 'dns'),
+        (agent, 'get_browser_processes', 'navegadores')
+    ]
+    return agent, agent.collect_metrics, phases, None
+
+
+BUILDERS = {
+    'linux': build_linux,
+    'lite': build_lite,
+    'windows': build_windows,
+    'remote': build_remote
+}
+
+
+def run_cycle(recorder, collect):
+    with recorder.phase('agregacion'):
+        metrics = collect()
+    with recorder.phase('serializacion'):
+        json.dumps(metrics, separators=(',', ':'))
+    return metrics
+
+
+def bench_variant(variant, connections, domains, cycles):
+    """Resultados por fase: {'fase': {'time_ms', 'peak_kb'}} (tiempo: mejor ciclo)"""
+    host = SyntheticHost(connections, domains)
+    directory = tempfile.mkdtemp(prefix=f'zienshield-cycle-{variant}-')
+    close = None
+    try:
+        # Las variantes imprimen su progreso: silenciarlo durante la medida
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent, collect, phases, close = BUILDERS[variant](host, directory)
+            recorder = PhaseRecorder()
+            for obj, attribute, name in phases:
+                recorder.wrap(obj, attribute, name)
+            # Una llamada por dominio: solo tiempo, sin tracemalloc por llamada
+            recorder.wrap(agent, 'categorize_domain', 'categorias', memory=False)
+
+            # Ciclo de calentamiento: caché DNS llena y CpuSampler con muestra previa
+            run_cycle(recorder, collect)
+            times = []
+            for _ in range(cycles):
+                recorder.reset()
+                run_cycle(recorder, collect)
+                times.append(dict(recorder.times))
+
+            # Memoria en un ciclo aparte: tracemalloc distorsiona los tiempos
+            recorder.reset(memory=True)
+            tracemalloc.start()
+            try:
+                run_cycle(recorder, collect)
+            finally:
+                tracemalloc.stop()
+    finally:
+        if close:
+            close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    results = {}
+    for phase in PHASES:
+        phase_times = [cycle[phase] for cycle in times if phase in cycle]
+        if not phase_times:
+            continue
+        results[phase] = {'time_ms': round(min(phase_times) * 1000, 3)}
+        if phase in recorder.peaks:
+            results[phase]['peak_kb'] = round(recorder.peaks[phase] / 1024, 1)
+    results['total'] = {
+        'time_ms': round(min(sum(cycle.values()) for cycle in times) * 1000, 3),
+        'peak_kb': max(result.get('peak_kb', 0) for result in results.values())
+    }
+    return results
+
+
+def default_baseline_path():
+    return os.path.join(BENCH_DIR, 'baselines', f"bench_cycle-{platform.node() or 'host'}.json")
+
+
+def load_baseline(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('results', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': datetime.now().isoformat(),
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'results': results
+        }, f, indent=2, sort_keys=True)
+
+
+def regressions(key, current, baseline, threshold, min_time_ms, min_peak_kb):
+    """Métricas de key que empeoran más de threshold (y más que el ruido mínimo)"""
+    found = []
+    previous = baseline.get(key)
+    if not previous:
+        return found
+    for metric, floor in (('time_ms', min_time_ms), ('peak_kb', min_peak_kb)):
+        old = previous.get(metric)
+        new = current.get(metric)
+        if old is None or new is None:
+            continue
+        if new > old * (1 + threshold) and new - old > floor:
+            found.append((metric, old, new))
+    return found
+
+
+def format_change(metric, current, baseline):
+    old = baseline.get(metric) if baseline else None
+    new = current.get(metric)
+    if old is None or new is None or not old:
+        return ''
+    return f"{(new - old) * 100 / old:+5.0f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del ciclo de recolección con tablas sintéticas')
+    parser.add_argument('--variants', default=','.join(VARIANTS), help='Variantes (lista separada por comas)')
+    parser.add_argument('--scenarios', default=DEFAULT_SCENARIOS,
+                        help='Escenarios conexiones:dominios separados por comas')
+    parser.add_argument('--full', action='store_true', help='Incluir 1.000.000 conexiones / 100.000 dominios')
+    parser.add_argument('--cycles', type=int, default=3, help='Ciclos medidos por escenario (se toma el mejor)')
+    parser.add_argument('--baseline', default=None, help='Fichero de línea base (por defecto baselines/bench_cycle-<host>.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='Guardar los resultados como nueva línea base')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Empeoramiento tolerado (0.25 = 25%%)')
+    parser.add_argument('--min-time-ms', type=float, default=2.0, help='Diferencia mínima de tiempo para contar como regresión')
+    parser.add_argument('--min-peak-kb', type=float, default=256.0, help='Diferencia mínima de memoria para contar como regresión')
+    args = parser.parse_args()
+
+    variants = [variant for variant in args.variants.split(',') if variant]
+    for variant in variants:
+        if variant not in VARIANTS:
+            parser.error(f"Variante desconocida: {variant}")
+    if 'remote' in variants and not PSUTIL_AVAILABLE:
+        print("⚠️ psutil no disponible: se omite el agente remoto")
+        variants.remove('remote')
+    scenarios = [tuple(int(value) for value in scenario.split(':'))
+                 for scenario in (FULL_SCENARIOS if args.full else args.scenarios).split(',')]
+    baseline_path = args.baseline or default_baseline_path()
+    baseline = load_baseline(baseline_path)
+
+    print("📊 ZienShield Benchmark - Ciclo de recolección (tablas sintéticas)")
+    print(f"   línea base: {baseline_path if baseline else 'ninguna'}  umbral: {args.threshold * 100:.0f}%")
+    print("=" * 100)
+    results = {}
+    failed = []
+    for connections, domains in scenarios:
+        for variant in variants:
+            scenario = f"{connections}:{domains}"
+            measured = bench_variant(variant, connections, domains, args.cycles)
+            print(f"{variant:<8} {connections:>9,} conexiones {domains:>7,} dominios")
+            for phase, current in measured.items():
+                key = f"{variant}/{scenario}/{phase}"
+                results[key] = current
+                previous = baseline.get(key)
+                found = regressions(key, current, baseline, args.threshold, args.min_time_ms, args.min_peak_kb)
+                failed.extend((key, metric, old, new) for metric, old, new in found)
+                peak = f"{current['peak_kb']:>11,.0f} KB" if 'peak_kb' in current else f"{'-':>14}"
+                print(f"   {phase:<14} {current['time_ms']:>10.2f} ms {format_change('time_ms', current, previous):>6}"
+                      f"  {peak} {format_change('peak_kb', current, previous):>6}"
+                      f"{'  ❌ regresión' if found else ''}")
+            if measured['total']['time_ms'] / 1000 > CYCLE_WINDOW:
+                print(f"   ⚠️ el ciclo supera la ventana de {CYCLE_WINDOW:.0f} s")
+    print("=" * 100)
+
+    if args.save_baseline:
+        save_baseline(baseline_path, results)
+        print(f"💾 Línea base guardada en {baseline_path}")
+    if failed:
+        print(f"❌ {len(failed)} regresiones por encima del {args.threshold * 100:.0f}%:")
+        for key, metric, old, new in failed:
+            print(f"   {key} {metric}: {old} -> {new}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
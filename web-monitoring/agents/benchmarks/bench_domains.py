@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Extracción de dominio registrable
+Compara las dos últimas etiquetas (original) con el trie de la Public Suffix
+List sobre un corpus sintético de hostnames PTR
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.domains import DomainExtractor
+
+# (patrón del hostname, dominio registrable esperado)
+TEMPLATES = [
+    ('{host}.{name}.com', '{name}.com'),
+    ('www.{name}.co.uk', '{name}.co.uk'),
+    ('{host}.cdn.{name}.com.br', '{name}.com.br'),
+    ('ec2-{ip}.compute-1.amazonaws.com', 'amazonaws.com'),
+    ('{host}.{name}.com.au', '{name}.com.au'),
+    ('{host}-in-f{n}.1e100.net', '1e100.net'),
+    ('{host}.{name}.city.kobe.jp', 'city.kobe.jp'),
+    ('{host}.{name}.gob.es', '{name}.gob.es'),
+    ('{host}.static.{name}.net', '{name}.net'),
+]
+
+
+def old_extract_domain(hostname):
+    """Implementación original: dos últimas etiquetas"""
+    domain_parts = hostname.split('.')
+    if len(domain_parts) >= 2:
+        return '.'.join(domain_parts[-2:])
+    return hostname
+
+
+def build_corpus(size, unique, seed=7):
+    """Corpus de tamaño size con unique hostnames distintos (distribución sesgada)"""
+    rng = random.Random(seed)
+    pool = []
+    for i in range(unique):
+        template, expected = TEMPLATES[i % len(TEMPLATES)]
+        values = {
+            'host': f"srv{rng.randint(0, 99999)}",
+            'name': f"site{rng.randint(0, unique // 20 + 1)}",
+            'ip': '-'.join(str(rng.randint(1, 254)) for _ in range(4)),
+            'n': rng.randint(1, 99)
+        }
+        pool.append((template.format(**values), expected.format(**values)))
+    # Los hostnames populares se repiten mucho, como en el tráfico real
+    weights = [1.0 / (rank + 1) for rank in range(unique)]
+    return rng.choices(pool, weights=weights, k=size)
+
+
+def timed(label, function, hostnames, baseline=None):
+    start = time.perf_counter()
+    results = [function(hostname) for hostname in hostnames]
+    elapsed = time.perf_counter() - start
+    rate = len(hostnames) / elapsed / 1e6
+    extra = f" ({baseline / elapsed:5.2f}x vs original)" if baseline else ""
+    print(f"{label:<34} {elapsed:8.3f} s  {rate:6.2f} M/s{extra}")
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de dominio registrable')
+    parser.add_argument('--hostnames', type=int, default=1000000, help='Tamaño del corpus')
+    parser.add_argument('--unique', type=int, default=50000, help='Hostnames distintos en el corpus')
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.hostnames, args.unique)
+    hostnames = [hostname for hostname, _ in corpus]
+
+    print("📊 ZienShield Benchmark - Dominio registrable")
+    print("=" * 70)
+    print(f"Hostnames: {args.hostnames:,} | distintos: {args.unique:,}")
+    print("-" * 70)
+
+    start = time.perf_counter()
+    extractor = DomainExtractor()
+    extractor._ensure_trie()
+    print(f"{'compilación del trie PSL':<34} {time.perf_counter() - start:8.3f} s")
+
+    old_results, old_elapsed = timed('dos últimas etiquetas (original)', old_extract_domain, hostnames)
+    timed('trie PSL sin memoización', DomainExtractor(memo_size=0).registrable_domain, hostnames, old_elapsed)
+    new_results, _ = timed('trie PSL memoizado', extractor.registrable_domain, hostnames, old_elapsed)
+
+    print("-" * 70)
+    for label, results in (('original', old_results), ('trie PSL', new_results)):
+        correct = sum(1 for result, (_, expected) in zip(results, corpus) if result == expected)
+        print(f"{label:<12} aciertos: {correct / len(corpus):7.2%}  dominios distintos: {len(set(results)):,}")
+    print(f"Memo: {extractor.registrable_domain.cache_info()}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Codificación del payload de métricas
+Tamaño codificado y CPU de codificación de payloads realistas (10-5000 dominios)
+para JSON indentado (original), JSON compacto y gzip, las codificaciones que
+acepta el backend
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.encoding import ENCODINGS, encode_payload, decode_payload
+
+CATEGORIES = ['social', 'video', 'work', 'news', 'shopping', 'streaming', 'gaming', 'education', 'cloud', 'dev', 'other']
+PROCESSES = ['firefox', 'chrome', 'msedge', 'brave', 'opera', 'slack', 'teams', 'spotify']
+PORTS = [443, 443, 443, 80, 8443, 8080]
+
+
+def build_metrics(domains, seed=42):
+    """Payload con la forma de collect_web_metrics (motor netlink, con bytes)"""
+    rng = random.Random(seed)
+    domain_stats = {}
+    for i in range(domains):
+        processes = sorted(set(rng.choice(PROCESSES) for _ in range(rng.randint(1, 3))))
+        bytes_by_process = {}
+        for name in processes:
+            bytes_by_process[name] = {'bytes_sent': rng.randint(0, 200000), 'bytes_recv': rng.randint(0, 5000000)}
+        domain_stats[f"{rng.choice(['cdn', 'www', 'api', 'static'])}{i}.site{i % 997}.com"] = {
+            'connections': rng.randint(1, 40),
+            'processes': processes,
+            'ports': sorted(set(rng.choice(PORTS) for _ in range(rng.randint(1, 2)))),
+            'bytes_sent': sum(b['bytes_sent'] for b in bytes_by_process.values()),
+            'bytes_recv': sum(b['bytes_recv'] for b in bytes_by_process.values()),
+            'bytes_by_process': bytes_by_process,
+            'category': rng.choice(CATEGORIES)
+        }
+    top = sorted(domain_stats.items(), key=lambda item: item[1]['connections'], reverse=True)[:10]
+    summary = {}
+    for stats in domain_stats.values():
+        entry = summary.setdefault(stats['category'], {'domains': 0, 'connections': 0})
+        entry['domains'] += 1
+        entry['connections'] += stats['connections']
+    return {
+        'timestamp': datetime(2025, 1, 1).isoformat(),
+        'agent_id': 'bench-host',
+        'total_connections': sum(s['connections'] for s in domain_stats.values()),
+        'total_domains': len(domain_stats),
+        'total_bytes_sent': sum(s['bytes_sent'] for s in domain_stats.values()),
+        'total_bytes_recv': sum(s['bytes_recv'] for s in domain_stats.values()),
+        'active_browsers': 4,
+        'domain_stats': domain_stats,
+        'browser_processes': [
+            {'pid': 1000 + i, 'name': name, 'memory_mb': 350.5, 'cpu_percent': 2.5, 'memory_delta_mb': 0.4}
+            for i, name in enumerate(PROCESSES[:4])
+        ],
+        'top_domains': [[domain, stats['connections']] for domain, stats in top],
+        'categories_summary': summary
+    }
+
+
+def measure(encode, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(body), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de codificación del payload')
+    parser.add_argument('--sizes', default='10,100,1000,5000', help='Dominios por payload (lista separada por comas)')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por medida (se toma la mejor)')
+    args = parser.parse_args()
+
+    variants = [
+        ('json indent=2 (original)', lambda p: json.dumps(p, indent=2).encode('utf-8')),
+        ('json', lambda p: encode_payload(p, 'json')[0])
+    ]
+    for level in (1, 6, 9):
+        variants.append((f"gzip nivel {level}", lambda p, level=level: encode_payload(p, 'gzip', level)[0]))
+
+    print("📊 ZienShield Benchmark - Codificación del payload")
+    print("=" * 78)
+
+    for domains in [int(size) for size in args.sizes.split(',')]:
+        metrics = build_metrics(domains)
+        # Comprobar que cada codificación es reversible
+        for name in ENCODINGS:
+            body, headers = encode_payload(metrics, name)
+            assert decode_payload(body, headers) == json.loads(json.dumps(metrics)), name
+
+        print("-" * 78)
+        print(f"{domains} dominios")
+        baseline = None
+        for label, encode in variants:
+            size, elapsed = measure(lambda: encode(metrics), args.repeat)
+            baseline = baseline or size
+            print(f"  {label:<28} {size / 1024:10.1f} KB  {size / baseline:6.1%}  {elapsed * 1000:8.2f} ms")
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    main()
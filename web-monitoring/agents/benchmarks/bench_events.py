@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Lectura del log NDJSON
+Lectura cruda frente a readline + regex + json.loads sobre el formato antiguo
+con prefijo, read_events/validate_log sobre NDJSON (incluidos segmentos .gz)
+y reanudación desde una secuencia sin decodificar lo anterior
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.events import build_event, read_events, validate_log, log_files, open_log
+from zienshield_agent.logwriter import RotatingLogWriter
+
+LEGACY_PATTERN = re.compile(r'ZienShield-WebTraffic.*?: (.+)$')
+
+
+def build_metrics(index, domains):
+    return {
+        'timestamp': f"2025-01-01T00:{index // 60 % 60:02d}:{index % 60:02d}",
+        'agent_id': 'bench-host',
+        'total_connections': domains * 3,
+        'domain_stats': {f"site{i}.com": {'connections': i % 9 + 1, 'category': 'other'} for i in range(domains)}
+    }
+
+
+def write_logs(directory, lines, domains, max_bytes):
+    """Mismo contenido en formato antiguo (con prefijo) y en NDJSON con rotación a .gz"""
+    legacy_path = os.path.join(directory, 'legacy.log')
+    ndjson_path = os.path.join(directory, 'ndjson.log')
+    writer = RotatingLogWriter(ndjson_path, max_bytes=max_bytes, backups=1000)
+    with open(legacy_path, 'w', encoding='utf-8') as legacy:
+        for index in range(lines):
+            event = build_event(build_metrics(index, domains), 'linux', 'ZienShield Web Traffic Metrics')
+            legacy.write(f"ZienShield-WebTraffic: {json.dumps(dict({'seq': index + 1}, **event))}\n")
+            writer.write(event)
+    writer.close()
+    # Esperar a la compresión en segundo plano
+    deadline = time.monotonic() + 30
+    while [name for name in glob.glob(ndjson_path + '.*') if name[-1].isdigit()] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.1)
+    return legacy_path, ndjson_path
+
+
+def measure(label, function, size):
+    start = time.perf_counter()
+    count = function()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<42} {count:8d} eventos  {elapsed * 1000:8.1f} ms  {size / 1024 / 1024 / elapsed:8.1f} MB/s")
+    return elapsed
+
+
+def raw_read(path):
+    count = 0
+    for name in log_files(path):
+        with open_log(name) as f:
+            while True:
+                chunk = f.read(4 * 1024 * 1024)
+                if not chunk:
+                    break
+                count += chunk.count(b'\n')
+    return count
+
+
+def naive_read(path):
+    count = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = LEGACY_PATTERN.search(line)
+            if match and json.loads(match.group(1)).get('zienshield_web_traffic'):
+                count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de lectura del log NDJSON')
+    parser.add_argument('--lines', type=int, default=20000, help='Eventos en el log')
+    parser.add_argument('--domains', type=int, default=50, help='Dominios por evento')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='zienshield-events-')
+    try:
+        print("📊 ZienShield Benchmark - Lectura del log NDJSON")
+        print("=" * 100)
+        legacy_path, ndjson_path = write_logs(directory, args.lines, args.domains, max_bytes=8 * 1024 * 1024)
+        legacy_size = os.path.getsize(legacy_path)
+        # Tamaño sin comprimir del NDJSON (activo + segmentos .gz)
+        ndjson_size = 0
+        for name in log_files(ndjson_path):
+            with open_log(name) as f:
+                ndjson_size += len(f.read())
+        segments = len(log_files(ndjson_path)) - 1
+        print(f"  formato antiguo: {legacy_size / 1024 / 1024:.1f} MB  NDJSON: {ndjson_size / 1024 / 1024:.1f} MB "
+              f"({segments} segmentos .gz + activo)")
+
+        measure('lectura cruda (NDJSON + gunzip)', lambda: raw_read(ndjson_path), ndjson_size)
+        naive = measure('readline + regex + json.loads (antiguo)', lambda: naive_read(legacy_path), legacy_size)
+        events = measure('read_events (NDJSON)', lambda: sum(1 for _ in read_events(ndjson_path)), ndjson_size)
+        measure('read_events (antiguo, legacy=True)', lambda: sum(1 for _ in read_events(legacy_path)), legacy_size)
+
+        start = time.perf_counter()
+        summary = validate_log(ndjson_path)
+        elapsed = time.perf_counter() - start
+        print(f"  {'validate_log (NDJSON)':<42} {summary['valid']:8d} eventos  {elapsed * 1000:8.1f} ms  "
+              f"{ndjson_size / 1024 / 1024 / elapsed:8.1f} MB/s  inválidos: {summary['invalid']}, "
+              f"huecos: {summary['gaps']}, secuencia {summary['first_seq']}-{summary['last_seq']}")
+
+        # Reanudar tras el 90% del log: las líneas anteriores se saltan sin json.loads
+        resume = args.lines * 9 // 10
+        start = time.perf_counter()
+        resumed = list(read_events(ndjson_path, from_sequence=resume))
+        elapsed = time.perf_counter() - start
+        print(f"  {'read_events(from_sequence=90%)':<42} {len(resumed):8d} eventos  {elapsed * 1000:8.1f} ms  "
+              f"primera secuencia: {resumed[0]['seq'] if resumed else None}")
+        print(f"  NDJSON frente al lector ingenuo: {naive / events:.1f}x")
+        print("=" * 100)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Endpoint /metrics
+Coste de generar la exposición una vez por ciclo frente al de cada scrape
+(texto y gzip), y series expuestas con y sin el límite de dominios
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import http.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.exporter import MetricsExporter, render_metrics
+from zienshield_agent.selfmetrics import CycleTimer
+
+CATEGORIES = ['social', 'video', 'work', 'news', 'shopping', 'streaming', 'other']
+
+
+def make_metrics(domains, agent_self):
+    domain_stats = {
+        f"site{i}.com": {'connections': i % 13 + 1, 'category': CATEGORIES[i % len(CATEGORIES)],
+                         'bytes_sent': i * 100, 'bytes_recv': i * 1000}
+        for i in range(domains)
+    }
+    summary = {}
+    for stats in domain_stats.values():
+        entry = summary.setdefault(stats['category'], {'connections': 0, 'domains': 0})
+        entry['connections'] += stats['connections']
+        entry['domains'] += 1
+    return {
+        'agent_id': 'bench-host',
+        'total_connections': sum(stats['connections'] for stats in domain_stats.values()),
+        'total_bytes_sent': sum(stats['bytes_sent'] for stats in domain_stats.values()),
+        'total_bytes_recv': sum(stats['bytes_recv'] for stats in domain_stats.values()),
+        'active_browsers': 3,
+        'domain_stats': domain_stats,
+        'categories_summary': summary,
+        'agent_self': agent_self
+    }
+
+
+def series_count(body):
+    return sum(1 for line in body.splitlines() if line and not line.startswith(b'#'))
+
+
+def scrape(port, scrapes, use_gzip):
+    """Latencia por scrape (ms) sobre una conexión nueva cada vez, como Prometheus"""
+    headers = {'Accept-Encoding': 'gzip'} if use_gzip else {}
+    latencies = []
+    size = 0
+    for _ in range(scrapes):
+        start = time.perf_counter()
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        connection.request('GET', '/metrics', headers=headers)
+        size = len(connection.getresponse().read())
+        connection.close()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del endpoint /metrics')
+    parser.add_argument('--domains', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='Dominios por ciclo')
+    parser.add_argument('--max-domains', type=int, default=100, help='Dominios con etiqueta propia')
+    parser.add_argument('--scrapes', type=int, default=200, help='Scrapes por medida')
+    args = parser.parse_args()
+
+    timer = CycleTimer(window=120)
+    for phase in ('enumeration', 'dns', 'aggregation', 'categorization', 'serialization'):
+        with timer.phase(phase):
+            pass
+    agent_self = timer.snapshot()
+
+    exporter = MetricsExporter(0, 'bench', max_domains=args.max_domains)
+    port = exporter.server.server_address[1]
+
+    print("📊 ZienShield Benchmark - Endpoint /metrics")
+    print("=" * 100)
+    print(f"Límite de dominios: {args.max_domains} | scrapes por medida: {args.scrapes}")
+    print(f"{'dominios':>9} {'series sin límite':>18} {'series':>7} {'render+gzip':>12} "
+          f"{'scrape texto':>13} {'scrape gzip':>12} {'KB texto':>9} {'KB gzip':>8}")
+    print("-" * 100)
+    for domains in args.domains:
+        metrics = make_metrics(domains, agent_self)
+        uncapped = series_count(render_metrics(metrics, 'bench', max_domains=domains))
+        start = time.perf_counter()
+        exporter.update(metrics)
+        render_ms = (time.perf_counter() - start) * 1000
+        series = series_count(exporter.body[0])
+        plain_ms, plain_size = scrape(port, args.scrapes, False)
+        gzip_ms, gzip_size = scrape(port, args.scrapes, True)
+        print(f"{domains:>9,} {uncapped:>18,} {series:>7,} {render_ms:>9.2f} ms {plain_ms:>10.3f} ms "
+              f"{gzip_ms:>9.3f} ms {plain_size / 1024:>9.1f} {gzip_size / 1024:>8.1f}")
+    print("=" * 100)
+    exporter.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Motor de ZienShieldWebMonitorLite
+Compara el coste por ciclo de fork + parseo (netstat/ss/ps) con la lectura
+directa de /proc, opcionalmente con sockets de loopback adicionales abiertos
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import importlib.util
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENTS_DIR)
+
+
+def load_lite_monitor():
+    """Cargar ZienShieldWebMonitorLite desde su script"""
+    spec = importlib.util.spec_from_file_location(
+        'zienshield_web_monitor_lite', os.path.join(AGENTS_DIR, 'zienshield-web-monitor-lite.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.ZienShieldWebMonitorLite
+
+
+def open_loopback_connections(count):
+    """Abrir count conexiones TCP establecidas contra un servidor local"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1024)
+    sockets = [server]
+    for _ in range(count):
+        client = socket.create_connection(server.getsockname())
+        accepted, _ = server.accept()
+        sockets.extend((client, accepted))
+    return sockets
+
+
+def measure(function, cycles):
+    """Mejor tiempo de varias repeticiones (ms) y número de registros"""
+    best = None
+    records = 0
+    for _ in range(cycles):
+        start = time.perf_counter()
+        records = len(function())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del motor Lite (fork vs /proc)')
+    parser.add_argument('--sockets', type=int, default=0, help='Conexiones de loopback adicionales')
+    parser.add_argument('--cycles', type=int, default=10, help='Repeticiones por medición')
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/net/tcp'):
+        print("❌ /proc/net/tcp no disponible: este benchmark requiere Linux")
+        sys.exit(1)
+
+    sockets = open_loopback_connections(args.sockets)
+    monitor = load_lite_monitor()(data_dir=tempfile.mkdtemp(prefix='zienshield-bench-'))
+
+    def proc_connections():
+        monitor.process_table.refresh()
+        return monitor.get_active_connections_proc()
+
+    def proc_browsers():
+        monitor.process_table.refresh()
+        return monitor.get_browser_processes_proc()
+
+    print("📊 ZienShield Benchmark - Motor Lite")
+    print("=" * 70)
+    print(f"Conexiones extra: {args.sockets} | procesos: {len(os.listdir('/proc'))} entradas en /proc")
+    print("-" * 70)
+    rows = [
+        ('netstat -tnp (fork + parseo)', monitor.get_active_connections_netstat),
+        ('ss -tnp (fork + parseo)', monitor.get_active_connections_ss),
+        ('/proc/net + /proc/*/fd', proc_connections),
+        ('ps aux (fork + parseo)', monitor.get_browser_processes_ps),
+        ('/proc/[pid]/stat', proc_browsers),
+    ]
+    for label, function in rows:
+        elapsed, records = measure(function, args.cycles)
+        print(f"{label:<34} {elapsed:9.2f} ms  ({records} registros)")
+
+    print("=" * 70)
+    for sock in sockets:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Escritor del log de Wazuh
+Abrir/escribir/cerrar por ciclo con syslog.openlog/closelog (original) frente a
+RotatingLogWriter, más rotación con gzip y continuidad de la secuencia
+"""
+
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.logwriter import RotatingLogWriter, line_sequence
+
+try:
+    import syslog
+    SYSLOG_AVAILABLE = True
+except ImportError:
+    SYSLOG_AVAILABLE = False
+
+
+def build_entry(domains):
+    return {
+        'zienshield_web_traffic': {
+            'timestamp': '2025-01-01T00:00:00',
+            'agent_id': 'bench-host',
+            'domain_stats': {f"site{i}.com": {'connections': i % 9 + 1, 'category': 'other'} for i in range(domains)}
+        },
+        'rule_id': 100001,
+        'level': 3,
+        'description': 'ZienShield Web Traffic Metrics'
+    }
+
+
+def original_write(log_file, entry, use_syslog):
+    log_message = f"ZienShield-WebTraffic: {json.dumps(entry)}"
+    if use_syslog:
+        syslog.openlog("zienshield-bench")
+        syslog.closelog()
+    with open(log_file, 'a') as f:
+        f.write(f"{log_message}\n")
+
+
+def bench_writes(directory, writes, domains):
+    entry = build_entry(domains)
+    use_syslog = SYSLOG_AVAILABLE
+
+    log_file = os.path.join(directory, 'original.log')
+    start = time.perf_counter()
+    for _ in range(writes):
+        original_write(log_file, entry, use_syslog)
+    original = time.perf_counter() - start
+
+    writer = RotatingLogWriter(os.path.join(directory, 'writer.log'), compress=False, max_bytes=1 << 40)
+    start = time.perf_counter()
+    for _ in range(writes):
+        writer.write(entry, prefix='ZienShield-WebTraffic')
+    writer.close()
+    buffered = time.perf_counter() - start
+
+    print(f"  {domains:5d} dominios  original: {original / writes * 1e6:8.1f} µs/línea  "
+          f"RotatingLogWriter: {buffered / writes * 1e6:8.1f} µs/línea  ({original / buffered:4.1f}x)  "
+          f"flushes: {writer.counters['flushes']}")
+
+
+def bench_rotation(directory, lines):
+    path = os.path.join(directory, 'rotating.log')
+    entry = build_entry(50)
+    writer = RotatingLogWriter(path, max_bytes=256 * 1024, backups=3)
+    for _ in range(lines):
+        writer.write(entry, prefix='ZienShield-WebTraffic')
+    writer.close()
+    # Esperar a la compresión en segundo plano
+    deadline = time.monotonic() + 10
+    while glob.glob(path + '.*[0-9]') and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.1)
+
+    segments = sorted(glob.glob(path + '.*.gz'))
+    sequences = []
+    for segment in segments + [path]:
+        opener = gzip.open if segment.endswith('.gz') else open
+        with opener(segment, 'rb') as f:
+            sequences.extend(line_sequence(line) for line in f)
+    raw = sum(os.path.getsize(segment) for segment in segments)
+    contiguous = sequences == list(range(sequences[0], sequences[0] + len(sequences)))
+
+    # Reinicio: la secuencia continúa donde se quedó
+    restarted = RotatingLogWriter(path, max_bytes=256 * 1024, backups=3)
+    next_sequence = restarted.write(entry, prefix='ZienShield-WebTraffic')
+    restarted.close()
+
+    print(f"  {lines} líneas, {writer.counters['rotations']} rotaciones, {len(segments)} segmentos .gz conservados "
+          f"({raw / 1024:.0f} KB comprimidos)")
+    print(f"  secuencias {sequences[0]}-{sequences[-1]} contiguas: {contiguous}, "
+          f"tras reinicio: #{next_sequence} (esperada #{lines + 1})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del escritor del log de Wazuh')
+    parser.add_argument('--writes', type=int, default=2000, help='Líneas por medida')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='zienshield-log-')
+    try:
+        print("📊 ZienShield Benchmark - Escritor del log de Wazuh")
+        print("=" * 100)
+        print(f"Escritura (syslog.openlog/closelog por ciclo: {'sí' if SYSLOG_AVAILABLE else 'no disponible'}):")
+        for domains in (10, 100, 1000):
+            bench_writes(directory, args.writes if domains < 1000 else args.writes // 10, domains)
+        print("Rotación con gzip:")
+        bench_rotation(directory, 1000)
+        print("=" * 100)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
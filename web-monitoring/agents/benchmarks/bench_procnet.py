@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Motor /proc/net
+Mide el coste de un ciclo del colector /proc con 1k, 10k y 100k sockets
+sobre un árbol /proc sintético
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent import procnet
+
+TCP_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+
+def build_fake_proc(root, socket_count, sockets_per_process=50):
+    """Crear un árbol /proc sintético con socket_count sockets establecidos"""
+    os.makedirs(os.path.join(root, 'net'))
+    half = socket_count // 2
+
+    with open(os.path.join(root, 'net', 'tcp'), 'w') as f:
+        f.write(TCP_HEADER)
+        for i in range(half):
+            local = f"0100A8C0:{(40000 + i % 20000):04X}"
+            remote = f"{(0x08080808 + i % 5000):08X}:01BB"
+            f.write(f"{i:4d}: {local} {remote} 01 00000000:00000000 00:00000000 00000000  1000        0 {100000 + i} 1 0000000000000000 20 4 30 10 -1\n")
+        # Sockets en escucha que el colector debe descartar
+        for i in range(half // 10):
+            f.write(f"{i:4d}: 00000000:{(1024 + i):04X} 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 {900000 + i} 1 0000000000000000 100 0 0 10 0\n")
+
+    with open(os.path.join(root, 'net', 'tcp6'), 'w') as f:
+        f.write(TCP_HEADER)
+        for i in range(socket_count - half):
+            local = f"0000000000000000FFFF00000100A8C0:{(40000 + i % 20000):04X}"
+            remote = f"B80D0120000000000000000{(i % 5000):09X}:01BB"
+            f.write(f"{i:4d}: {local} {remote} 01 00000000:00000000 00:00000000 00000000  1000        0 {500000 + i} 1 0000000000000000 20 4 30 10 -1\n")
+
+    inodes = [100000 + i for i in range(half)] + [500000 + i for i in range(socket_count - half)]
+    for offset in range(0, len(inodes), sockets_per_process):
+        pid = str(1000 + offset // sockets_per_process)
+        fd_dir = os.path.join(root, pid, 'fd')
+        os.makedirs(fd_dir)
+        with open(os.path.join(root, pid, 'comm'), 'w') as f:
+            f.write('chrome\n')
+        with open(os.path.join(root, pid, 'cmdline'), 'wb') as f:
+            f.write(b'/opt/google/chrome/chrome\0--type=renderer\0--lang=es\0')
+        # Descriptores que no son sockets, como en un proceso real
+        for fd in range(3):
+            os.symlink('/dev/null', os.path.join(fd_dir, str(fd)))
+        for fd, inode in enumerate(inodes[offset:offset + sockets_per_process], start=3):
+            os.symlink(f'socket:[{inode}]', os.path.join(fd_dir, str(fd)))
+
+
+def timed(func, repeat):
+    """Ejecutar func repeat veces y devolver (mejor, media) en milisegundos"""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return min(samples), sum(samples) / len(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del motor /proc/net')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Tamaños de tabla separados por comas')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por medición')
+    args = parser.parse_args()
+
+    print("📊 ZienShield Benchmark - Motor /proc/net")
+    print("=" * 78)
+    print(f"{'sockets':>10} {'tabla (ms)':>14} {'inodos->pid (ms)':>18} {'ciclo (ms)':>14} {'conexiones':>12}")
+    print("-" * 78)
+
+    for size in [int(s) for s in args.sizes.split(',')]:
+        root = tempfile.mkdtemp(prefix='zienshield-proc-')
+        try:
+            build_fake_proc(root, size)
+            collector = procnet.ProcNetCollector(proc_root=root)
+
+            table_best, _, table = timed(lambda: procnet.read_tcp_table(root), args.repeat)
+            inodes = [entry.inode for entry in table]
+            owners_best, _, _ = timed(lambda: procnet.map_inodes_to_pids(inodes, root), args.repeat)
+            cycle_best, cycle_avg, connections = timed(collector.collect, args.repeat)
+
+            print(f"{size:>10} {table_best:>14.1f} {owners_best:>18.1f} {cycle_best:>14.1f} {len(connections):>12}")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print("=" * 78)
+    print("ℹ️  Tiempos: mejor de", args.repeat, "repeticiones")
+
+
+if __name__ == "__main__":
+    main()
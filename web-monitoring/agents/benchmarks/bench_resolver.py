@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Resolución inversa de DNS
+Compara la resolución serie original con ReverseResolver frente a un
+servidor PTR UDP local con latencia y fallos inyectados
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import struct
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.cache import TTLCache
+from zienshield_agent.resolver import ReverseResolver
+
+
+def encode_name(name):
+    """Codificar un nombre DNS en formato de etiquetas"""
+    return b''.join(bytes([len(label)]) + label.encode() for label in name.split('.') if label) + b'\0'
+
+
+def decode_name(data, offset):
+    """Decodificar un nombre DNS sin compresión"""
+    labels = []
+    while data[offset]:
+        length = data[offset]
+        labels.append(data[offset + 1:offset + 1 + length].decode())
+        offset += 1 + length
+    return '.'.join(labels), offset + 1
+
+
+class FakeDNSResponder:
+    """Servidor PTR UDP local con latencia, IPs sin PTR y consultas sin respuesta"""
+
+    def __init__(self, latency_ms=40, jitter_ms=30, unresolvable_ratio=0.1,
+                 hang_ratio=0.02, seed=42):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.unresolvable_ratio = unresolvable_ratio
+        self.hang_ratio = hang_ratio
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.queries = 0
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.address = self.sock.getsockname()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            query, client = self.sock.recvfrom(512)
+            with self.lock:
+                self.queries += 1
+                roll = self.random.random()
+                delay = self.latency + self.random.random() * self.jitter
+            if roll < self.hang_ratio:
+                # Consulta perdida: el cliente agota su timeout
+                continue
+            threading.Timer(delay, self._reply, (query, client, roll >= self.hang_ratio + self.unresolvable_ratio)).start()
+
+    def _reply(self, query, client, resolvable):
+        name, end = decode_name(query, 12)
+        question = query[12:end + 4]
+        if not resolvable:
+            response = query[:2] + struct.pack('>HHHHH', 0x8183, 1, 0, 0, 0) + question
+        else:
+            octets = name.split('.')[:4][::-1]
+            rdata = encode_name(f"server-{'-'.join(octets)}.cdn{int(octets[3]) % 50}.example.com")
+            answer = struct.pack('>HHHIH', 0xC00C, 12, 1, 60, len(rdata)) + rdata
+            response = query[:2] + struct.pack('>HHHHH', 0x8180, 1, 1, 0, 0) + question + answer
+        self.sock.sendto(response, client)
+
+    def make_lookup(self, timeout=10.0):
+        """Función de consulta PTR contra este servidor (sustituye a gethostbyaddr)"""
+        def lookup(ip):
+            query_id = random.randint(0, 0xFFFF)
+            qname = '.'.join(reversed(ip.split('.'))) + '.in-addr.arpa'
+            query = struct.pack('>HHHHHH', query_id, 0x0100, 1, 0, 0, 0) + encode_name(qname) + struct.pack('>HH', 12, 1)
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.settimeout(timeout)
+                sock.sendto(query, self.address)
+                response = sock.recv(512)
+            flags, _qd, answers = struct.unpack('>HHH', response[2:8])
+            if flags & 0xF or not answers:
+                raise socket.herror(1, 'Unknown host')
+            _qname, offset = decode_name(response, 12)
+            # Saltar QTYPE/QCLASS y la cabecera del registro (puntero + tipo, clase, ttl, longitud)
+            hostname, _ = decode_name(response, offset + 4 + 12)
+            return hostname
+        return lookup
+
+
+def extract_domain(hostname):
+    domain_parts = hostname.split('.')
+    if len(domain_parts) >= 2:
+        return '.'.join(domain_parts[-2:])
+    return hostname
+
+
+def serial_resolve(ips, lookup, cache):
+    """Implementación original: consultas en serie, sin plazo"""
+    for ip in ips:
+        if ip in cache:
+            continue
+        try:
+            cache[ip] = extract_domain(lookup(ip))
+        except Exception:
+            cache[ip] = ip
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de resolución inversa')
+    parser.add_argument('--ips', type=int, default=200, help='IPs distintas por ciclo')
+    parser.add_argument('--latency', type=float, default=40, help='Latencia media del respondedor (ms)')
+    parser.add_argument('--hang-ratio', type=float, default=0.02, help='Fracción de consultas colgadas')
+    parser.add_argument('--workers', type=int, default=8, help='Hilos del resolver')
+    parser.add_argument('--cycle-timeout', type=float, default=5.0, help='Plazo por ciclo (s)')
+    parser.add_argument('--lookup-timeout', type=float, default=2.0, help='Plazo por consulta (s)')
+    parser.add_argument('--query-timeout', type=float, default=10.0,
+                        help='Timeout del cliente ante consultas sin respuesta (s), como el resolver del sistema')
+    parser.add_argument('--serial', action='store_true', help='Medir también la resolución en serie (lenta)')
+    args = parser.parse_args()
+
+    ips = [f"203.0.{i // 250}.{i % 250 + 1}" for i in range(args.ips)]
+
+    print("📊 ZienShield Benchmark - Resolución inversa")
+    print("=" * 70)
+    print(f"IPs: {args.ips} | latencia: {args.latency} ms | colgadas: {args.hang_ratio:.0%} | workers: {args.workers}")
+    print("-" * 70)
+
+    if args.serial:
+        responder = FakeDNSResponder(latency_ms=args.latency, hang_ratio=args.hang_ratio)
+        start = time.perf_counter()
+        serial_resolve(ips, responder.make_lookup(args.query_timeout), {})
+        print(f"{'serie (original)':<28} ciclo 1: {time.perf_counter() - start:8.2f} s")
+
+    responder = FakeDNSResponder(latency_ms=args.latency, hang_ratio=args.hang_ratio)
+    cache = TTLCache()
+    resolver = ReverseResolver(
+        cache,
+        transform=extract_domain,
+        lookup=responder.make_lookup(args.query_timeout),
+        max_workers=args.workers,
+        lookup_timeout=args.lookup_timeout,
+        cycle_timeout=args.cycle_timeout
+    )
+
+    for cycle in range(1, 4):
+        start = time.perf_counter()
+        results = resolver.resolve_many(ips)
+        elapsed = time.perf_counter() - start
+        raw = sum(1 for ip, domain in results.items() if domain == ip)
+        print(f"{'ReverseResolver':<28} ciclo {cycle}: {elapsed:8.2f} s  "
+              f"(en bruto: {raw}, consultas: {responder.queries})")
+        # Simular el intervalo entre ciclos para que terminen las pendientes
+        time.sleep(min(args.cycle_timeout, 2.0))
+
+    print("-" * 70)
+    print(f"Resolver: {resolver.stats}")
+    print(f"Caché:    {cache.stats()}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Payload compacto v2
+Bytes por sesión de ciclos en v1 (completo) frente a v2 (sin agregados
+derivables, host una vez por sesión, diccionario de cadenas), en JSON y gzip,
+y comprobación de que el expansor de referencia reproduce el v1 exacto
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.payload import get_top_domains, get_category_summary
+from zienshield_agent.slim import SlimEncoder, SlimExpander
+
+CATEGORIES = ['social', 'video', 'work', 'news', 'shopping', 'streaming', 'gaming', 'education', 'other']
+PROCESSES = ['firefox', 'chrome', 'msedge', 'brave', 'opera', 'slack', 'teams', 'spotify']
+
+
+class CycleGenerator:
+    """Ciclos consecutivos de un agente: la mayoría de dominios persiste entre ciclos"""
+
+    def __init__(self, variant, domains, seed=42):
+        self.variant = variant
+        self.rng = random.Random(seed)
+        self.pool = [f"{self.rng.choice(['cdn', 'www', 'api'])}{i}.site{i % 997}.com" for i in range(domains * 2)]
+        self.categories = {domain: self.rng.choice(CATEGORIES) for domain in self.pool}
+        self.active = self.pool[:domains]
+        self.cycle = 0
+
+    def domain_stats(self):
+        rng = self.rng
+        # Rotar ~10% de los dominios activos en cada ciclo
+        for _ in range(len(self.active) // 10):
+            self.active[rng.randrange(len(self.active))] = rng.choice(self.pool)
+        domain_stats = {}
+        for domain in self.active:
+            processes = sorted(set(rng.choice(PROCESSES) for _ in range(rng.randint(1, 3))))
+            stats = {
+                'connections': rng.randint(1, 40),
+                'processes': processes,
+                'ports': [443],
+                'category': self.categories[domain]
+            }
+            if self.variant == 'linux':
+                by_process = {name: {'bytes_sent': rng.randint(0, 9999), 'bytes_recv': rng.randint(0, 99999)}
+                              for name in processes}
+                stats['bytes_sent'] = sum(b['bytes_sent'] for b in by_process.values())
+                stats['bytes_recv'] = sum(b['bytes_recv'] for b in by_process.values())
+                stats['bytes_by_process'] = by_process
+            domain_stats[domain] = stats
+        return domain_stats
+
+    def next(self):
+        self.cycle += 1
+        domain_stats = self.domain_stats()
+        timestamp = f"2025-01-01T00:{self.cycle // 2 % 60:02d}:{self.cycle % 2 * 30:02d}"
+        if self.variant == 'linux':
+            browsers = [
+                {'browser': 'chrome', 'pid': 2000 + i, 'name': 'chrome',
+                 'cmdline': '/opt/google/chrome/chrome --type=renderer --enable-crash-reporter',
+                 'cpu_percent': 1.5, 'memory_mb': 210.3, 'memory_delta_mb': 0.1}
+                for i in range(12)
+            ]
+            return {
+                'timestamp': timestamp,
+                'agent_id': 'bench-host',
+                'total_connections': sum(s['connections'] for s in domain_stats.values()),
+                'total_domains': len(domain_stats),
+                'total_bytes_sent': sum(s['bytes_sent'] for s in domain_stats.values()),
+                'total_bytes_recv': sum(s['bytes_recv'] for s in domain_stats.values()),
+                'active_browsers': len(browsers),
+                'domain_stats': domain_stats,
+                'browser_processes': browsers,
+                'top_domains': get_top_domains(domain_stats, 10),
+                'categories_summary': get_category_summary(domain_stats)
+            }
+        browsers = [
+            {'browser': name, 'pid': 0, 'name': name, 'cmdline': f'{name} ({count} procesos)',
+             'cpu_percent': 0.0, 'memory_mb': 512.4, 'process_count': count}
+            for name, count in (('chrome', 14), ('msedge', 6))
+        ]
+        return {
+            'timestamp': timestamp,
+            'agent_id': 'DESKTOP-BENCH-user-12345',
+            'hostname': 'DESKTOP-BENCH',
+            'username': 'user',
+            'os_info': {'system': 'Windows', 'release': '10', 'version': '10.0.19045', 'architecture': '64bit'},
+            'total_connections': sum(s['connections'] for s in domain_stats.values()),
+            'total_domains': len(domain_stats),
+            'active_browsers': sum(b['process_count'] for b in browsers),
+            'browser_types': len(browsers),
+            'domain_stats': domain_stats,
+            'browser_processes': browsers,
+            'top_domains': get_top_domains(domain_stats, 15),
+            'categories_summary': get_category_summary(domain_stats),
+            'monitor_version': 'windows-portable-1.0'
+        }
+
+
+def compact(document):
+    return json.dumps(document, separators=(',', ':')).encode('utf-8')
+
+
+def normalized(document):
+    # Las tuplas de top_domains llegan como listas tras el JSON
+    return json.loads(json.dumps(document, sort_keys=True))
+
+
+def bench_session(variant, domains, cycles):
+    generator = CycleGenerator(variant, domains)
+    encoder = SlimEncoder(top_domains_limit=10 if variant == 'linux' else 15)
+    expander = SlimExpander()
+    v1_bytes = v1_gzip = v2_bytes = v2_gzip = 0
+    encode_time = expand_time = 0.0
+    matches = True
+    for _ in range(cycles):
+        metrics = generator.next()
+        start = time.perf_counter()
+        payload = encoder.encode(metrics)
+        body = compact(payload)
+        encode_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        expanded = expander.expand(json.loads(body))
+        expand_time += time.perf_counter() - start
+        matches = matches and normalized(expanded) == normalized(metrics)
+
+        original = compact(metrics)
+        v1_bytes += len(original)
+        v1_gzip += len(gzip.compress(original, 6))
+        v2_bytes += len(body)
+        v2_gzip += len(gzip.compress(body, 6))
+
+    print(f"  {variant:<8} {domains:5d} dominios  v1: {v1_bytes / cycles / 1024:8.1f} KB  v2: {v2_bytes / cycles / 1024:8.1f} KB "
+          f"(-{100 - v2_bytes * 100 / v1_bytes:4.1f}%)  gzip v1: {v1_gzip / cycles / 1024:7.1f} KB  "
+          f"v2: {v2_gzip / cycles / 1024:7.1f} KB (-{100 - v2_gzip * 100 / v1_gzip:4.1f}%)  "
+          f"codificar {encode_time / cycles * 1000:6.2f} ms  expandir {expand_time / cycles * 1000:6.2f} ms  "
+          f"v1 exacto: {'✅' if matches else '❌'}")
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del payload compacto v2')
+    parser.add_argument('--sizes', default='10,100,1000', help='Dominios por ciclo (lista separada por comas)')
+    parser.add_argument('--cycles', type=int, default=20, help='Ciclos por sesión')
+    args = parser.parse_args()
+
+    print("📊 ZienShield Benchmark - Payload compacto v2 (media por ciclo en una sesión)")
+    print("=" * 100)
+    ok = True
+    for variant in ('linux', 'windows'):
+        for domains in (int(size) for size in args.sizes.split(',')):
+            ok = bench_session(variant, domains, args.cycles) and ok
+    print("=" * 100)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
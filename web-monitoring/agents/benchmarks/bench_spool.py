@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Spool en disco con reenvío
+Escritura con fsync por registro frente a fsync por lotes, integridad ante
+registros corruptos y caída del backend con reenvío en orden y a ritmo limitado
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.encoding import decode_payload
+from zienshield_agent.sender import BackgroundSender
+from zienshield_agent.spool import Spool
+from zienshield_agent.uploader import UploadClient
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Sustituto de /agent-metrics que puede simular una caída"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        status = 503 if server.down else 200
+        if status == 200:
+            metrics = decode_payload(body, self.headers)
+            with server.lock:
+                server.received.append((time.monotonic(), metrics['timestamp']))
+        reply = b'{"success":true}'
+        self.wfile.write(
+            f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\nContent-Length: {len(reply)}\r\n\r\n".encode()
+            + reply
+        )
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.lock = threading.Lock()
+        self.down = False
+        self.received = []
+
+
+def make_metrics(cycle, domains=50):
+    return {
+        'timestamp': (datetime(2025, 1, 1) + timedelta(seconds=30 * cycle)).isoformat(),
+        'agent_id': 'bench-host',
+        'domain_stats': {f"site{i}.com": {'connections': (i + cycle) % 9 + 1} for i in range(domains)}
+    }
+
+
+def bench_append(records):
+    payload = make_metrics(0)
+    for label, fsync_records, fsync_interval in (('fsync por registro', 1, 0.0), ('fsync por lotes (50 / 2 s)', 50, 2.0)):
+        directory = tempfile.mkdtemp(prefix='zienshield-spool-')
+        try:
+            spool = Spool(directory, fsync_records=fsync_records, fsync_interval=fsync_interval)
+            start = time.perf_counter()
+            for _ in range(records):
+                spool.append(payload)
+            spool.close()
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<28} {records / elapsed:10.0f} registros/s  fsyncs: {spool.counters['fsyncs']}")
+        finally:
+            shutil.rmtree(directory)
+
+
+def check_integrity():
+    directory = tempfile.mkdtemp(prefix='zienshield-spool-')
+    try:
+        spool = Spool(directory, segment_bytes=4096)
+        for cycle in range(20):
+            spool.append(make_metrics(cycle, 5))
+        spool.close()
+        # Corromper un byte de un registro del primer segmento y truncar el último
+        segments = sorted(name for name in os.listdir(directory) if name.endswith('.seg'))
+        with open(os.path.join(directory, segments[0]), 'r+b') as f:
+            f.seek(40)
+            f.write(b'#')
+        with open(os.path.join(directory, segments[-1]), 'r+b') as f:
+            f.truncate(os.path.getsize(os.path.join(directory, segments[-1])) - 5)
+
+        spool = Spool(directory)
+        records, position, consumed = spool.read(100)
+        spool.ack(position, consumed)
+        timestamps = [payload['timestamp'] for _, payload in records]
+        print(f"  {len(segments)} segmentos, {consumed} leídos, {len(records)} válidos, "
+              f"corruptos: {spool.counters['corrupted']}, en orden: {timestamps == sorted(timestamps)}, "
+              f"pendientes tras ack: {len(spool)}")
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_outage(cycles, period, outage, replay_rate):
+    server = RecordingServer(('127.0.0.1', 0), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = UploadClient(f"http://127.0.0.1:{server.server_address[1]}", encoding='gzip')
+    directory = tempfile.mkdtemp(prefix='zienshield-spool-')
+    try:
+        sender = BackgroundSender(
+            lambda payload: client.post_payload('/agent-metrics', payload).status_code == 200,
+            spool_dir=directory, replay_rate=replay_rate, retry_delay=period * 2, max_retry_delay=period * 8
+        )
+        recovered_at = None
+        for cycle in range(cycles):
+            server.down = outage[0] <= cycle < outage[1]
+            if cycle == outage[1]:
+                recovered_at = time.monotonic()
+            sender.put(make_metrics(cycle))
+            time.sleep(period)
+        drained = sender.close(timeout=60)
+        stats = sender.stats()
+
+        received = [timestamp for _, timestamp in server.received]
+        expected = [make_metrics(cycle, 0)['timestamp'] for cycle in range(cycles)]
+        after = [at for at, _ in server.received if at >= recovered_at]
+        # Peor segundo tras la recuperación: peticiones por ventana de 1 s
+        peak = max((sum(1 for other in after if at <= other < at + 1.0) for at in after), default=0)
+        print(f"  ciclos: {cycles}, caída: ciclos {outage[0]}-{outage[1] - 1}, vaciado: {drained}")
+        print(f"  recibidos: {len(received)}/{cycles}, en orden y sin huecos: {received == expected}, "
+              f"reenviados: {stats['replayed']}, reintentos: {stats['retries']}")
+        print(f"  pico tras la recuperación: {peak} peticiones/s (límite {replay_rate:g}/s + ciclos nuevos)")
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del spool en disco')
+    parser.add_argument('--records', type=int, default=2000, help='Registros para la prueba de escritura')
+    parser.add_argument('--cycles', type=int, default=80, help='Ciclos simulados en la prueba de caída')
+    parser.add_argument('--period', type=float, default=0.05, help='Intervalo de ciclo escalado (s)')
+    parser.add_argument('--replay-rate', type=float, default=10.0, help='Ciclos/s al reenviar')
+    args = parser.parse_args()
+
+    print("📊 ZienShield Benchmark - Spool en disco")
+    print("=" * 90)
+    print("Escritura:")
+    bench_append(args.records)
+    print("Integridad (un registro corrupto y el último truncado):")
+    check_integrity()
+    print("Caída del backend:")
+    bench_outage(args.cycles, args.period, (20, 50), args.replay_rate)
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Parseo en streaming de netstat/ss/ps/tasklist
+Compara capture_output + split('\\n') con CommandStream sobre salidas
+sintéticas grandes (memoria pico con tracemalloc) y valida los parsers
+contra texto de ejemplo capturado
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.streaming import (
+    CommandStream, stream_records, parse_ss_line, parse_netstat_line,
+    parse_windows_netstat_line, parse_ps_aux_line, parse_tasklist_csv_line
+)
+
+# Salidas reales de ejemplo: (parser, texto, registros esperados)
+FIXTURES = {
+    'ss -tnp': (parse_ss_line, """\
+State Recv-Q Send-Q Local Address:Port  Peer Address:Port Process
+ESTAB 0      0          10.0.0.2:43120  142.250.184.14:443 users:(("firefox",pid=4242,fd=71))
+LISTEN 0     128         0.0.0.0:22          0.0.0.0:*
+ESTAB 0      0      [2a00:1450::1]:443   [2001:db8::5]:55123 users:(("chrome",pid=9,fd=3))
+TIME-WAIT 0  0          10.0.0.2:43121  142.250.184.14:443
+""", 2),
+    'netstat -tnp': (parse_netstat_line, """\
+Active Internet connections (w/o servers)
+Proto Recv-Q Send-Q Local Address           Foreign Address         State       PID/Program name
+tcp        0      0 10.0.0.2:43120          142.250.184.14:443      ESTABLISHED 4242/firefox
+tcp        0      0 10.0.0.2:43121          142.250.184.14:443      TIME_WAIT   -
+tcp6       0      0 ::ffff:10.0.0.2:22      ::ffff:10.0.0.9:51000   ESTABLISHED -
+""", 2),
+    'netstat -an (Windows)': (parse_windows_netstat_line, """\
+
+Active Connections
+
+  Proto  Local Address          Foreign Address        State
+  TCP    0.0.0.0:135            0.0.0.0:0              LISTENING
+  TCP    192.168.1.5:52344      142.250.184.14:443     ESTABLISHED
+  TCP    [::1]:49670            [::1]:49671            ESTABLISHED
+  UDP    0.0.0.0:5353           *:*
+""", 2),
+    'ps aux': (parse_ps_aux_line, """\
+USER         PID %CPU %MEM    VSZ   RSS TTY      STAT START   TIME COMMAND
+root           1  0.0  0.1 167000 11000 ?        Ss   Oct16   0:02 /sbin/init splash
+user        4242 12.5  3.2 999999 300000 ?       Sl   10:00   1:23 /usr/lib/firefox/firefox -contentproc
+""", 2),
+    'tasklist /FO CSV': (parse_tasklist_csv_line, """\
+"Image Name","PID","Session Name","Session#","Mem Usage"
+"System Idle Process","0","Services","0","8 K"
+"chrome.exe","10932","Console","1","123,456 K"
+"msedge.exe","2000","Console","1","1.234 K"
+""", 3),
+}
+
+# Generador de una salida de ss con N sockets (1 de cada 4 establecido)
+SS_GENERATOR = r"""
+import sys
+n = int(sys.argv[1])
+out = sys.stdout
+out.write('State Recv-Q Send-Q Local Address:Port  Peer Address:Port Process\n')
+for i in range(n):
+    state = 'ESTAB' if i % 4 == 0 else 'TIME-WAIT'
+    out.write(f'{state} 0 0 10.0.{i // 65000 % 250}.{i % 250}:{i % 60000 + 1024} '
+              f'93.184.{i % 250}.{i // 250 % 250}:443 users:(("proc{i % 97}",pid={i % 30000},fd={i % 1000}))\n')
+"""
+
+
+def check_fixtures():
+    """Validar cada parser contra su texto de ejemplo"""
+    ok = True
+    for name, (parser, text, expected) in FIXTURES.items():
+        records = list(stream_records(text.splitlines(True), parser))
+        status = '✅' if len(records) == expected else '❌'
+        ok = ok and len(records) == expected
+        print(f"{status} {name:<24} {len(records)}/{expected} registros")
+    return ok
+
+
+def old_collect(cmd):
+    """Implementación original: salida completa en memoria y split"""
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    records = []
+    for line in result.stdout.strip().split('\n')[1:]:
+        record = parse_ss_line(line)
+        if record is not None:
+            records.append(record)
+    return records
+
+
+def streaming_collect(cmd):
+    return list(stream_records(CommandStream(cmd), parse_ss_line))
+
+
+def measure(function, cmd):
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = function(cmd)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de parseo en streaming')
+    parser.add_argument('--sockets', default='1000,20000,100000', help='Líneas de ss generadas')
+    args = parser.parse_args()
+
+    print("📊 ZienShield Benchmark - Parseo en streaming")
+    print("=" * 74)
+    fixtures_ok = check_fixtures()
+    print("-" * 74)
+    print(f"{'líneas':>8} {'método':<24} {'tiempo':>10} {'memoria pico':>14} {'registros':>10}")
+    for sockets in (int(value) for value in args.sockets.split(',')):
+        cmd = [sys.executable, '-c', SS_GENERATOR, str(sockets)]
+        for label, function in (('capture_output + split', old_collect), ('CommandStream', streaming_collect)):
+            elapsed, peak, records = measure(function, cmd)
+            print(f"{sockets:>8,} {label:<24} {elapsed * 1000:>7.1f} ms {peak / 1024 / 1024:>11.2f} MB {records:>10,}")
+    print("=" * 74)
+    sys.exit(0 if fixtures_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+ZienShield Benchmark - Cliente de subida persistente
+Compara requests.post por envío (original) con UploadClient (keep-alive)
+contra un servidor local que cuenta las conexiones aceptadas
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zienshield_agent.uploader import UploadClient
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Sustituto de /agent-metrics con keep-alive HTTP/1.1"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = b'{"success":true}'
+        # Respuesta en una sola escritura para no mezclar el coste de Nagle en la medida
+        self.wfile.write(
+            b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body
+        )
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingServer(ThreadingHTTPServer):
+    """Servidor que cuenta las conexiones TCP aceptadas (carga de accept del backend)"""
+    daemon_threads = True
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.accepted = 0
+
+    def get_request(self):
+        self.accepted += 1
+        return super().get_request()
+
+
+def build_payload(domains):
+    return {
+        'agent_id': 'bench',
+        'domain_stats': {
+            f"site{i}.com": {'connections': i % 7 + 1, 'processes': ['firefox'], 'ports': [443], 'category': 'other'}
+            for i in range(domains)
+        }
+    }
+
+
+def run(label, upload, server, uploads, gap):
+    accepted_before = server.accepted
+    latencies = []
+    for _ in range(uploads):
+        start = time.perf_counter()
+        upload()
+        latencies.append(time.perf_counter() - start)
+        if gap:
+            time.sleep(gap)
+    latencies.sort()
+    mean = sum(latencies) / len(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<30} media {mean * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms  "
+          f"conexiones aceptadas: {server.accepted - accepted_before}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del cliente de subida')
+    parser.add_argument('--uploads', type=int, default=200, help='Envíos por método')
+    parser.add_argument('--domains', type=int, default=100, help='Dominios por payload')
+    parser.add_argument('--gap', type=float, default=0.0, help='Pausa entre envíos (s)')
+    args = parser.parse_args()
+
+    server = CountingServer(('127.0.0.1', 0), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    payload = build_payload(args.domains)
+
+    print("📊 ZienShield Benchmark - Cliente de subida")
+    print("=" * 78)
+    print(f"Envíos: {args.uploads} | dominios: {args.domains} | "
+          f"payload: {len(json.dumps(payload)) / 1024:.1f} KB | pausa: {args.gap} s")
+    print("-" * 78)
+
+    run('requests.post (original)', lambda: requests.post(
+        f"{url}/agent-metrics", json=payload, headers={'Content-Type': 'application/json'}, timeout=10
+    ), server, args.uploads, args.gap)
+
+    client = UploadClient(url)
+    run('UploadClient (keep-alive)', lambda: client.post_json('/agent-metrics', payload),
+        server, args.uploads, args.gap)
+    print(f"UploadClient: {client.connection_stats()}")
+    print("=" * 78)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
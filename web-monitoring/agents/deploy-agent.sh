@@ -17,6 +17,7 @@ NC='\033[0m' # No Color
 ZIENSHIELD_SERVER="194.164.172.92:3001"
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )"
 INSTALL_SCRIPT="$SCRIPT_DIR/install-agent.py"
+SHARED_MODULES="$SCRIPT_DIR/zienshield_agent"
 
 print_header() {
     echo -e "${BLUE}================================${NC}"
@@ -180,14 +181,14 @@ deploy_agent() {
     if $DRY_RUN; then
         print_warning "Modo simulación - saltando despliegue real"
         print_info "Comandos que se ejecutarían:"
-        echo "  1. scp $INSTALL_SCRIPT $SSH_USER@$TARGET_HOST:/tmp/"
+        echo "  1. scp -r $INSTALL_SCRIPT $SHARED_MODULES $SSH_USER@$TARGET_HOST:/tmp/"
         echo "  2. ssh $SSH_USER@$TARGET_HOST 'python3 /tmp/install-agent.py'"
         return 0
     fi
     
     # Transferir instalador
     print_info "Transfiriendo instalador..."
-    if ! scp $(if [[ -n "$SSH_KEY" ]]; then echo "-i $SSH_KEY"; fi) -P $SSH_PORT "$INSTALL_SCRIPT" "$SSH_USER@$TARGET_HOST:/tmp/"; then
+    if ! scp $(if [[ -n "$SSH_KEY" ]]; then echo "-i $SSH_KEY"; fi) -P $SSH_PORT -r "$INSTALL_SCRIPT" "$SHARED_MODULES" "$SSH_USER@$TARGET_HOST:/tmp/"; then
         print_error "Error transfiriendo instalador"
         return 1
     fi
@@ -160,7 +160,6 @@ Deployed Agent for Remote Monitoring
 """
 
 import subprocess
-import socket
 import json
 import time
 import os
@@ -171,6 +170,20 @@ from datetime import datetime
 from collections import defaultdict
 import psutil
 
+from zienshield_agent.cache import TTLCache
+from zienshield_agent.cachestore import CacheStore
+from zienshield_agent.categories import CategoryMatcher
+from zienshield_agent.domains import registrable_domain
+from zienshield_agent.processes import ProcessTable
+from zienshield_agent.sender import BackgroundSender
+from zienshield_agent.uploader import UploadClient
+from zienshield_agent.encoding import ENCODINGS
+from zienshield_agent.batch import build_batch
+from zienshield_agent.resolver import ReverseResolver
+from zienshield_agent.selfmetrics import CycleTimer, timed_upload
+from zienshield_agent.exporter import MetricsExporter
+from zienshield_agent.governor import BudgetGovernor, dns_targets, assign_domains
+
 class ZienShieldRemoteAgent:
     def __init__(self, config_file):
         # Cargar configuración
@@ -181,11 +194,70 @@ class ZienShieldRemoteAgent:
         self.hostname = self.config['hostname']
         self.server_url = self.config['server_url']
         self.metrics_endpoint = self.config['metrics_endpoint']
+        # Conexión keep-alive reutilizada entre ciclos y payload comprimido (con vuelta a JSON plano)
+        upload_encoding = self.config.get('upload_encoding', 'gzip')
+        if upload_encoding not in ENCODINGS:
+            # El backend solo negocia JSON y gzip: cualquier otra se rechazaría en cada envío
+            print(f"⚠️ upload_encoding '{upload_encoding}' no soportada por el servidor, usando gzip")
+            upload_encoding = 'gzip'
+        self.upload_client = UploadClient(self.server_url, timeout=30, user_agent='ZienShield-Agent/1.0',
+                                          encoding=upload_encoding)
         
         # Cache y datos locales
-        self.domain_cache = {}
+        self.domain_cache = TTLCache(
+            max_entries=self.config.get('dns_cache_max_entries', 10000),
+            ttl=self.config.get('dns_cache_ttl', 3600),
+            negative_ttl=self.config.get('dns_cache_negative_ttl', 300)
+        )
+        # Caché DNS persistente en data/ de la instalación
+        self.dns_store = CacheStore(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'dns_cache.sqlite'),
+            flush_interval=self.config.get('dns_cache_flush_interval', 300)
+        )
+        self.dns_store.attach(self.domain_cache)
         self.session_start = datetime.now()
         
+        # Procesos con muestreo de CPU entre ciclos (sin esperas bloqueantes)
+        self.process_table = ProcessTable()
+        psutil.cpu_percent(interval=None)
+        
+        # Tiempo por fase de los últimos ciclos y consumo propio del agente: bloque agent_self
+        self.cycle_timer = CycleTimer(window=self.config.get('self_metrics_window', 120))
+        
+        # /metrics para Prometheus si config.json define metrics_port (por defecto solo local)
+        self.exporter = None
+        if self.config.get('metrics_port') is not None:
+            self.exporter = MetricsExporter(
+                self.config['metrics_port'], 'remote',
+                host=self.config.get('metrics_bind', '127.0.0.1'),
+                max_domains=self.config.get('metrics_max_domains', 100)
+            )
+        
+        # Envío en segundo plano con cola acotada (drop-oldest, coalesce o spill);
+        # con batch_cycles > 1 o batch_interval, varios ciclos por petición
+        # (solo batch_interval: los ciclos de ese intervalo en una petición).
+        # Lo no enviado queda en data/spool y se reenvía en orden a replay_rate ciclos/s
+        batch_cycles = self.config.get('batch_cycles', 1)
+        batch_interval = self.config.get('batch_interval', 0)
+        self.sender = BackgroundSender(
+            self.deliver_to_server,
+            max_queue=self.config.get('send_queue_size', 10),
+            overflow=self.config.get('send_overflow', 'drop-oldest'),
+            spool_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'spool'),
+            send_batch=self.send_batch_to_server if batch_cycles > 1 or batch_interval > 0 else None,
+            batch_size=batch_cycles,
+            batch_interval=batch_interval,
+            spool_max_bytes=int(self.config.get('spool_max_mb', 64) * 1024 * 1024),
+            replay_rate=self.config.get('replay_rate', 1.0)
+        )
+        
+        # Resolución inversa concurrente con plazo por ciclo
+        self.resolver = ReverseResolver(
+            self.domain_cache,
+            transform=self.extract_domain,
+            cycle_timeout=self.config.get('dns_cycle_timeout', 5.0)
+        )
+        
         # Categorías de sitios
         self.site_categories = {
             'social': ['facebook.com', 'twitter.com', 'instagram.com', 'linkedin.com', 'tiktok.com', 'snapchat.com'],
@@ -196,34 +268,43 @@ class ZienShieldRemoteAgent:
             'streaming': ['spotify.com', 'apple.com', 'soundcloud.com', 'pandora.com'],
             'gaming': ['steam.com', 'epic.com', 'battle.net', 'origin.com']
         }
+        # Emparejador compilado (sufijos por etiqueta, memoizado por dominio)
+        self.category_matcher = CategoryMatcher(self.site_categories)
+        
+        # Navegadores: detección de procesos y rDNS prioritaria bajo presupuesto
+        self.browsers = ['chrome', 'firefox', 'safari', 'edge', 'opera', 'brave']
+        
+        # Presupuesto de CPU/RSS (cpu_budget_percent, rss_budget_mb): por encima,
+        # sin cmdline, rDNS solo de navegadores, intervalo doble y cachés menores
+        self.governor = BudgetGovernor(self.config.get('cpu_budget_percent'), self.config.get('rss_budget_mb'))
+        self.governor.attach(process_table=self.process_table, domain_cache=self.domain_cache,
+                             category_matcher=self.category_matcher)
+
+    def extract_domain(self, hostname):
+        """Extraer el dominio registrable de un hostname (p.ej. www.bbc.co.uk -> bbc.co.uk)"""
+        return registrable_domain(hostname)
 
     def resolve_ip_to_domain(self, ip):
         """Resolver IP a dominio con cache"""
-        if ip in self.domain_cache:
-            return self.domain_cache[ip]
-        
-        try:
-            hostname = socket.gethostbyaddr(ip)[0]
-            domain_parts = hostname.split('.')
-            if len(domain_parts) >= 2:
-                domain = '.'.join(domain_parts[-2:])
-            else:
-                domain = hostname
-            self.domain_cache[ip] = domain
-            return domain
-        except:
-            self.domain_cache[ip] = ip
-            return ip
+        return self.resolver.resolve(ip)
+
+    def save_dns_cache(self, force=False):
+        """Volcar la caché DNS a disco (periódicamente o de inmediato con force)"""
+        saved = self.dns_store.flush(self.domain_cache) if force else self.dns_store.maybe_flush(self.domain_cache)
+        if saved is False:
+            self.log_error(f"Error guardando caché DNS: {self.dns_store.last_error}")
+        return saved
 
     def get_network_connections(self):
         """Obtener conexiones de red activas"""
         connections = []
         try:
-            for conn in psutil.net_connections(kind='inet'):
-                if conn.status == psutil.CONN_ESTABLISHED and conn.raddr:
-                    try:
-                        process = psutil.Process(conn.pid) if conn.pid else None
-                        process_name = process.name() if process else 'unknown'
+            with self.cycle_timer.phase('enumeration'):
+                for conn in psutil.net_connections(kind='inet'):
+                    if conn.status == psutil.CONN_ESTABLISHED and conn.raddr:
+                        # Nombre y cmdline desde la instantánea del ciclo; un proceso
+                        # ya terminado o sin permisos no hace perder la conexión
+                        process_name, process_cmdline = self.process_table.describe(conn.pid) or ('unknown', 'unknown')
                         
                         connection_info = {
                             'local_ip': conn.laddr.ip,
@@ -232,56 +313,55 @@ class ZienShieldRemoteAgent:
                             'remote_port': conn.raddr.port,
                             'pid': conn.pid or 0,
                             'process_name': process_name,
-                            'domain': self.resolve_ip_to_domain(conn.raddr.ip),
+                            'process_cmdline': process_cmdline,
                             'timestamp': datetime.now().isoformat()
                         }
                         connections.append(connection_info)
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        continue
         except Exception as e:
             self.log_error(f"Error getting connections: {e}")
         
+        # Resolver todas las IPs del ciclo de una vez, en paralelo y con plazo
+        # (bajo presupuesto, solo las de navegadores; el resto desde la caché)
+        with self.cycle_timer.phase('dns'):
+            domains = self.resolver.resolve_many(dns_targets(connections, self.governor, self.browsers))
+        assign_domains(connections, domains, self.domain_cache)
+        
         return connections
 
     def categorize_domain(self, domain):
-        """Categorizar dominio"""
-        domain_lower = domain.lower()
-        for category, domains in self.site_categories.items():
-            for site in domains:
-                if site in domain_lower:
-                    return category
-        return 'other'
+        """Categorizar dominio según tipo de sitio (sufijo más específico)"""
+        return self.category_matcher.match(domain)
 
     def get_browser_processes(self):
         """Detectar navegadores activos"""
-        browsers = ['chrome', 'firefox', 'safari', 'edge', 'opera', 'brave']
         active_browsers = []
         
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_info']):
-            try:
-                process_info = proc.info
-                process_name = process_info['name'].lower()
-                
-                for browser in browsers:
-                    if browser in process_name:
-                        active_browsers.append({
-                            'browser': browser,
-                            'pid': process_info['pid'],
-                            'name': process_info['name'],
-                            'cpu_percent': process_info['cpu_percent'] or 0,
-                            'memory_mb': round(process_info['memory_info'].rss / 1024 / 1024, 2) if process_info['memory_info'] else 0
-                        })
-                        break
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
+        for process in self.process_table.values():
+            process_name = process.name.lower()
+            
+            for browser in self.browsers:
+                if browser in process_name:
+                    active_browsers.append({
+                        'browser': browser,
+                        'pid': process.pid,
+                        'name': process.name,
+                        'cpu_percent': round(self.process_table.cpu_percent(process.pid), 2),
+                        'memory_mb': round(process.rss / 1024 / 1024, 2),
+                        'memory_delta_mb': round(self.process_table.rss_delta(process.pid) / 1024 / 1024, 2)
+                    })
+                    break
         
         return active_browsers
 
     def collect_metrics(self):
         """Recopilar métricas completas"""
         timestamp = datetime.now().isoformat()
+        timer = self.cycle_timer
+        with timer.phase('process_lookup'):
+            self.process_table.refresh()
         connections = self.get_network_connections()
-        browsers = self.get_browser_processes()
+        with timer.phase('process_lookup'):
+            browsers = self.get_browser_processes()
         
         # Agrupar por dominio
         domain_stats = defaultdict(lambda: {
@@ -293,45 +373,54 @@ class ZienShieldRemoteAgent:
             'last_seen': timestamp
         })
         
-        for conn in connections:
-            domain = conn['domain']
-            domain_stats[domain]['connections'] += 1
-            domain_stats[domain]['processes'].add(conn['process_name'])
-            domain_stats[domain]['ports'].add(conn['remote_port'])
-            domain_stats[domain]['category'] = self.categorize_domain(domain)
-            domain_stats[domain]['last_seen'] = timestamp
-        
-        # Convertir sets a listas
-        for domain in domain_stats:
-            domain_stats[domain]['processes'] = list(domain_stats[domain]['processes'])
-            domain_stats[domain]['ports'] = list(domain_stats[domain]['ports'])
+        with timer.phase('aggregation'):
+            for conn in connections:
+                domain = conn['domain']
+                domain_stats[domain]['connections'] += 1
+                domain_stats[domain]['processes'].add(conn['process_name'])
+                domain_stats[domain]['ports'].add(conn['remote_port'])
+                domain_stats[domain]['last_seen'] = timestamp
+        
+        # Categorizar una vez por dominio y convertir sets a listas
+        with timer.phase('categorization'):
+            for domain in domain_stats:
+                domain_stats[domain]['category'] = self.categorize_domain(domain)
+                domain_stats[domain]['processes'] = list(domain_stats[domain]['processes'])
+                domain_stats[domain]['ports'] = list(domain_stats[domain]['ports'])
         
         # Métricas del sistema
-        system_metrics = {
-            'cpu_percent': psutil.cpu_percent(interval=1),
-            'memory_percent': psutil.virtual_memory().percent,
-            'disk_usage': psutil.disk_usage('/').percent if platform.system() != 'Windows' else psutil.disk_usage('C:').percent,
-            'network_sent': psutil.net_io_counters().bytes_sent,
-            'network_recv': psutil.net_io_counters().bytes_recv
-        }
-        
-        metrics = {
-            'timestamp': timestamp,
-            'agent_id': self.agent_id,
-            'hostname': self.hostname,
-            'session_duration_minutes': (datetime.now() - self.session_start).total_seconds() / 60,
-            'total_connections': len(connections),
-            'total_domains': len(domain_stats),
-            'active_browsers': len(browsers),
-            'domain_stats': dict(domain_stats),
-            'browser_processes': browsers,
-            'system_metrics': system_metrics,
-            'top_domains': sorted(
-                [(domain, stats['connections']) for domain, stats in domain_stats.items()],
-                key=lambda x: x[1], reverse=True
-            )[:10],
-            'category_summary': self.get_category_summary(domain_stats)
-        }
+        with timer.phase('system_metrics'):
+            system_metrics = {
+                # Uso medio desde el ciclo anterior, sin bloquear un segundo
+                'cpu_percent': psutil.cpu_percent(interval=None),
+                'memory_percent': psutil.virtual_memory().percent,
+                'disk_usage': psutil.disk_usage('/').percent if platform.system() != 'Windows' else psutil.disk_usage('C:').percent,
+                'network_sent': psutil.net_io_counters().bytes_sent,
+                'network_recv': psutil.net_io_counters().bytes_recv
+            }
+        
+        with timer.phase('aggregation'):
+            metrics = {
+                'timestamp': timestamp,
+                'agent_id': self.agent_id,
+                'hostname': self.hostname,
+                'session_duration_minutes': (datetime.now() - self.session_start).total_seconds() / 60,
+                'total_connections': len(connections),
+                'total_domains': len(domain_stats),
+                'active_browsers': len(browsers),
+                'domain_stats': dict(domain_stats),
+                'browser_processes': browsers,
+                'system_metrics': system_metrics,
+                'top_domains': sorted(
+                    [(domain, stats['connections']) for domain, stats in domain_stats.items()],
+                    key=lambda x: x[1], reverse=True
+                )[:10],
+                'category_summary': self.get_category_summary(domain_stats)
+            }
+        
+        # Tiempos por fase de los ciclos anteriores y consumo propio del agente
+        metrics['agent_self'] = timer.snapshot()
+        metrics['agent_self']['governor'] = self.governor.observe(metrics['agent_self'])
         
         return metrics
 
@@ -347,12 +436,7 @@ class ZienShieldRemoteAgent:
     def send_metrics_to_server(self, metrics):
         """Enviar métricas al servidor ZienShield"""
         try:
-            response = requests.post(
-                f"{self.server_url}{self.metrics_endpoint}",
-                json=metrics,
-                timeout=30,
-                headers={'Content-Type': 'application/json'}
-            )
+            response = self.upload_client.post_payload(self.metrics_endpoint, metrics)
             
             if response.status_code == 200:
                 print(f"✅ Métricas enviadas - {datetime.now()}")
@@ -365,6 +449,14 @@ class ZienShieldRemoteAgent:
             self.log_error(f"Error enviando métricas: {e}")
             return False
 
+    def deliver_to_server(self, metrics):
+        """Enviar un ciclo encolado midiendo la codificación y el envío (hilo de envío)"""
+        return timed_upload(self.cycle_timer, self.upload_client, self.send_metrics_to_server, metrics)
+
+    def send_batch_to_server(self, cycles):
+        """Enviar varios ciclos como un único lote"""
+        return self.deliver_to_server(build_batch(cycles))
+
     def log_error(self, message):
         """Log de errores"""
         log_file = os.path.join(os.path.dirname(__file__), 'logs', 'agent.log')
@@ -377,19 +469,38 @@ class ZienShieldRemoteAgent:
     def run_monitoring_loop(self):
         """Loop principal de monitoreo"""
         print(f"🚀 ZienShield Agent iniciado - {self.hostname} ({self.agent_id})")
+        if self.exporter:
+            print(f"📈 Métricas Prometheus en {self.exporter.address}")
         
+        next_cycle = time.monotonic()
         while True:
             try:
+                self.cycle_timer.start_cycle()
                 metrics = self.collect_metrics()
-                success = self.send_metrics_to_server(metrics)
-                
-                if success:
-                    print(f"📊 {metrics['total_connections']} conexiones, {metrics['total_domains']} dominios")
+                # El envío ocurre en el hilo de envío; el ciclo no espera al servidor
+                self.sender.put(metrics)
+                if self.exporter:
+                    with self.cycle_timer.phase('sink_prometheus'):
+                        self.exporter.update(metrics)
+                self.cycle_timer.end_cycle()
+                print(f"📊 {metrics['total_connections']} conexiones, {metrics['total_domains']} dominios, "
+                      f"{self.sender.depth()} envíos pendientes")
+                print(f"⏱️ Ciclo: {self.cycle_timer.describe_last_cycle()}, "
+                      f"CPU del agente {metrics['agent_self']['cpu_percent']}%")
+                if self.governor.level:
+                    print(f"🐢 Presupuesto superado, degradación activa: {self.governor.describe()}")
                 
-                time.sleep(30)  # Intervalo de 30 segundos
+                self.save_dns_cache()
+                # Intervalo fijo de 30 segundos (60 con long_interval), sin sumar la duración del ciclo
+                next_cycle = max(next_cycle + self.governor.interval(30), time.monotonic())
+                time.sleep(max(0, next_cycle - time.monotonic()))
                 
             except KeyboardInterrupt:
                 print("\\n🛑 Agente detenido")
+                self.sender.close(timeout=5)
+                self.save_dns_cache(force=True)
+                if self.exporter:
+                    self.exporter.close()
                 break
             except Exception as e:
                 self.log_error(f"Error en loop principal: {e}")
@@ -418,6 +529,14 @@ if __name__ == "__main__":
                 os.chmod(self.agent_script, 0o755)
             
             print(f"✅ Script del agente creado: {self.agent_script}")
+            
+            # Módulos compartidos que importa el agente
+            shared_src = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zienshield_agent')
+            shared_dst = os.path.join(self.install_dir, 'zienshield_agent')
+            if os.path.exists(shared_dst):
+                shutil.rmtree(shared_dst)
+            shutil.copytree(shared_src, shared_dst, ignore=shutil.ignore_patterns('__pycache__', '*.pyc'))
+            print(f"✅ Módulos compartidos instalados: {shared_dst}")
             return True
             
         except Exception as e:
@@ -0,0 +1,9 @@
+"""
+ZienShield Tests - Configuración común
+Los tests importan zienshield_agent desde el directorio de los agentes
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,88 @@
+"""
+ZienShield Tests - Caché TTL/LRU
+Caducidad de entradas positivas y negativas, expulsión LRU y cambio de límite
+"""
+
+from zienshield_agent.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = TTLCache(ttl=60, negative_ttl=10, clock=clock)
+    cache.set('142.250.184.14', 'google.com')
+    cache.set('10.0.0.9', '10.0.0.9', negative=True)
+
+    clock.now += 10
+    assert cache.get('142.250.184.14') == 'google.com'
+    # El negativo caduca antes: en el instante exacto ya no es válido
+    assert cache.get('10.0.0.9') is None
+    assert '10.0.0.9' not in cache
+
+    clock.now += 50
+    assert cache.get('142.250.184.14', 'none') == 'none'
+    assert cache.stats()['expirations'] == 2
+    assert len(cache) == 0
+
+
+def test_explicit_ttl_and_purge():
+    clock = FakeClock()
+    cache = TTLCache(ttl=60, clock=clock)
+    cache.set('a', 1, ttl=5)
+    cache.set('b', 2)
+    clock.now += 5
+    assert cache.purge_expired() == 1
+    assert [(key, value) for key, value, _, _ in cache.items()] == [('b', 2)]
+
+
+def test_lru_eviction():
+    cache = TTLCache(max_entries=3, clock=FakeClock())
+    for key in 'abc':
+        cache[key] = key.upper()
+    # 'a' pasa a ser la más reciente, 'b' es la primera en salir
+    assert cache['a'] == 'A'
+    cache['d'] = 'D'
+    assert 'b' not in cache
+    assert [key for key, _, _, _ in cache.items()] == ['c', 'a', 'd']
+    assert cache.stats()['evictions'] == 1
+
+
+def test_contains_does_not_touch_lru():
+    cache = TTLCache(max_entries=2, clock=FakeClock())
+    cache['a'] = 1
+    cache['b'] = 2
+    assert 'a' in cache
+    cache['c'] = 3
+    assert 'a' not in cache
+    assert cache.stats()['hits'] == 0
+
+
+def test_resize_evicts_least_recent():
+    cache = TTLCache(max_entries=5, clock=FakeClock())
+    for index in range(5):
+        cache[index] = index
+    cache.get(0)
+    cache.resize(2)
+    assert [key for key, _, _, _ in cache.items()] == [4, 0]
+    assert cache.stats()['max_entries'] == 2
+
+
+def test_loader_runs_once_on_first_access():
+    calls = []
+
+    def loader(cache):
+        calls.append(cache)
+        cache.set('cached', 'value')
+
+    cache = TTLCache(clock=FakeClock(), loader=loader)
+    assert not calls
+    assert cache.get('cached') == 'value'
+    assert cache.get('cached') == 'value'
+    assert len(calls) == 1
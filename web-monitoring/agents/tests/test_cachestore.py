@@ -0,0 +1,81 @@
+"""
+ZienShield Tests - Persistencia SQLite de la caché DNS
+El TTL restante sobrevive a un reinicio en tiempo de pared y las entradas
+caducadas mientras el agente estaba parado no se cargan
+"""
+
+import time
+
+from zienshield_agent.cache import TTLCache
+from zienshield_agent.cachestore import CacheStore
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_round_trip_keeps_remaining_ttl(tmp_path, monkeypatch):
+    wall = FakeClock(1_700_000_000.0)
+    monkeypatch.setattr(time, 'time', wall)
+    store = CacheStore(str(tmp_path / 'cache' / 'rdns.sqlite'))
+
+    # Reloj monotónico distinto del de pared: lo que se guarda es el instante absoluto
+    cache = TTLCache(ttl=600, negative_ttl=60, clock=FakeClock(5.0))
+    cache.set('142.250.184.14', 'google.com')
+    cache.set('10.0.0.9', '10.0.0.9', negative=True)
+    cache.set('140.82.112.3', 'github.com', ttl=100)
+    assert store.flush(cache)
+
+    # Reinicio 90 s después con un reloj monotónico que vuelve a empezar
+    wall.now += 90
+    restored = store.attach(TTLCache(ttl=600, negative_ttl=60, clock=FakeClock(0.0)))
+    assert restored.get('142.250.184.14') == 'google.com'
+    assert store.loaded_entries == 2
+    entries = {key: (value, remaining, negative) for key, value, remaining, negative in restored.items()}
+    assert entries == {
+        '142.250.184.14': ('google.com', 510.0, False),
+        '140.82.112.3': ('github.com', 10.0, False)
+    }
+
+
+def test_flush_replaces_previous_contents(tmp_path):
+    store = CacheStore(str(tmp_path / 'rdns.sqlite'))
+    cache = TTLCache()
+    cache.set('a', 'one')
+    cache.set('b', 'two')
+    store.flush(cache)
+    cache.clear()
+    cache.set('c', 'three')
+    store.flush(cache)
+
+    restored = TTLCache()
+    assert store.load(restored) == 1
+    assert [key for key, _, _, _ in restored.items()] == ['c']
+
+
+def test_load_without_file(tmp_path):
+    store = CacheStore(str(tmp_path / 'missing.sqlite'))
+    assert store.load(TTLCache()) == 0
+    assert not (tmp_path / 'missing.sqlite').exists()
+
+
+def test_flush_error_keeps_cache(tmp_path):
+    # El directorio padre es un fichero: el volcado falla sin excepción
+    (tmp_path / 'blocked').write_text('')
+    store = CacheStore(str(tmp_path / 'blocked' / 'rdns.sqlite'))
+    cache = TTLCache()
+    cache.set('a', 'one')
+    assert store.flush(cache) is False
+    assert store.last_error
+    assert cache.get('a') == 'one'
+
+
+def test_maybe_flush_waits_for_interval(tmp_path):
+    store = CacheStore(str(tmp_path / 'rdns.sqlite'), flush_interval=300)
+    assert store.maybe_flush(TTLCache()) is None
+    store.last_flush -= 300
+    assert store.maybe_flush(TTLCache()) is True
@@ -0,0 +1,105 @@
+"""
+ZienShield Tests - Eventos NDJSON del log de Wazuh
+Validación de eventos y lectura de logs con segmentos rotados (.gz),
+reanudación por secuencia y líneas con el prefijo de texto antiguo
+"""
+
+import gzip
+import json
+
+import pytest
+
+from zienshield_agent.events import build_event, validate_event, read_events
+
+
+def make_event(seq, source='linux', **metrics):
+    metrics.setdefault('timestamp', '2025-01-15T10:30:00')
+    metrics.setdefault('agent_id', 'host-user-1')
+    metrics.setdefault('domain_stats', {})
+    return dict({'seq': seq}, **build_event(metrics, source, 'ZienShield Web Traffic Metrics'))
+
+
+def ndjson(events):
+    return ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events).encode()
+
+
+def write_log(tmp_path, segments, active):
+    """Log activo y segmentos rotados '<log>.<primera secuencia>.gz'"""
+    path = tmp_path / 'zienshield-web-traffic.log'
+    for first, events in segments:
+        with gzip.open(f"{path}.{first}.gz", 'wb') as f:
+            f.write(ndjson(events))
+    path.write_bytes(active)
+    return str(path)
+
+
+def test_validate_event_valid():
+    assert validate_event(make_event(1)) == []
+    assert validate_event(make_event(2, source='windows')) == []
+
+
+def test_validate_event_problems():
+    event = make_event(1)
+    del event['rule_id']
+    event['level'] = True
+    assert validate_event(event) == ["falta 'rule_id'", "'level' debería ser int"]
+
+    assert validate_event(dict(make_event(1), schema_version=99)) == ['schema_version 99 no soportada']
+    assert validate_event(dict(make_event(1), event='other')) == ['tipo de evento desconocido: other']
+    assert validate_event(make_event(1, source='mac')) == ['origen desconocido: mac']
+    assert validate_event([]) == ['el evento no es un objeto JSON']
+
+
+def test_validate_event_metrics():
+    event = make_event(1)
+    del event['zienshield_web_traffic']['agent_id']
+    event['zienshield_web_traffic']['domain_stats'] = []
+    assert validate_event(event) == [
+        "'zienshield_web_traffic.agent_id' ausente o no es str",
+        "'zienshield_web_traffic.domain_stats' ausente o no es dict"
+    ]
+
+
+def test_read_events_segments_in_order(tmp_path):
+    path = write_log(tmp_path, [
+        (4, [make_event(4), make_event(5), make_event(6)]),
+        (1, [make_event(1), make_event(2), make_event(3)])
+    ], ndjson([make_event(7), make_event(8)]))
+    assert [event['seq'] for event in read_events(path)] == [1, 2, 3, 4, 5, 6, 7, 8]
+
+
+def test_read_events_from_sequence_skips_segments(tmp_path):
+    path = write_log(tmp_path, [(4, [make_event(4), make_event(5), make_event(6)])],
+                     ndjson([make_event(7), make_event(8)]))
+    # Segmento anterior ilegible: si se abriera, gzip fallaría
+    (tmp_path / 'zienshield-web-traffic.log.1.gz').write_bytes(b'no es gzip')
+
+    assert [event['seq'] for event in read_events(path, from_sequence=5)] == [5, 6, 7, 8]
+    assert [event['seq'] for event in read_events(path, from_sequence=7)] == [7, 8]
+    with pytest.raises(OSError):
+        list(read_events(path, from_sequence=3))
+
+
+def test_read_events_single_gz_segment(tmp_path):
+    path = write_log(tmp_path, [(1, [make_event(1), make_event(2)]), (3, [make_event(3)])], b'')
+    assert [event['seq'] for event in read_events(f"{path}.1.gz")] == [1, 2]
+
+
+def test_read_events_legacy_prefix(tmp_path):
+    legacy = b'2025-01-15 10:29:00 ZienShield Web Traffic: ' + json.dumps(
+        {'timestamp': '2025-01-15T10:29:00', 'agent_id': 'host-user-1'}).encode() + b'\n'
+    path = write_log(tmp_path, [], legacy + ndjson([make_event(1)]))
+
+    events = list(read_events(path))
+    assert events[0] == {'timestamp': '2025-01-15T10:29:00', 'agent_id': 'host-user-1'}
+    assert events[1]['seq'] == 1
+
+    # Sin legacy la línea antigua se salta o, con errors='raise', se propaga
+    assert [event['seq'] for event in read_events(path, legacy=False)] == [1]
+    with pytest.raises(ValueError):
+        list(read_events(path, legacy=False, errors='raise'))
+
+
+def test_read_events_skips_blank_and_broken_lines(tmp_path):
+    path = write_log(tmp_path, [], ndjson([make_event(1)]) + b'\n{"seq":2,"trunc\n' + ndjson([make_event(3)]))
+    assert [event['seq'] for event in read_events(path)] == [1, 3]
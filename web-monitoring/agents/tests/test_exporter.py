@@ -0,0 +1,94 @@
+"""
+ZienShield Tests - Exposición /metrics para Prometheus
+Límite de cardinalidad con el dominio __other__, formato de texto y
+servidor local con y sin gzip
+"""
+
+import gzip
+import urllib.error
+import urllib.request
+
+import pytest
+
+from zienshield_agent.exporter import OTHER_LABEL, MetricsExporter, capped_domains, escape_label, render_metrics
+
+
+def make_domains(count):
+    return {
+        f'site{index}.com': {'connections': index + 1, 'category': 'work', 'bytes_sent': 10, 'bytes_recv': 100}
+        for index in range(count)
+    }
+
+
+def samples(body, family):
+    """Líneas de muestra de una familia, sin HELP/TYPE"""
+    name = f'zienshield_agent_{family}'
+    return [line for line in body.decode().splitlines() if line.startswith(name + '{') or line.startswith(name + ' ')]
+
+
+def test_capped_domains_folds_into_other():
+    kept, folded = capped_domains(make_domains(5), 2)
+    assert folded == 3
+    assert [domain for domain, _ in kept] == ['site4.com', 'site3.com', OTHER_LABEL]
+    # site0..site2: 1 + 2 + 3 conexiones
+    assert kept[-1][1] == {'category': OTHER_LABEL, 'connections': 6, 'bytes_sent': 30, 'bytes_recv': 300}
+
+
+def test_capped_domains_under_limit():
+    kept, folded = capped_domains(make_domains(3), 3)
+    assert folded == 0
+    assert OTHER_LABEL not in dict(kept)
+
+
+def test_capped_domains_ties_alphabetical():
+    stats = {name: {'connections': 1} for name in ('b.com', 'c.com', 'a.com')}
+    kept, _ = capped_domains(stats, 2)
+    assert [domain for domain, _ in kept] == ['a.com', 'b.com', OTHER_LABEL]
+
+
+def test_render_caps_series():
+    metrics = {'agent_id': 'host-user-1', 'total_connections': 55, 'domain_stats': make_domains(10),
+               'total_bytes_sent': 100, 'total_bytes_recv': 1000}
+    body = render_metrics(metrics, 'linux', max_domains=3, totals={'cycles': 7, 'bytes_sent': 500})
+
+    domain_lines = samples(body, 'domain_connections')
+    assert len(domain_lines) == 4
+    assert f'zienshield_agent_domain_connections{{domain="{OTHER_LABEL}",category="{OTHER_LABEL}"}} 28' in domain_lines
+    assert samples(body, 'domains_folded') == ['zienshield_agent_domains_folded 7']
+    assert samples(body, 'domains') == ['zienshield_agent_domains 10']
+    assert samples(body, 'cycles_total') == ['zienshield_agent_cycles_total 7']
+    assert samples(body, 'bytes_sent_total') == ['zienshield_agent_bytes_sent_total 500']
+    assert body.decode().count('# TYPE zienshield_agent_domain_connections gauge') == 1
+
+
+def test_render_without_bytes():
+    body = render_metrics({'agent_id': 'a', 'domain_stats': make_domains(1)}, 'windows')
+    assert samples(body, 'domain_bytes_sent') == []
+    assert samples(body, 'info') == ['zienshield_agent_info{agent_id="a",source="windows"} 1']
+
+
+def test_escape_label():
+    assert escape_label('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+
+def test_exporter_serves_plain_and_gzip():
+    # Directo a 127.0.0.1 aunque el entorno defina un proxy
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    exporter = MetricsExporter(0, 'linux')
+    try:
+        exporter.update({'agent_id': 'a', 'domain_stats': make_domains(2), 'total_bytes_sent': 5})
+        with opener.open(exporter.address, timeout=5) as response:
+            plain = response.read()
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        request = urllib.request.Request(exporter.address, headers={'Accept-Encoding': 'gzip'})
+        with opener.open(request, timeout=5) as response:
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert gzip.decompress(response.read()) == plain
+        assert samples(plain, 'bytes_sent_total') == ['zienshield_agent_bytes_sent_total 5']
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            opener.open(exporter.address.replace('/metrics', '/other'), timeout=5)
+        assert error.value.code == 404
+        assert exporter.stats['scrapes'] == 2
+    finally:
+        exporter.close()
@@ -0,0 +1,104 @@
+"""
+ZienShield Tests - Presupuesto de CPU/RSS del agente
+Escalado tras varios ciclos por encima del presupuesto, histéresis al
+relajar, un nivel por ciclo y efecto de cada nivel sobre el agente
+"""
+
+from zienshield_agent.cache import TTLCache
+from zienshield_agent.governor import LEVELS, BudgetGovernor, dns_targets, assign_domains
+
+
+class FakeProcessTable:
+    def __init__(self):
+        self.read_cmdline = True
+
+    def set_read_cmdline(self, enabled):
+        self.read_cmdline = enabled
+
+
+def run(governor, cpu_percent, cycles):
+    return [governor.observe({'cpu_percent': cpu_percent, 'rss_mb': 50.0})['level'] for _ in range(cycles)]
+
+
+def test_disabled_never_degrades():
+    governor = BudgetGovernor()
+    assert not governor.enabled
+    assert run(governor, 400.0, 5) == [0] * 5
+
+
+def test_escalates_one_level_after_consecutive_cycles():
+    governor = BudgetGovernor(cpu_budget=5, escalate_after=2)
+    # Un ciclo por encima no basta; luego como mucho un nivel por ciclo, hasta el último
+    assert run(governor, 20.0, 10) == [0, 1, 1, 2, 2, 3, 3, 4, 4, 4]
+    assert governor.name == LEVELS[-1]
+    assert governor.changes == 4
+
+
+def test_spike_between_normal_cycles_does_not_escalate():
+    governor = BudgetGovernor(cpu_budget=5, escalate_after=2)
+    for cpu_percent in (9.0, 4.0, 9.0, 4.0, 9.0):
+        governor.observe({'cpu_percent': cpu_percent})
+    assert governor.level == 0
+
+
+def test_relax_hysteresis():
+    governor = BudgetGovernor(cpu_budget=10, escalate_after=1, relax_after=3, relax_ratio=0.5)
+    run(governor, 20.0, 2)
+    assert governor.level == 2
+
+    # Por debajo del presupuesto pero por encima de relax_ratio: se mantiene el nivel
+    assert run(governor, 8.0, 10) == [2] * 10
+    # Por debajo de la mitad: baja un nivel cada relax_after ciclos
+    assert run(governor, 4.0, 6) == [2, 2, 1, 1, 1, 0]
+
+    # Un ciclo intermedio reinicia la cuenta
+    run(governor, 20.0, 1)
+    assert run(governor, 4.0, 2) + run(governor, 8.0, 1) + run(governor, 4.0, 2) == [1, 1, 1, 1, 1]
+
+
+def test_rss_budget():
+    governor = BudgetGovernor(rss_budget_mb=100, escalate_after=1)
+    governor.observe({'cpu_percent': 90.0, 'rss_mb': 120.0})
+    assert governor.level == 1
+    assert governor.snapshot()['rss_budget_mb'] == 100
+
+
+def test_levels_act_on_attached_objects():
+    governor = BudgetGovernor(cpu_budget=5, escalate_after=1, relax_after=1, cache_factor=0.25)
+    table = FakeProcessTable()
+    cache = TTLCache(max_entries=1000)
+    governor.attach(process_table=table, domain_cache=cache)
+
+    run(governor, 20.0, 1)
+    assert not table.read_cmdline
+    assert not governor.browser_dns_only
+    run(governor, 20.0, 2)
+    assert governor.interval(30) == 60
+    assert cache.max_entries == 1000
+    run(governor, 20.0, 1)
+    assert cache.max_entries == 250
+
+    run(governor, 1.0, 4)
+    assert governor.level == 0
+    assert table.read_cmdline and cache.max_entries == 1000 and governor.interval(30) == 30
+
+
+def test_dns_targets_browser_only():
+    connections = [
+        {'remote_ip': '142.250.184.14', 'process_name': 'firefox'},
+        {'remote_ip': '10.0.0.9', 'process_name': 'sshd'},
+        {'remote_ip': '140.82.112.3', 'process_info': '4242/chrome'},
+        {'remote_ip': '1.1.1.1'}
+    ]
+    governor = BudgetGovernor(cpu_budget=5, escalate_after=1)
+    assert dns_targets(connections, governor, ['firefox', 'chrome']) == [conn['remote_ip'] for conn in connections]
+    run(governor, 20.0, 2)
+    assert dns_targets(connections, governor, ['firefox', 'chrome']) == ['142.250.184.14', '140.82.112.3']
+
+
+def test_assign_domains_falls_back_to_cache_and_ip():
+    cache = TTLCache()
+    cache.set('10.0.0.9', 'nas.local')
+    connections = [{'remote_ip': '142.250.184.14'}, {'remote_ip': '10.0.0.9'}, {'remote_ip': '1.1.1.1'}]
+    assign_domains(connections, {'142.250.184.14': 'google.com'}, cache)
+    assert [conn['domain'] for conn in connections] == ['google.com', 'nas.local', '1.1.1.1']
@@ -0,0 +1,217 @@
+"""
+ZienShield Tests - Parsers de conexiones y procesos
+Campos extraídos por los parsers de netstat/ss/ps/tasklist, /proc/net/tcp
+y sock_diag, incluidas líneas truncadas que deben descartarse
+"""
+
+import socket
+import struct
+
+from zienshield_agent import procnet, sockdiag
+from zienshield_agent.streaming import (
+    split_host_port, parse_ss_line, parse_netstat_line, parse_windows_netstat_line,
+    parse_ps_aux_line, parse_tasklist_csv_line
+)
+
+
+def test_split_host_port():
+    assert split_host_port('10.0.0.2:43120') == ('10.0.0.2', 43120)
+    assert split_host_port('[2001:db8::5]:55123') == ('2001:db8::5', 55123)
+    assert split_host_port('::ffff:10.0.0.9:51000') == ('::ffff:10.0.0.9', 51000)
+    assert split_host_port('0.0.0.0:*') is None
+    assert split_host_port('10.0.0.2') is None
+
+
+def test_ss_line_ipv4():
+    conn = parse_ss_line('ESTAB 0      0          10.0.0.2:43120  142.250.184.14:443 '
+                         'users:(("firefox",pid=4242,fd=71))\n')
+    assert conn == {
+        'local_addr': '10.0.0.2:43120',
+        'local_ip': '10.0.0.2',
+        'local_port': 43120,
+        'remote_ip': '142.250.184.14',
+        'remote_port': 443,
+        'process_info': 'users:(("firefox",pid=4242,fd=71))'
+    }
+
+
+def test_ss_line_ipv6_brackets():
+    conn = parse_ss_line('ESTAB 0 0 [2a00:1450::1]:443 [2001:db8::5]:55123 users:(("chrome",pid=9,fd=3))\n')
+    assert conn['local_ip'] == '2a00:1450::1'
+    assert conn['local_port'] == 443
+    assert conn['remote_ip'] == '2001:db8::5'
+    assert conn['remote_port'] == 55123
+
+
+def test_ss_line_several_users():
+    # Un socket compartido por varios procesos: se conserva la lista completa
+    users = 'users:(("chrome",pid=9,fd=3),("chrome",pid=10,fd=7),("nacl_helper",pid=11,fd=2))'
+    conn = parse_ss_line(f'ESTAB 0 0 10.0.0.2:43120 142.250.184.14:443 {users}\n')
+    assert conn['process_info'] == users
+    assert conn['remote_ip'] == '142.250.184.14'
+
+
+def test_ss_line_without_process():
+    conn = parse_ss_line('ESTAB 0 0 10.0.0.2:43120 142.250.184.14:443\n')
+    assert conn['process_info'] == 'unknown'
+
+
+def test_ss_line_discarded():
+    assert parse_ss_line('State Recv-Q Send-Q Local Address:Port  Peer Address:Port Process\n') is None
+    assert parse_ss_line('LISTEN 0 128 0.0.0.0:22 0.0.0.0:*\n') is None
+    # Truncadas: sin dirección remota o con la remota cortada antes del puerto
+    assert parse_ss_line('ESTAB 0 0 10.0.0.2:43120\n') is None
+    assert parse_ss_line('ESTAB 0 0 10.0.0.2:43120 142.250.184.14:\n') is None
+
+
+def test_netstat_line():
+    conn = parse_netstat_line('tcp        0      0 10.0.0.2:43120          142.250.184.14:443      '
+                              'ESTABLISHED 4242/firefox\n')
+    assert conn['local_ip'] == '10.0.0.2'
+    assert conn['local_port'] == 43120
+    assert conn['remote_ip'] == '142.250.184.14'
+    assert conn['remote_port'] == 443
+    assert conn['process_info'] == '4242/firefox'
+
+
+def test_netstat_line_ipv6_without_pid():
+    conn = parse_netstat_line('tcp6       0      0 ::ffff:10.0.0.2:22      ::ffff:10.0.0.9:51000   ESTABLISHED -\n')
+    assert conn['remote_ip'] == '::ffff:10.0.0.9'
+    assert conn['remote_port'] == 51000
+    assert conn['process_info'] == '-'
+
+
+def test_netstat_line_discarded():
+    assert parse_netstat_line('Proto Recv-Q Send-Q Local Address Foreign Address State PID/Program name\n') is None
+    assert parse_netstat_line('tcp 0 0 10.0.0.2:43121 142.250.184.14:443 TIME_WAIT -\n') is None
+    # Truncada: el estado aparece pero faltan columnas
+    assert parse_netstat_line('tcp 0 0 10.0.0.2:43120 ESTABLISHED\n') is None
+
+
+def test_windows_netstat_line():
+    conn = parse_windows_netstat_line('  TCP    192.168.1.10:50412     142.250.184.14:443     ESTABLISHED\r\n')
+    assert conn['local_ip'] == '192.168.1.10'
+    assert conn['local_port'] == 50412
+    assert conn['remote_ip'] == '142.250.184.14'
+    assert conn['remote_port'] == 443
+    assert conn['process_info'] == 'unknown'
+
+
+def test_windows_netstat_line_ipv6_brackets():
+    conn = parse_windows_netstat_line('  TCP    [::1]:50413            [2001:db8::5]:443      ESTABLISHED\r\n')
+    assert conn['local_ip'] == '::1'
+    assert conn['remote_ip'] == '2001:db8::5'
+    assert conn['remote_port'] == 443
+
+
+def test_windows_netstat_line_discarded():
+    assert parse_windows_netstat_line('  UDP    0.0.0.0:5353           *:*\r\n') is None
+    assert parse_windows_netstat_line('  TCP    0.0.0.0:135            0.0.0.0:0              LISTENING\r\n') is None
+    assert parse_windows_netstat_line('  TCP    192.168.1.10:50412     ESTABLISHED\r\n') is None
+
+
+def test_ps_aux_line():
+    process = parse_ps_aux_line('user      4242 12.5  3.1 2850000 250000 ?  Sl   10:00   1:23 '
+                                '/usr/lib/firefox/firefox -contentproc -childID 3\n')
+    assert process == {
+        'user': 'user',
+        'pid': 4242,
+        'cpu_percent': 12.5,
+        'memory_percent': 3.1,
+        'command': '/usr/lib/firefox/firefox -contentproc -childID 3'
+    }
+
+
+def test_ps_aux_line_discarded():
+    assert parse_ps_aux_line('USER PID %CPU %MEM VSZ RSS TTY STAT START TIME COMMAND\n') is None
+    assert parse_ps_aux_line('user 4242 12.5 3.1 2850000\n') is None
+
+
+def test_tasklist_csv_line():
+    process = parse_tasklist_csv_line('"chrome.exe","1234","Console","1","145,236 K"\r\n')
+    assert process == {'name': 'chrome.exe', 'pid': 1234, 'memory_kb': 145236}
+
+
+def test_tasklist_csv_line_regional_memory():
+    process = parse_tasklist_csv_line('"msedge.exe","88","Console","1","1.234.567 KB"\r\n')
+    assert process['name'] == 'msedge.exe'
+    assert process['pid'] == 88
+    assert process['memory_kb'] == 1234567
+
+
+def test_tasklist_csv_line_discarded():
+    assert parse_tasklist_csv_line('"Nombre de imagen","PID","Nombre de sesión","Núm. de sesión","Uso de memoria"\r\n') is None
+    assert parse_tasklist_csv_line('\r\n') is None
+    # Truncada a mitad de columnas
+    assert parse_tasklist_csv_line('"chrome.exe","1234","Cons\r\n') is None
+
+
+def write_tcp_table(root, filename, rows):
+    net = root / 'net'
+    net.mkdir(exist_ok=True)
+    header = '  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n'
+    (net / filename).write_text(header + ''.join(rows))
+
+
+def test_procnet_read_tcp_table(tmp_path):
+    write_tcp_table(tmp_path, 'tcp', [
+        '   0: 0100007F:1F90 0E00A8C0:01BB 01 00000000:00000000 00:00000000 00000000  1000        0 12345 1\n',
+        '   1: 00000000:0016 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 999 1\n',
+        # Truncada: menos de 10 columnas
+        '   2: 0100007F:1F91 0E00A8C0:01BB 01 00000000:00000000\n'
+    ])
+    write_tcp_table(tmp_path, 'tcp6', [
+        '   0: 00000000000000000000000001000000:01BB B80D0120000000000000000005000000:D753 01 '
+        '00000000:00000000 00:00000000 00000000  1000        0 67890 1\n'
+    ])
+
+    table = procnet.read_tcp_table(str(tmp_path))
+    assert table == [
+        procnet.SocketEntry(socket.AF_INET, '127.0.0.1', 8080, '192.168.0.14', 443, 'ESTABLISHED', 1000, 12345),
+        procnet.SocketEntry(socket.AF_INET6, '::1', 443, '2001:db8::5', 55123, 'ESTABLISHED', 1000, 67890)
+    ]
+
+
+def build_diag_message(family, src, sport, dst, dport, uid, inode, bytes_acked=None, bytes_received=None):
+    address_size = 4 if family == socket.AF_INET else 16
+    message = bytearray(sockdiag.INET_DIAG_MSG_SIZE)
+    sockdiag.INET_DIAG_MSG_HEAD.pack_into(message, 0, family, sockdiag.TCP_ESTABLISHED, 0, 0)
+    sockdiag.INET_DIAG_MSG_PORTS.pack_into(message, 4, sport, dport)
+    message[8:8 + address_size] = socket.inet_pton(family, src)
+    message[24:24 + address_size] = socket.inet_pton(family, dst)
+    message[44:52] = b'\x01' * 8
+    sockdiag.INET_DIAG_MSG_TAIL.pack_into(message, 52, 0, 0, 0, uid, inode)
+    if bytes_acked is not None:
+        info = bytearray(sockdiag.TCPI_BYTES_OFFSET + sockdiag.TCPI_BYTES.size)
+        sockdiag.TCPI_BYTES.pack_into(info, sockdiag.TCPI_BYTES_OFFSET, bytes_acked, bytes_received)
+        message += sockdiag.RTATTR_HEADER.pack(sockdiag.RTATTR_HEADER.size + len(info), sockdiag.INET_DIAG_INFO)
+        message += info
+    return bytes(message)
+
+
+def test_sockdiag_parse_message():
+    data = build_diag_message(socket.AF_INET, '10.0.0.2', 43120, '142.250.184.14', 443, 1000, 12345,
+                              bytes_acked=2048, bytes_received=65536)
+    entry = sockdiag.parse_diag_message(data, 0, len(data))
+    assert entry.family == socket.AF_INET
+    assert (entry.local_ip, entry.local_port) == ('10.0.0.2', 43120)
+    assert (entry.remote_ip, entry.remote_port) == ('142.250.184.14', 443)
+    assert (entry.uid, entry.inode) == (1000, 12345)
+    assert entry.cookie == b'\x01' * 8
+    assert (entry.bytes_acked, entry.bytes_received) == (2048, 65536)
+
+
+def test_sockdiag_parse_message_ipv6_without_info():
+    data = build_diag_message(socket.AF_INET6, '2a00:1450::1', 443, '2001:db8::5', 55123, 0, 1)
+    entry = sockdiag.parse_diag_message(data, 0, len(data))
+    assert (entry.local_ip, entry.remote_ip) == ('2a00:1450::1', '2001:db8::5')
+    assert entry.remote_port == 55123
+    assert (entry.bytes_acked, entry.bytes_received) == (0, 0)
+
+
+def test_sockdiag_parse_message_truncated_info():
+    # Kernel antiguo: tcp_info más corto que tcpi_bytes_received, los bytes quedan a 0
+    data = build_diag_message(socket.AF_INET, '10.0.0.2', 1, '10.0.0.3', 2, 0, 1)
+    data += sockdiag.RTATTR_HEADER.pack(sockdiag.RTATTR_HEADER.size + 8, sockdiag.INET_DIAG_INFO) + struct.pack('=Q', 7)
+    entry = sockdiag.parse_diag_message(data, 0, len(data))
+    assert (entry.bytes_acked, entry.bytes_received) == (0, 0)
@@ -0,0 +1,186 @@
+"""
+ZienShield Tests - Payloads de /agent-metrics
+Ida y vuelta de keyframe/delta y del payload compacto v2 frente al formato
+v1, y errores de secuencia que obligan al agente a resincronizar
+"""
+
+import json
+
+import pytest
+
+from zienshield_agent.delta import DeltaEncoder, DeltaDecoder, DeltaSequenceError, flow_key
+from zienshield_agent.payload import get_top_domains, get_category_summary
+from zienshield_agent.slim import SlimEncoder, SlimExpander, SlimSessionError
+
+DOMAINS = ['google.com', 'youtube.com', 'github.com', 'facebook.com', 'office.com', 'example.org']
+CATEGORIES = {'google.com': 'work', 'youtube.com': 'video', 'github.com': 'work',
+              'facebook.com': 'social', 'office.com': 'work', 'example.org': 'other'}
+
+
+def make_cycle(cycle, with_derived=True):
+    """Métricas v1 de un ciclo: el conjunto de dominios y sus contadores cambian entre ciclos"""
+    domains = DOMAINS[cycle % 3:cycle % 3 + 4]
+    domain_stats = {
+        domain: {
+            'connections': (index + cycle) % 4 + 1,
+            'category': CATEGORIES[domain],
+            'bytes_sent': 100 * (index + 1),
+            'bytes_recv': 1000 * (index + cycle),
+            'processes': ['firefox'] if index % 2 else ['firefox', 'chrome'],
+            'bytes_by_process': {'firefox': 10 * cycle}
+        }
+        for index, domain in enumerate(domains)
+    }
+    # Fila sin cmdline: columna con huecos
+    domain_stats[domains[0]].pop('bytes_by_process')
+    browser_processes = [{'browser': 'firefox', 'pid': 4242, 'cmdline': 'firefox -P default'},
+                         {'browser': 'chrome', 'pid': 4300 + cycle % 2}]
+    metrics = {
+        'timestamp': f'2025-01-15T10:{cycle:02d}:00',
+        'agent_id': 'host-user-1',
+        'hostname': 'host',
+        'username': 'user',
+        'os_info': {'system': 'Linux', 'release': '6.1'},
+        'monitor_version': '2.0',
+        'total_connections': sum(stats['connections'] for stats in domain_stats.values()),
+        'domain_stats': domain_stats,
+        'browser_processes': browser_processes
+    }
+    if with_derived:
+        metrics.update({
+            'top_domains': get_top_domains(domain_stats),
+            'categories_summary': get_category_summary(domain_stats),
+            'total_domains': len(domain_stats),
+            'total_bytes_sent': sum(stats['bytes_sent'] for stats in domain_stats.values()),
+            'total_bytes_recv': sum(stats['bytes_recv'] for stats in domain_stats.values()),
+            'active_browsers': len(browser_processes)
+        })
+    return metrics
+
+
+def make_connections(cycle):
+    return [
+        {'local_ip': '10.0.0.2', 'local_port': 40000 + port, 'remote_ip': f'142.250.0.{port}',
+         'remote_port': 443, 'pid': 4242, 'process_name': 'firefox', 'domain': DOMAINS[port]}
+        for port in range(cycle % 3, cycle % 3 + 3)
+    ]
+
+
+def wire(payload):
+    """Lo que recibe el backend: el payload pasa por JSON"""
+    return json.loads(json.dumps(payload))
+
+
+def test_delta_round_trip():
+    encoder = DeltaEncoder(keyframe_interval=4)
+    decoder = DeltaDecoder()
+    types = []
+    for cycle in range(10):
+        metrics = make_cycle(cycle)
+        payload = encoder.encode(metrics, make_connections(cycle))
+        types.append(payload['type'])
+        assert wire(decoder.apply(wire(payload))) == wire(metrics)
+        assert sorted(decoder.flows) == sorted(flow_key(conn) for conn in make_connections(cycle))
+    assert types == ['keyframe', 'delta', 'delta', 'delta'] * 2 + ['keyframe', 'delta']
+
+
+def test_delta_only_sends_changes():
+    encoder = DeltaEncoder(keyframe_interval=10)
+    metrics = make_cycle(0)
+    encoder.encode(metrics, make_connections(0))
+
+    # Mismo estado en el ciclo siguiente: solo cambia el timestamp
+    metrics['timestamp'] = '2025-01-15T10:01:00'
+    payload = encoder.encode(metrics, make_connections(0))
+    assert payload['type'] == 'delta'
+    assert payload['fields'] == {'timestamp': '2025-01-15T10:01:00'}
+    assert payload['domains_changed'] == {} and payload['domains_removed'] == []
+    assert 'browser_processes' not in payload
+    assert payload['flows_opened'] == [] and payload['flows_closed'] == []
+
+    # Un dominio menos y otro con más conexiones
+    metrics['domain_stats'].pop('facebook.com')
+    metrics['domain_stats']['google.com']['connections'] += 1
+    payload = encoder.encode(metrics, make_connections(0)[:2])
+    assert payload['domains_removed'] == ['facebook.com']
+    assert list(payload['domains_changed']) == ['google.com']
+    assert payload['flows_closed'] == [['tcp', '10.0.0.2', 40002, '142.250.0.2', 443]]
+
+
+def test_delta_gap_requires_keyframe():
+    encoder = DeltaEncoder(keyframe_interval=10)
+    decoder = DeltaDecoder()
+    decoder.apply(wire(encoder.encode(make_cycle(0), [])))
+    encoder.encode(make_cycle(1), [])
+    with pytest.raises(DeltaSequenceError):
+        decoder.apply(wire(encoder.encode(make_cycle(2), [])))
+
+    # Tras un envío fallido el agente fuerza un keyframe y el receptor se recupera
+    encoder.force_keyframe()
+    payload = encoder.encode(make_cycle(3), [])
+    assert payload['type'] == 'keyframe'
+    assert wire(decoder.apply(wire(payload))) == wire(make_cycle(3))
+
+
+def test_delta_decoder_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        DeltaDecoder().apply({'format': 'zienshield-slim', 'version': 2})
+
+
+def test_slim_round_trip():
+    encoder = SlimEncoder()
+    expander = SlimExpander()
+    for cycle in range(6):
+        metrics = make_cycle(cycle)
+        payload = encoder.encode(metrics)
+        assert wire(expander.expand(wire(payload))) == wire(metrics)
+        if cycle:
+            # Host y dominios ya enviados en la sesión no se repiten
+            assert 'host' not in payload
+            assert len(payload['strings']['add']) < len(encoder.strings)
+        else:
+            assert payload['host']['os_info'] == {'system': 'Linux', 'release': '6.1'}
+        assert set(payload['derived']) == {'top_domains', 'categories_summary', 'total_domains',
+                                           'total_bytes_sent', 'total_bytes_recv', 'active_browsers'}
+
+
+def test_slim_keeps_aggregates_that_differ():
+    # Un agregado que no coincide con el recálculo viaja tal cual
+    metrics = make_cycle(0)
+    metrics['total_domains'] = 99
+    payload = SlimEncoder().encode(metrics)
+    assert 'total_domains' not in payload['derived']
+    assert payload['fields']['total_domains'] == 99
+    assert wire(SlimExpander().expand(wire(payload))) == wire(metrics)
+
+
+def test_slim_windows_process_count():
+    metrics = make_cycle(0, with_derived=False)
+    metrics['browser_processes'] = [{'browser': 'chrome', 'process_count': 8}, {'browser': 'msedge', 'process_count': 3}]
+    metrics['active_browsers'] = 11
+    metrics['browser_types'] = 2
+    payload = SlimEncoder(top_domains_limit=15).encode(metrics)
+    assert set(payload['derived']) == {'active_browsers', 'browser_types'}
+    assert wire(SlimExpander().expand(wire(payload))) == wire(metrics)
+
+
+def test_slim_session_gap_and_reset():
+    encoder = SlimEncoder()
+    expander = SlimExpander()
+    expander.expand(wire(encoder.encode(make_cycle(0))))
+    encoder.encode(make_cycle(1))
+    with pytest.raises(SlimSessionError):
+        expander.expand(wire(encoder.encode(make_cycle(2))))
+
+    # Sesión nueva tras el fallo: diccionario y host completos desde la secuencia 1
+    encoder.reset()
+    payload = encoder.encode(make_cycle(3))
+    assert payload['sequence'] == 1 and payload['strings']['base'] == 0 and 'host' in payload
+    assert wire(expander.expand(wire(payload))) == wire(make_cycle(3))
+
+
+def test_slim_expander_rejects_mid_session_start():
+    encoder = SlimEncoder()
+    encoder.encode(make_cycle(0))
+    with pytest.raises(SlimSessionError):
+        SlimExpander().expand(wire(encoder.encode(make_cycle(1))))
@@ -0,0 +1,103 @@
+"""
+ZienShield Tests - Lotes del envío en segundo plano
+Disparo del lote por tamaño, por intervalo o por ambos, y salida anticipada
+de un lote incompleto solo con flush() o al detenerse
+"""
+
+import threading
+import time
+
+from zienshield_agent.sender import BackgroundSender
+
+
+class Recorder:
+    """send_batch que guarda los lotes recibidos y permite esperarlos"""
+
+    def __init__(self):
+        self.batches = []
+        self.condition = threading.Condition()
+
+    def __call__(self, payloads):
+        with self.condition:
+            self.batches.append(list(payloads))
+            self.condition.notify_all()
+        return True
+
+    def wait_for(self, count, timeout=5):
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.batches) >= count, timeout)
+            return list(self.batches)
+
+
+def make_sender(recorder, **kwargs):
+    return BackgroundSender(lambda payload: recorder([payload]), send_batch=recorder, **kwargs)
+
+
+def test_size_only():
+    recorder = Recorder()
+    sender = make_sender(recorder, batch_size=3)
+    for cycle in range(3):
+        sender.put(cycle)
+    assert recorder.wait_for(1) == [[0, 1, 2]]
+
+    # Sin intervalo, un lote incompleto espera indefinidamente
+    sender.put(3)
+    sender.put(4)
+    time.sleep(0.2)
+    assert recorder.batches == [[0, 1, 2]]
+    assert sender.flush(timeout=5)
+    assert recorder.batches == [[0, 1, 2], [3, 4]]
+    sender.close()
+
+
+def test_interval_only_waits_for_interval():
+    recorder = Recorder()
+    sender = make_sender(recorder, batch_size=1, batch_interval=0.4, max_queue=10)
+    start = time.monotonic()
+    for cycle in range(3):
+        sender.put(cycle)
+    # batch_size 1 no dispara el envío de cada ciclo
+    time.sleep(0.1)
+    assert recorder.batches == []
+    assert recorder.wait_for(1) == [[0, 1, 2]]
+    assert time.monotonic() - start >= 0.35
+    sender.close()
+
+
+def test_interval_only_sends_full_queue():
+    recorder = Recorder()
+    sender = make_sender(recorder, batch_interval=60, max_queue=4)
+    assert (sender.batch_size, sender.max_batch) == (4, 4)
+    for cycle in range(4):
+        sender.put(cycle)
+    # La cola llena sale como un lote en vez de aplicar la política de desbordamiento
+    assert recorder.wait_for(1) == [[0, 1, 2, 3]]
+    assert sender.stats()['dropped'] == 0
+    sender.close()
+
+
+def test_interval_only_close_sends_partial_batch():
+    recorder = Recorder()
+    sender = make_sender(recorder, batch_interval=60)
+    sender.put('a')
+    sender.put('b')
+    time.sleep(0.1)
+    assert recorder.batches == []
+    assert sender.close(timeout=5)
+    assert recorder.batches == [['a', 'b']]
+
+
+def test_size_and_interval():
+    recorder = Recorder()
+    sender = make_sender(recorder, batch_size=3, batch_interval=0.3)
+    # Lote incompleto: sale al vencer el intervalo
+    sender.put(0)
+    assert recorder.wait_for(1) == [[0]]
+
+    # Lote completo: sale sin esperar al intervalo
+    start = time.monotonic()
+    for cycle in range(1, 4):
+        sender.put(cycle)
+    assert recorder.wait_for(2) == [[0], [1, 2, 3]]
+    assert time.monotonic() - start < 0.25
+    sender.close()
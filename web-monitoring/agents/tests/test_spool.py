@@ -0,0 +1,213 @@
+"""
+ZienShield Tests - Spool en disco y reenvío en orden
+Registros con CRC32, cursor persistente entre reinicios, cuota de tamaño y
+antigüedad, y reenvío del BackgroundSender entre memoria y spool
+"""
+
+import os
+import threading
+import time
+
+from zienshield_agent.sender import BackgroundSender
+from zienshield_agent.spool import Spool, encode_record, decode_record, CURSOR_FILE
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def read_all(spool):
+    records, position, consumed = spool.read(1000)
+    spool.ack(position, consumed)
+    return [payload for _, payload in records]
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.seg'))
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_record_crc():
+    line = encode_record(10.0, {'cycle': 1})
+    assert decode_record(line) == (10.0, {'cycle': 1})
+    # Un bit cambiado en el JSON, un CRC que no cuadra o un registro truncado se rechazan
+    assert decode_record(line.replace(b'"cycle"', b'"cyclf"')) is None
+    assert decode_record(b'00000000' + line[8:]) is None
+    assert decode_record(line[:-5]) is None
+
+
+def test_corrupt_record_skipped(tmp_path):
+    spool = Spool(str(tmp_path), clock=FakeClock())
+    for cycle in range(3):
+        spool.append({'cycle': cycle})
+    spool.close()
+
+    path = tmp_path / segment_files(str(tmp_path))[0]
+    lines = path.read_bytes().splitlines(keepends=True)
+    path.write_bytes(lines[0] + lines[1].replace(b'"cycle":1', b'"cycle":7') + lines[2])
+
+    spool = Spool(str(tmp_path), clock=FakeClock())
+    records, position, consumed = spool.read(10)
+    assert [payload for _, payload in records] == [{'cycle': 0}, {'cycle': 2}]
+    # El corrupto se retira con el ack junto con los válidos
+    assert consumed == 3
+    spool.ack(position, consumed)
+    assert len(spool) == 0
+    assert spool.stats()['corrupted'] == 1
+
+
+def test_cursor_survives_restart(tmp_path):
+    spool = Spool(str(tmp_path), clock=FakeClock())
+    for cycle in range(5):
+        spool.append(cycle)
+    records, position, consumed = spool.read(2)
+    spool.ack(position, consumed)
+    spool.close()
+    assert (tmp_path / CURSOR_FILE).exists()
+
+    restarted = Spool(str(tmp_path), clock=FakeClock())
+    assert len(restarted) == 3
+    restarted.append(5)
+    assert read_all(restarted) == [2, 3, 4, 5]
+
+
+def test_cursor_on_removed_segment(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=64, clock=FakeClock())
+    for cycle in range(6):
+        spool.append({'cycle': cycle, 'padding': 'x' * 20})
+    spool.close()
+    first = segment_files(str(tmp_path))[0]
+    (tmp_path / CURSOR_FILE).write_text(f"[{int(first[:-4])}, 40]")
+    os.remove(tmp_path / first)
+
+    # El cursor apunta a un segmento que ya no existe: se sigue por el siguiente
+    restarted = Spool(str(tmp_path), segment_bytes=64, clock=FakeClock())
+    assert [payload['cycle'] for payload in read_all(restarted)] == [1, 2, 3, 4, 5]
+
+
+def test_size_quota_evicts_oldest(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=100, max_bytes=400, clock=FakeClock())
+    for cycle in range(40):
+        spool.append({'cycle': cycle, 'padding': 'x' * 30})
+    stats = spool.stats()
+    assert stats['bytes'] <= 400 + 100
+    assert stats['evicted'] > 0
+    assert stats['evicted'] + len(spool) == 40
+
+    remaining = [payload['cycle'] for payload in read_all(spool)]
+    # Se pierden los más antiguos y lo que queda mantiene el orden
+    assert remaining == list(range(40 - len(remaining), 40))
+
+
+def test_age_quota(tmp_path):
+    clock = FakeClock()
+    spool = Spool(str(tmp_path), segment_bytes=64, max_age=3600, clock=clock)
+    spool.append({'cycle': 0, 'padding': 'x' * 40})
+    spool.sync()
+    old_segment = tmp_path / segment_files(str(tmp_path))[0]
+    os.utime(old_segment, (clock.now - 7200, clock.now - 7200))
+
+    clock.now += 10
+    spool.append({'cycle': 1, 'padding': 'x' * 40})
+    assert not old_segment.exists()
+    assert spool.stats()['expired'] == 1
+    assert [payload['cycle'] for payload in read_all(spool)] == [1]
+
+
+def test_expired_records_skipped_on_read(tmp_path):
+    clock = FakeClock()
+    spool = Spool(str(tmp_path), max_age=3600, clock=clock)
+    spool.append('old', written_at=clock.now - 7200)
+    spool.append('new')
+    records, position, consumed = spool.read(10)
+    assert [payload for _, payload in records] == ['new']
+    assert consumed == 2
+
+
+def test_pending_recounted_after_eviction_during_read(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=100, max_bytes=400, clock=FakeClock())
+    for cycle in range(6):
+        spool.append({'cycle': cycle, 'padding': 'x' * 30})
+    records, position, consumed = spool.read(3)
+
+    # Mientras el lote está en vuelo la cuota descarta el segmento que se estaba leyendo
+    for cycle in range(6, 20):
+        spool.append({'cycle': cycle, 'padding': 'x' * 30})
+    assert spool.stats()['evicted'] > 0
+    spool.ack(position, consumed)
+
+    remaining = Spool(str(tmp_path), segment_bytes=100, max_bytes=400, clock=FakeClock())
+    assert len(spool) == len(remaining) == len(read_all(spool)) > 0
+
+
+class Backend:
+    """send() que falla mientras el backend está caído y guarda lo entregado"""
+
+    def __init__(self, up=True):
+        self.up = up
+        self.delivered = []
+        self.lock = threading.Lock()
+
+    def __call__(self, payload):
+        with self.lock:
+            if not self.up:
+                return False
+            self.delivered.append(payload)
+            return True
+
+
+def test_replay_keeps_order_across_memory_and_spool(tmp_path):
+    backend = Backend(up=False)
+    sender = BackgroundSender(backend, spool_dir=str(tmp_path), retry_delay=0.05,
+                              max_retry_delay=0.05, replay_rate=1000)
+    for cycle in range(3):
+        sender.put(cycle)
+    assert wait_until(lambda: sender.stats()['spill_depth'] == 3)
+
+    # Backend recuperado: lo nuevo va detrás de lo pendiente en disco
+    backend.up = True
+    sender.put(3)
+    assert wait_until(lambda: len(backend.delivered) == 4)
+    sender.put(4)
+    assert sender.flush(timeout=5)
+    assert backend.delivered == [0, 1, 2, 3, 4]
+    assert sender.stats()['replayed'] == 4
+    sender.close()
+
+
+def test_close_flushes_queue(tmp_path):
+    backend = Backend()
+    sender = BackgroundSender(backend, spool_dir=str(tmp_path), send_batch=lambda payloads: [
+        backend(payload) for payload in payloads], batch_size=10)
+    for cycle in range(4):
+        sender.put(cycle)
+    assert sender.close(timeout=5)
+    assert backend.delivered == [0, 1, 2, 3]
+    assert sender.depth() == 0
+
+
+def test_close_keeps_unsent_for_next_start(tmp_path):
+    backend = Backend(up=False)
+    sender = BackgroundSender(backend, spool_dir=str(tmp_path), retry_delay=60)
+    for cycle in range(3):
+        sender.put(cycle)
+    # Backend caído: close() no puede vaciar, pero deja lo pendiente sincronizado en disco
+    assert not sender.close(timeout=0.5)
+
+    backend.up = True
+    restarted = BackgroundSender(backend, spool_dir=str(tmp_path), replay_rate=1000)
+    assert restarted.flush(timeout=5)
+    assert backend.delivered == [0, 1, 2]
+    restarted.close()
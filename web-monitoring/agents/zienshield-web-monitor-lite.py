@@ -1,22 +1,72 @@
 #!/usr/bin/env python3
 """
 ZienShield Web Traffic Monitor - Lite Version
-Versión que usa herramientas del sistema (netstat, ss) sin psutil
+Versión sin psutil: lee /proc directamente y recurre a netstat/ss/ps si no está disponible
 """
 
-import subprocess
-import socket
 import json
 import time
 import os
-import re
-import sys
+import argparse
+import shutil
+import tempfile
 from datetime import datetime
 from collections import defaultdict
 
+from zienshield_agent import procnet
+from zienshield_agent.cache import TTLCache
+from zienshield_agent.cachestore import CacheStore
+from zienshield_agent.categories import CategoryMatcher
+from zienshield_agent.domains import registrable_domain
+from zienshield_agent.processes import ProcessTable
+from zienshield_agent.resolver import ReverseResolver
+from zienshield_agent.streaming import (
+    CommandStream, stream_records, parse_netstat_line, parse_ss_line, parse_ps_aux_line
+)
+from zienshield_agent.paths import get_data_dir
+from zienshield_agent.logwriter import RotatingLogWriter
+from zienshield_agent.events import build_event
+from zienshield_agent.selfmetrics import CycleTimer
+from zienshield_agent.exporter import MetricsExporter
+from zienshield_agent.governor import BudgetGovernor, dns_targets, assign_domains
+from zienshield_agent.replay import (
+    open_session, instrument, instrument_metrics, instrument_process_table, command_stream, run_replay
+)
+
 class ZienShieldWebMonitorLite:
-    def __init__(self):
-        self.domain_cache = {}
+    def __init__(self, dns_cycle_timeout=5.0, data_dir=None, log_path=None, metrics_port=None,
+                 cpu_budget=None, rss_budget_mb=None):
+        # Caché IP -> dominio acotada (LRU) con TTL positivo y negativo
+        self.domain_cache = TTLCache(max_entries=10000, ttl=3600, negative_ttl=300)
+        # Persistencia en disco: se carga en el primer acceso y se vuelca periódicamente
+        self.dns_store = CacheStore(os.path.join(get_data_dir(data_dir), 'dns_cache.sqlite'))
+        self.dns_store.attach(self.domain_cache)
+        # Log para Wazuh abierto entre ciclos, con rotación y secuencia por línea
+        try:
+            self.wazuh_log = RotatingLogWriter(log_path or f"{os.path.expanduser('~')}/zienshield-web-traffic.log")
+        except OSError as e:
+            print(f"⚠️ Log de Wazuh no disponible: {e}")
+            self.wazuh_log = None
+        
+        # Motor /proc (sin forks) si el kernel lo expone; si no, netstat/ss/ps
+        self.proc_available = procnet.is_available()
+        self.process_table = ProcessTable() if self.proc_available else None
+        self.proc_collector = procnet.ProcNetCollector(process_table=self.process_table) if self.proc_available else None
+        self.mem_total = self.read_mem_total() if self.proc_available else 0
+        # netstat/ss/ps en streaming; --record/--replay lo sustituyen en attach_session
+        self.command_stream = CommandStream
+        self.resolver = ReverseResolver(
+            self.domain_cache,
+            transform=self.extract_domain,
+            cycle_timeout=dns_cycle_timeout
+        )
+        # Tiempo por fase de los últimos 120 ciclos y consumo propio: bloque agent_self
+        self.cycle_timer = CycleTimer(window=120)
+        # /metrics para Prometheus (opcional, solo local), generado una vez por ciclo
+        self.exporter = MetricsExporter(metrics_port, 'lite') if metrics_port is not None else None
+        
+        # Navegadores: detección de procesos y rDNS prioritaria bajo presupuesto
+        self.browsers = ['chrome', 'firefox', 'safari', 'edge', 'opera', 'brave']
         
         # Categorías de sitios web
         self.site_categories = {
@@ -27,67 +77,105 @@ class ZienShieldWebMonitorLite:
             'shopping': ['amazon.com', 'ebay.com', 'mercadolibre.com'],
             'streaming': ['spotify.com', 'apple.com', 'soundcloud.com']
         }
+        # Emparejador compilado (sufijos por etiqueta, memoizado por dominio)
+        self.category_matcher = CategoryMatcher(self.site_categories)
+        
+        # Presupuesto de CPU/RSS del agente: por encima, degradación por niveles
+        self.governor = BudgetGovernor(cpu_budget, rss_budget_mb)
+        self.governor.attach(process_table=self.process_table, domain_cache=self.domain_cache,
+                             category_matcher=self.category_matcher)
+
+    def extract_domain(self, hostname):
+        """Extraer el dominio registrable de un hostname (p.ej. www.bbc.co.uk -> bbc.co.uk)"""
+        return registrable_domain(hostname)
 
     def resolve_ip_to_domain(self, ip):
         """Resolver IP a dominio y cachear resultado"""
-        if ip in self.domain_cache:
-            return self.domain_cache[ip]
-        
+        return self.resolver.resolve(ip)
+
+    def save_dns_cache(self, force=False):
+        """Volcar la caché DNS a disco (periódicamente o de inmediato con force)"""
+        saved = self.dns_store.flush(self.domain_cache) if force else self.dns_store.maybe_flush(self.domain_cache)
+        if saved is False:
+            print(f"⚠️ No se pudo guardar la caché DNS: {self.dns_store.last_error}")
+        return saved
+
+    def attach_session(self, session):
+        """Grabar (--record) o reproducir (--replay) las entradas de los colectores del ciclo"""
+        # El motor y la memoria total son los del host grabado
+        self.proc_available = session.fact('proc_available', self.proc_available)
+        self.mem_total = session.fact('mem_total', self.mem_total)
+        if self.proc_available:
+            if self.process_table is None:
+                self.process_table = ProcessTable()
+                self.governor.attach(process_table=self.process_table, domain_cache=self.domain_cache,
+                                     category_matcher=self.category_matcher)
+            instrument_process_table(session, self.process_table)
+            instrument(session, self, 'get_active_connections_proc', 'connections')
+        # netstat/ss/ps: se graba su salida línea a línea
+        self.command_stream = command_stream(session, self.command_stream)
+        instrument(session, self.resolver, 'resolve_many', 'dns')
+        instrument_metrics(session, self, 'collect_web_metrics')
+
+    def read_mem_total(self):
+        """Memoria total en bytes desde /proc/meminfo"""
         try:
-            # Resolver IP a hostname
-            hostname = socket.gethostbyaddr(ip)[0]
-            
-            # Extraer dominio principal
-            domain_parts = hostname.split('.')
-            if len(domain_parts) >= 2:
-                domain = '.'.join(domain_parts[-2:])
-            else:
-                domain = hostname
-                
-            self.domain_cache[ip] = domain
-            return domain
-        except:
-            self.domain_cache[ip] = ip
-            return ip
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    if line.startswith('MemTotal:'):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return 0
+
+    def get_active_connections_proc(self):
+        """Obtener conexiones establecidas leyendo /proc/net/tcp{,6} y /proc/*/fd sin forks"""
+        connections = []
+        try:
+            for conn in self.proc_collector.collect():
+                connections.append({
+                    'local_addr': f"{conn['local_ip']}:{conn['local_port']}",
+                    'remote_ip': conn['remote_ip'],
+                    'remote_port': conn['remote_port'],
+                    # Mismo formato PID/Programa que netstat -p
+                    'process_info': f"{conn['pid']}/{conn['process_name']}" if conn['pid'] else 'unknown'
+                })
+        except Exception as e:
+            print(f"Error obteniendo conexiones desde /proc: {e}")
+        
+        return connections
+
+    def get_browser_processes_proc(self):
+        """Detectar procesos de navegadores desde la instantánea de /proc"""
+        active_browsers = []
+        
+        for process in self.process_table.values():
+            command = process.cmdline.lower()
+            for browser in self.browsers:
+                if browser in command or browser in process.name.lower():
+                    active_browsers.append({
+                        'browser': browser,
+                        'pid': process.pid,
+                        'cpu_percent': round(self.process_table.cpu_percent(process.pid), 1),
+                        'memory_percent': round(process.rss * 100.0 / self.mem_total, 1) if self.mem_total else 0.0,
+                        'command': process.cmdline[:100]
+                    })
+                    break
+        
+        return active_browsers
 
     def get_active_connections_netstat(self):
         """Obtener conexiones usando netstat"""
         connections = []
         try:
-            # Usar netstat para conexiones establecidas
-            cmd = ["netstat", "-tuln", "-p", "2>/dev/null"]
-            result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
+            # Conexiones TCP (no solo las que escuchan), filtradas línea a línea sin pasar por shell
+            stream = self.command_stream(["netstat", "-tnp"], timeout=15)
+            for record in stream_records(stream, parse_netstat_line):
+                connections.append(self.lite_connection(record))
             
-            if result.returncode != 0:
+            if stream.returncode != 0:
                 # Intentar con ss si netstat falla
                 return self.get_active_connections_ss()
-            
-            lines = result.stdout.strip().split('\n')
-            for line in lines:
-                if 'ESTABLISHED' in line:
-                    parts = line.split()
-                    if len(parts) >= 4:
-                        try:
-                            local_addr = parts[3]
-                            remote_addr = parts[4]
-                            
-                            # Extraer IP y puerto
-                            if ':' in remote_addr:
-                                remote_ip, remote_port = remote_addr.rsplit(':', 1)
-                                
-                                # Resolver dominio
-                                domain = self.resolve_ip_to_domain(remote_ip)
-                                
-                                connection_info = {
-                                    'local_addr': local_addr,
-                                    'remote_ip': remote_ip,
-                                    'remote_port': int(remote_port),
-                                    'domain': domain,
-                                    'process_info': parts[-1] if len(parts) > 6 else 'unknown'
-                                }
-                                connections.append(connection_info)
-                        except (ValueError, IndexError):
-                            continue
         except Exception as e:
             print(f"Error obteniendo conexiones con netstat: {e}")
         
@@ -97,112 +185,85 @@ class ZienShieldWebMonitorLite:
         """Obtener conexiones usando ss (iproute2)"""
         connections = []
         try:
-            # Usar ss para conexiones establecidas
-            cmd = ["ss", "-tuln", "-p"]
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # Conexiones TCP (-l solo listaría las que escuchan), filtradas línea a línea
+            stream = self.command_stream(["ss", "-tnp"], timeout=15)
+            for record in stream_records(stream, parse_ss_line):
+                connections.append(self.lite_connection(record))
             
-            if result.returncode != 0:
+            if stream.returncode != 0:
                 return []
-            
-            lines = result.stdout.strip().split('\n')
-            for line in lines[1:]:  # Saltar header
-                if 'ESTAB' in line:
-                    parts = line.split()
-                    if len(parts) >= 5:
-                        try:
-                            remote_addr = parts[4]
-                            
-                            # Extraer IP y puerto
-                            if ':' in remote_addr and not remote_addr.startswith('['):
-                                remote_ip, remote_port = remote_addr.rsplit(':', 1)
-                            elif remote_addr.startswith('['):
-                                # IPv6
-                                match = re.match(r'\[([^\]]+)\]:(\d+)', remote_addr)
-                                if match:
-                                    remote_ip, remote_port = match.groups()
-                                else:
-                                    continue
-                            else:
-                                continue
-                                
-                            # Resolver dominio
-                            domain = self.resolve_ip_to_domain(remote_ip)
-                            
-                            connection_info = {
-                                'local_addr': parts[3],
-                                'remote_ip': remote_ip,
-                                'remote_port': int(remote_port),
-                                'domain': domain,
-                                'process_info': parts[-1] if len(parts) > 5 else 'unknown'
-                            }
-                            connections.append(connection_info)
-                        except (ValueError, IndexError):
-                            continue
         except Exception as e:
             print(f"Error obteniendo conexiones con ss: {e}")
         
         return connections
 
+    def lite_connection(self, record):
+        """Registro de netstat/ss en el formato de conexión de la versión Lite"""
+        return {
+            'local_addr': record['local_addr'],
+            'remote_ip': record['remote_ip'],
+            'remote_port': record['remote_port'],
+            'process_info': record['process_info']
+        }
+
     def get_browser_processes_ps(self):
         """Detectar procesos de navegadores usando ps"""
-        browsers = ['chrome', 'firefox', 'safari', 'edge', 'opera', 'brave']
         active_browsers = []
         
         try:
-            # Usar ps para obtener procesos
-            cmd = ["ps", "aux"]
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # Procesar la salida de ps línea a línea (la cabecera no se parsea)
+            stream = self.command_stream(["ps", "aux"], timeout=15)
+            for process in stream_records(stream, parse_ps_aux_line):
+                command = process['command'].lower()
+                
+                for browser in self.browsers:
+                    if browser in command:
+                        active_browsers.append({
+                            'browser': browser,
+                            'pid': process['pid'],
+                            'cpu_percent': process['cpu_percent'],
+                            'memory_percent': process['memory_percent'],
+                            'command': process['command'][:100]  # Truncar comando largo
+                        })
+                        break
             
-            if result.returncode != 0:
+            if stream.returncode != 0:
                 return []
-            
-            lines = result.stdout.strip().split('\n')
-            for line in lines[1:]:  # Saltar header
-                parts = line.split(None, 10)  # Limitar split para preservar comando
-                if len(parts) >= 11:
-                    try:
-                        pid = int(parts[1])
-                        cpu = float(parts[2])
-                        mem = float(parts[3])
-                        command = parts[10].lower()
-                        
-                        for browser in browsers:
-                            if browser in command:
-                                active_browsers.append({
-                                    'browser': browser,
-                                    'pid': pid,
-                                    'cpu_percent': cpu,
-                                    'memory_percent': mem,
-                                    'command': parts[10][:100]  # Truncar comando largo
-                                })
-                                break
-                    except (ValueError, IndexError):
-                        continue
         except Exception as e:
             print(f"Error obteniendo procesos de navegadores: {e}")
         
         return active_browsers
 
     def categorize_domain(self, domain):
-        """Categorizar dominio según tipo de sitio"""
-        domain_lower = domain.lower()
-        for category, domains in self.site_categories.items():
-            for site in domains:
-                if site in domain_lower:
-                    return category
-        return 'other'
+        """Categorizar dominio según tipo de sitio (sufijo más específico)"""
+        return self.category_matcher.match(domain)
 
     def collect_web_metrics(self):
         """Recopilar todas las métricas web"""
         timestamp = datetime.now().isoformat()
+        timer = self.cycle_timer
+        
+        # Obtener conexiones activas (/proc sin forks; netstat/ss como alternativa)
+        if self.proc_available:
+            with timer.phase('process_lookup'):
+                self.process_table.refresh()
+            with timer.phase('enumeration'):
+                connections = self.get_active_connections_proc()
+        else:
+            with timer.phase('enumeration'):
+                connections = self.get_active_connections_netstat()
+                if not connections:
+                    connections = self.get_active_connections_ss()
         
-        # Obtener conexiones activas
-        connections = self.get_active_connections_netstat()
-        if not connections:
-            connections = self.get_active_connections_ss()
+        # Resolver todas las IPs del ciclo de una vez, en paralelo y con plazo
+        # (bajo presupuesto, solo las de navegadores; el resto desde la caché)
+        with timer.phase('dns'):
+            domains = self.resolver.resolve_many(dns_targets(connections, self.governor, self.browsers))
+        assign_domains(connections, domains, self.domain_cache)
         
         # Obtener navegadores activos
-        browsers = self.get_browser_processes_ps()
+        with timer.phase('process_lookup'):
+            browsers = self.get_browser_processes_proc() if self.proc_available else self.get_browser_processes_ps()
         
         # Agrupar conexiones por dominio
         domain_stats = defaultdict(lambda: {
@@ -211,33 +272,40 @@ class ZienShieldWebMonitorLite:
             'category': 'other'
         })
         
-        for conn in connections:
-            domain = conn['domain']
-            domain_stats[domain]['connections'] += 1
-            domain_stats[domain]['ports'].add(conn['remote_port'])
-            domain_stats[domain]['category'] = self.categorize_domain(domain)
+        with timer.phase('aggregation'):
+            for conn in connections:
+                domain = conn['domain']
+                domain_stats[domain]['connections'] += 1
+                domain_stats[domain]['ports'].add(conn['remote_port'])
         
-        # Convertir sets a listas para JSON
-        for domain in domain_stats:
-            domain_stats[domain]['ports'] = list(domain_stats[domain]['ports'])
+        # Categorizar una vez por dominio y convertir sets a listas para JSON
+        with timer.phase('categorization'):
+            for domain in domain_stats:
+                domain_stats[domain]['category'] = self.categorize_domain(domain)
+                domain_stats[domain]['ports'] = list(domain_stats[domain]['ports'])
         
         # Estructurar datos para Wazuh
-        web_metrics = {
-            'timestamp': timestamp,
-            'agent_id': os.uname().nodename,
-            'monitor_version': 'lite',
-            'total_connections': len(connections),
-            'total_domains': len(domain_stats),
-            'active_browsers': len(browsers),
-            'domain_stats': dict(domain_stats),
-            'browser_processes': browsers,
-            'top_domains': sorted(
-                [(domain, stats['connections']) for domain, stats in domain_stats.items()],
-                key=lambda x: x[1],
-                reverse=True
-            )[:10],
-            'categories_summary': self.get_category_summary(domain_stats)
-        }
+        with timer.phase('aggregation'):
+            web_metrics = {
+                'timestamp': timestamp,
+                'agent_id': os.uname().nodename,
+                'monitor_version': 'lite',
+                'total_connections': len(connections),
+                'total_domains': len(domain_stats),
+                'active_browsers': len(browsers),
+                'domain_stats': dict(domain_stats),
+                'browser_processes': browsers,
+                'top_domains': sorted(
+                    [(domain, stats['connections']) for domain, stats in domain_stats.items()],
+                    key=lambda x: x[1],
+                    reverse=True
+                )[:10],
+                'categories_summary': self.get_category_summary(domain_stats)
+            }
+        
+        # Tiempos por fase de los ciclos anteriores y consumo propio del agente
+        web_metrics['agent_self'] = timer.snapshot()
+        web_metrics['agent_self']['governor'] = self.governor.observe(web_metrics['agent_self'])
         
         return web_metrics
 
@@ -255,22 +323,17 @@ class ZienShieldWebMonitorLite:
     def send_to_wazuh(self, metrics):
         """Enviar métricas a Wazuh como log estructurado"""
         try:
-            # Formatear como log JSON para Wazuh
-            log_entry = {
-                'zienshield_web_traffic': metrics,
-                'rule_id': 100001,
-                'level': 3,
-                'description': 'ZienShield Web Traffic Metrics (Lite)'
-            }
-            
-            log_message = f"ZienShield-WebTraffic-Lite: {json.dumps(log_entry)}"
+            # Evento NDJSON con schema_version
+            log_entry = build_event(metrics, 'lite', 'ZienShield Web Traffic Metrics (Lite)')
             
             # Escribir a archivo local
-            log_file = f"{os.path.expanduser('~')}/zienshield-web-traffic.log"
+            if self.wazuh_log is None:
+                print("❌ Log de Wazuh no disponible")
+                return False
             try:
-                with open(log_file, 'a') as f:
-                    f.write(f"{log_message}\n")
-                print(f"✅ Métricas enviadas a {log_file}")
+                with self.cycle_timer.phase('sink_wazuh'):
+                    sequence = self.wazuh_log.write(log_entry)
+                print(f"✅ Métricas enviadas a {self.wazuh_log.path} (#{sequence})")
                 return True
             except Exception as e:
                 print(f"❌ Error escribiendo log: {e}")
@@ -280,9 +343,17 @@ class ZienShieldWebMonitorLite:
             print(f"❌ Error enviando métricas a Wazuh: {e}")
             return False
 
+    def close_log(self):
+        """Volcar y cerrar el log de Wazuh y detener /metrics"""
+        if self.wazuh_log is not None:
+            self.wazuh_log.close()
+        if self.exporter is not None:
+            self.exporter.close()
+
     def run_monitoring_cycle(self):
         """Ejecutar un ciclo completo de monitoreo"""
         print(f"🔍 Iniciando ciclo de monitoreo web (Lite) - {datetime.now()}")
+        self.cycle_timer.start_cycle()
         
         try:
             # Recopilar métricas
@@ -305,25 +376,87 @@ class ZienShieldWebMonitorLite:
             
             # Enviar a Wazuh
             success = self.send_to_wazuh(metrics)
+            if self.exporter:
+                with self.cycle_timer.phase('sink_prometheus'):
+                    self.exporter.update(metrics)
+            
+            self.cycle_timer.end_cycle()
+            print(f"⏱️ Ciclo: {self.cycle_timer.describe_last_cycle()}, "
+                  f"CPU del agente {metrics['agent_self']['cpu_percent']}%, RSS {metrics['agent_self']['rss_mb']} MB")
+            if self.governor.level:
+                print(f"🐢 Presupuesto superado, degradación activa: {self.governor.describe()}")
             
+            self.save_dns_cache()
             return success
             
         except Exception as e:
             print(f"❌ Error en ciclo de monitoreo: {e}")
             return False
 
+def replay_recording(path, output=None):
+    """Reproducir una grabación por el pipeline completo, sin tocar el log ni la caché del agente"""
+    replay = open_session(path, 'replay', 'lite')
+    data_dir = tempfile.mkdtemp(prefix='zienshield-replay-')
+    monitor = ZienShieldWebMonitorLite(data_dir=data_dir, log_path=os.path.join(data_dir, 'web-traffic.log'))
+    monitor.attach_session(replay)
+    
+    def wazuh(metrics):
+        json.dumps(build_event(metrics, 'lite', 'ZienShield Web Traffic Metrics (Lite)'), separators=(',', ':'))
+    
+    try:
+        run_replay(replay, monitor.collect_web_metrics, [('wazuh', wazuh)], output)
+    finally:
+        monitor.close_log()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
 def main():
     """Función principal"""
+    parser = argparse.ArgumentParser(description='ZienShield Web Traffic Monitor (Lite Version)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--once', action='store_true', help='Ejecutar un solo ciclo de monitoreo')
+    mode.add_argument('--record', metavar='FICHERO', default=None,
+                      help='Grabar las entradas de los colectores (conexiones, procesos, DNS) en FICHERO')
+    mode.add_argument('--replay', metavar='FICHERO', default=None,
+                      help='Reproducir una grabación sin red ni sistema y mostrar los tiempos por ciclo')
+    parser.add_argument('--record-cycles', type=int, default=10, metavar='N',
+                        help='Ciclos a grabar con --record')
+    parser.add_argument('--replay-output', metavar='FICHERO', default=None,
+                        help='Guardar las métricas reproducidas en NDJSON (para comparar reproducciones)')
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PUERTO',
+                        help='Servir /metrics en formato Prometheus en 127.0.0.1:PUERTO')
+    parser.add_argument('--cpu-budget', type=float, default=None, metavar='PCT',
+                        help='CPU media máxima del agente (100 = un núcleo); por encima se degrada por niveles')
+    parser.add_argument('--rss-budget', type=float, default=None, metavar='MB',
+                        help='Memoria residente máxima del agente; por encima se degrada por niveles')
+    args = parser.parse_args()
+    
+    if args.replay:
+        replay_recording(args.replay, args.replay_output)
+        return
+    
     print("🚀 ZienShield Web Traffic Monitor (Lite Version) iniciado")
     print("=" * 60)
-    print("ℹ️  Esta versión usa herramientas del sistema (netstat/ss/ps)")
+    print("ℹ️  Esta versión lee /proc directamente (netstat/ss/ps si no está disponible)")
     print("=" * 60)
     
-    monitor = ZienShieldWebMonitorLite()
+    monitor = ZienShieldWebMonitorLite(metrics_port=args.metrics_port, cpu_budget=args.cpu_budget,
+                                       rss_budget_mb=args.rss_budget)
+    if monitor.exporter:
+        print(f"📈 Métricas Prometheus en {monitor.exporter.address}")
+    if monitor.governor.enabled:
+        print(f"🎚️ Presupuesto del agente: CPU {args.cpu_budget or '-'}%, RSS {args.rss_budget or '-'} MB")
+    
+    recorder = None
+    if args.record:
+        recorder = open_session(args.record, 'record', 'lite', args.record_cycles)
+        monitor.attach_session(recorder)
+        print(f"⏺️ Grabando {args.record_cycles} ciclos en {args.record}")
     
-    if len(sys.argv) > 1 and sys.argv[1] == '--once':
+    if args.once:
         # Ejecutar una sola vez
         monitor.run_monitoring_cycle()
+        monitor.save_dns_cache(force=True)
+        monitor.close_log()
     else:
         # Ejecutar continuamente
         print("⏰ Iniciando monitoreo continuo (cada 30 segundos)")
@@ -333,11 +466,19 @@ def main():
             while True:
                 monitor.run_monitoring_cycle()
                 print("-" * 50)
-                time.sleep(30)
+                if recorder and recorder.done:
+                    print(f"⏹️ Grabación completa: {recorder.path}")
+                    break
+                time.sleep(monitor.governor.interval(30))
         except KeyboardInterrupt:
             print("\n🛑 Monitoreo detenido por el usuario")
         except Exception as e:
             print(f"❌ Error fatal: {e}")
+        finally:
+            monitor.save_dns_cache(force=True)
+            monitor.close_log()
+    if recorder:
+        recorder.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
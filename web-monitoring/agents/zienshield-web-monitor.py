@@ -5,16 +5,41 @@ Agente para capturar métricas de navegación web y tráfico de red
 """
 
 import subprocess
-import socket
 import json
 import time
 import os
 import re
-import sys
+import argparse
+import shutil
+import tempfile
 import requests
 from datetime import datetime
 from collections import defaultdict
 
+from zienshield_agent import procnet, sockdiag
+from zienshield_agent.delta import DeltaEncoder
+from zienshield_agent.slim import SlimEncoder
+from zienshield_agent.payload import get_top_domains, get_category_summary, UNSUPPORTED_FORMAT_STATUS
+from zienshield_agent.cache import TTLCache
+from zienshield_agent.cachestore import CacheStore
+from zienshield_agent.categories import CategoryMatcher
+from zienshield_agent.domains import registrable_domain
+from zienshield_agent.processes import ProcessTable
+from zienshield_agent.resolver import ReverseResolver
+from zienshield_agent.sender import BackgroundSender, OVERFLOW_POLICIES
+from zienshield_agent.uploader import UploadClient
+from zienshield_agent.encoding import ENCODINGS
+from zienshield_agent.batch import build_batch
+from zienshield_agent.paths import get_data_dir
+from zienshield_agent.logwriter import RotatingLogWriter
+from zienshield_agent.events import build_event
+from zienshield_agent.selfmetrics import CycleTimer, timed_upload
+from zienshield_agent.exporter import MetricsExporter
+from zienshield_agent.governor import BudgetGovernor, dns_targets, assign_domains
+from zienshield_agent.replay import (
+    open_session, instrument, instrument_metrics, instrument_process_table, run_replay
+)
+
 # Importar psutil si está disponible, sino usar métodos alternativos
 try:
     import psutil
@@ -23,17 +48,98 @@ except ImportError:
     PSUTIL_AVAILABLE = False
     print("⚠️ psutil no disponible, usando métodos alternativos")
 
+try:
+    import syslog
+    SYSLOG_AVAILABLE = True
+except ImportError:
+    SYSLOG_AVAILABLE = False
+
 class ZienShieldWebMonitor:
-    def __init__(self, backend_url="http://194.164.172.92:3001"):
+    def __init__(self, backend_url="http://194.164.172.92:3001", connection_engine='auto',
+                 delta_keyframe_interval=None, dns_cycle_timeout=5.0, data_dir=None,
+                 send_queue_size=10, send_overflow='drop-oldest', upload_encoding='gzip',
+                 batch_cycles=1, batch_interval=0, replay_rate=1.0, spool_max_mb=64, upload_schema=1,
+                 log_path=None, metrics_port=None, metrics_bind='127.0.0.1', metrics_max_domains=100,
+                 cpu_budget=None, rss_budget_mb=None):
         self.session_data = defaultdict(lambda: {
             'start_time': None,
             'bytes_sent': 0,
             'bytes_recv': 0,
             'connections': 0
         })
-        self.domain_cache = {}
-        self.process_cache = {}
+        # Caché IP -> dominio acotada (LRU) con TTL positivo y negativo
+        self.domain_cache = TTLCache(max_entries=10000, ttl=3600, negative_ttl=300)
+        # Persistencia en disco: se carga en el primer acceso y se vuelca periódicamente
+        self.data_dir = get_data_dir(data_dir)
+        self.dns_store = CacheStore(os.path.join(self.data_dir, 'dns_cache.sqlite'))
+        self.dns_store.attach(self.domain_cache)
         self.backend_url = backend_url
+        # Conexión keep-alive reutilizada entre ciclos y payload comprimido (con vuelta a JSON plano)
+        self.upload_client = UploadClient(backend_url, timeout=10, user_agent='ZienShield-Web-Monitor/1.0',
+                                          encoding=upload_encoding)
+        
+        # Instantánea de procesos compartida por todo el ciclo (caché por (pid, create_time))
+        self.process_table = ProcessTable()
+        
+        # Tiempo por fase de los últimos 120 ciclos (1 h) y consumo propio: bloque agent_self
+        self.cycle_timer = CycleTimer(window=120)
+        
+        # /metrics para Prometheus (opcional): la exposición se genera una vez por ciclo
+        self.exporter = None
+        if metrics_port is not None:
+            self.exporter = MetricsExporter(metrics_port, 'linux', host=metrics_bind,
+                                            max_domains=metrics_max_domains)
+        
+        # Resolución inversa concurrente: las IPs que no llegan a tiempo se
+        # reportan en bruto y quedan en caché para el siguiente ciclo
+        self.resolver = ReverseResolver(
+            self.domain_cache,
+            transform=self.extract_domain,
+            cycle_timeout=dns_cycle_timeout
+        )
+        
+        # Motor de conexiones: 'netlink' (sock_diag), 'proc' (/proc/net), 'psutil' o 'auto'
+        self.connection_engine = None
+        self.proc_collector = None
+        self.set_connection_engine(connection_engine)
+        
+        # Log para Wazuh abierto entre ciclos, con rotación y secuencia por línea
+        # (log_path explícito: sin ruta alternativa, p.ej. en benchmarks)
+        try:
+            self.wazuh_log = RotatingLogWriter(
+                log_path or "/var/log/zienshield-web-traffic.log",
+                fallback_path=None if log_path else f"{os.path.expanduser('~')}/zienshield-web-traffic.log"
+            )
+        except OSError as e:
+            print(f"⚠️ Log de Wazuh no disponible: {e}")
+            self.wazuh_log = None
+        if SYSLOG_AVAILABLE:
+            syslog.openlog("zienshield-web-monitor")
+        
+        # Payloads incrementales: keyframe cada N ciclos y deltas entre medias
+        self.delta_encoder = DeltaEncoder(delta_keyframe_interval) if delta_keyframe_interval else None
+        # Payload v2: sin agregados derivables y con diccionario de cadenas por sesión
+        self.slim_encoder = SlimEncoder() if upload_schema == 2 and not self.delta_encoder else None
+        self.last_connections = []
+        
+        # Envío al backend en segundo plano: un backend lento no retrasa la recolección
+        # Con lotes, N ciclos (o T segundos) viajan en una sola petición; lo que no
+        # se puede enviar queda en el spool de disco y se reenvía al volver el backend
+        batching = batch_cycles > 1 or batch_interval > 0
+        self.sender = BackgroundSender(
+            self.deliver_to_backend,
+            max_queue=send_queue_size,
+            overflow=send_overflow,
+            spool_dir=os.path.join(self.data_dir, 'spool'),
+            send_batch=self.deliver_batch_to_backend if batching else None,
+            batch_size=batch_cycles,
+            batch_interval=batch_interval,
+            spool_max_bytes=int(spool_max_mb * 1024 * 1024),
+            replay_rate=replay_rate
+        )
+        
+        # Navegadores: detección de procesos y rDNS prioritaria bajo presupuesto
+        self.browsers = ['chrome', 'firefox', 'safari', 'edge', 'opera', 'brave']
         
         # Categorías de sitios web
         self.site_categories = {
@@ -44,192 +150,249 @@ class ZienShieldWebMonitor:
             'shopping': ['amazon.com', 'ebay.com', 'mercadolibre.com'],
             'streaming': ['spotify.com', 'apple.com', 'soundcloud.com']
         }
+        # Emparejador compilado (sufijos por etiqueta, memoizado por dominio)
+        self.category_matcher = CategoryMatcher(self.site_categories)
+        
+        # Presupuesto de CPU/RSS del agente: por encima, degradación por niveles
+        self.governor = BudgetGovernor(cpu_budget, rss_budget_mb)
+        self.governor.attach(process_table=self.process_table, domain_cache=self.domain_cache,
+                             category_matcher=self.category_matcher)
+
+    def set_connection_engine(self, engine):
+        """Seleccionar el motor de conexiones, degradando si no está disponible"""
+        if engine in ('auto', 'netlink') and sockdiag.is_available():
+            self.connection_engine = 'netlink'
+            self.proc_collector = sockdiag.SockDiagCollector(process_table=self.process_table)
+        elif engine in ('auto', 'netlink', 'proc') and procnet.is_available():
+            self.connection_engine = 'proc'
+            self.proc_collector = procnet.ProcNetCollector(process_table=self.process_table)
+        else:
+            self.connection_engine = 'psutil'
+            self.proc_collector = None
+
+    def attach_session(self, session):
+        """Grabar (--record) o reproducir (--replay) las entradas de los colectores del ciclo"""
+        instrument_process_table(session, self.process_table)
+        # Mismo origen para los dos motores: la reproducción no depende del motor local
+        instrument(session, self, 'get_active_connections_proc', 'connections')
+        instrument(session, self, 'get_active_connections_psutil', 'connections')
+        instrument(session, self.resolver, 'resolve_many', 'dns')
+        instrument_metrics(session, self, 'collect_web_metrics')
+
+    def replay_sinks(self):
+        """Salidas del ciclo sin red ni disco: evento de Wazuh y payload del backend"""
+        def wazuh(metrics):
+            json.dumps(build_event(metrics, 'linux', 'ZienShield Web Traffic Metrics'), separators=(',', ':'))
+
+        def backend(metrics):
+            payload = self.encode_for_backend((metrics, self.last_connections))
+            if self.upload_client.encoder:
+                self.upload_client.encoder.encode(payload)
+            else:
+                json.dumps(payload, separators=(',', ':'))
+
+        return [('wazuh', wazuh), ('backend', backend)]
+
+    def extract_domain(self, hostname):
+        """Extraer el dominio registrable de un hostname (p.ej. www.bbc.co.uk -> bbc.co.uk)"""
+        return registrable_domain(hostname)
 
     def resolve_ip_to_domain(self, ip):
         """Resolver IP a dominio y cachear resultado"""
-        if ip in self.domain_cache:
-            return self.domain_cache[ip]
-        
-        try:
-            # Resolver IP a hostname
-            hostname = socket.gethostbyaddr(ip)[0]
-            
-            # Extraer dominio principal
-            domain_parts = hostname.split('.')
-            if len(domain_parts) >= 2:
-                domain = '.'.join(domain_parts[-2:])
-            else:
-                domain = hostname
-                
-            self.domain_cache[ip] = domain
-            return domain
-        except:
-            self.domain_cache[ip] = ip
-            return ip
+        return self.resolver.resolve(ip)
+
+    def save_dns_cache(self, force=False):
+        """Volcar la caché DNS a disco (periódicamente o de inmediato con force)"""
+        saved = self.dns_store.flush(self.domain_cache) if force else self.dns_store.maybe_flush(self.domain_cache)
+        if saved is False:
+            print(f"⚠️ No se pudo guardar la caché DNS: {self.dns_store.last_error}")
+        return saved
 
     def get_active_connections(self):
         """Obtener conexiones de red activas"""
+        with self.cycle_timer.phase('enumeration'):
+            if self.proc_collector:
+                connections = self.get_active_connections_proc()
+            else:
+                connections = self.get_active_connections_psutil()
+        
+        # Resolver todas las IPs del ciclo de una vez, en paralelo y con plazo
+        # (bajo presupuesto, solo las de navegadores; el resto desde la caché)
+        with self.cycle_timer.phase('dns'):
+            domains = self.resolver.resolve_many(dns_targets(connections, self.governor, self.browsers))
+        assign_domains(connections, domains, self.domain_cache)
+        
+        return connections
+
+    def get_active_connections_psutil(self):
+        """Obtener conexiones de red activas con psutil"""
         connections = []
         try:
             # Usar psutil para obtener conexiones de red con información de proceso
             for conn in psutil.net_connections(kind='inet'):
                 if conn.status == psutil.CONN_ESTABLISHED and conn.raddr:
-                    try:
-                        process = psutil.Process(conn.pid) if conn.pid else None
-                        process_name = process.name() if process else 'unknown'
-                        process_cmdline = ' '.join(process.cmdline()[:3]) if process else 'unknown'
-                        
-                        connection_info = {
-                            'local_ip': conn.laddr.ip,
-                            'local_port': conn.laddr.port,
-                            'remote_ip': conn.raddr.ip,
-                            'remote_port': conn.raddr.port,
-                            'pid': conn.pid or 0,
-                            'process_name': process_name,
-                            'process_cmdline': process_cmdline,
-                            'domain': self.resolve_ip_to_domain(conn.raddr.ip)
-                        }
-                        connections.append(connection_info)
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        continue
+                    # Nombre y cmdline desde la instantánea del ciclo
+                    process_name, process_cmdline = self.process_table.describe(conn.pid) or ('unknown', 'unknown')
+                    
+                    connection_info = {
+                        'local_ip': conn.laddr.ip,
+                        'local_port': conn.laddr.port,
+                        'remote_ip': conn.raddr.ip,
+                        'remote_port': conn.raddr.port,
+                        'pid': conn.pid or 0,
+                        'process_name': process_name,
+                        'process_cmdline': process_cmdline
+                    }
+                    connections.append(connection_info)
         except Exception as e:
             print(f"Error obteniendo conexiones: {e}")
         
         return connections
 
-    def get_network_stats_by_process(self):
-        """Obtener estadísticas de red por proceso"""
-        stats = {}
+    def get_active_connections_proc(self):
+        """Obtener conexiones activas desde el kernel (netlink sock_diag o /proc/net)"""
         try:
-            for proc in psutil.process_iter(['pid', 'name', 'connections']):
-                try:
-                    process_info = proc.info
-                    if process_info['connections']:
-                        stats[process_info['pid']] = {
-                            'name': process_info['name'],
-                            'connections': len(process_info['connections'])
-                        }
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
+            return self.proc_collector.collect()
+        except OSError as e:
+            # netlink rechazado (contenedor, seccomp...): degradar a /proc o psutil
+            fallback = 'proc' if self.connection_engine == 'netlink' else 'psutil'
+            print(f"⚠️ Motor {self.connection_engine} no disponible ({e}), usando {fallback}")
+            self.set_connection_engine(fallback)
+            if self.proc_collector:
+                return self.get_active_connections_proc()
+            return self.get_active_connections_psutil()
         except Exception as e:
-            print(f"Error obteniendo stats de red: {e}")
-        
-        return stats
+            print(f"Error obteniendo conexiones desde el kernel: {e}")
+            return []
 
     def categorize_domain(self, domain):
-        """Categorizar dominio según tipo de sitio"""
-        domain_lower = domain.lower()
-        for category, domains in self.site_categories.items():
-            for site in domains:
-                if site in domain_lower:
-                    return category
-        return 'other'
+        """Categorizar dominio según tipo de sitio (sufijo más específico)"""
+        return self.category_matcher.match(domain)
 
     def get_browser_processes(self):
         """Detectar procesos de navegadores activos"""
-        browsers = ['chrome', 'firefox', 'safari', 'edge', 'opera', 'brave']
         active_browsers = []
         
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'cpu_percent', 'memory_info']):
-            try:
-                process_info = proc.info
-                process_name = process_info['name'].lower()
-                
-                for browser in browsers:
-                    if browser in process_name:
-                        active_browsers.append({
-                            'browser': browser,
-                            'pid': process_info['pid'],
-                            'name': process_info['name'],
-                            'cmdline': ' '.join(process_info['cmdline'][:3]) if process_info['cmdline'] else '',
-                            'cpu_percent': process_info['cpu_percent'],
-                            'memory_mb': process_info['memory_info'].rss / 1024 / 1024 if process_info['memory_info'] else 0
-                        })
-                        break
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
+        for process in self.process_table.values():
+            process_name = process.name.lower()
+            
+            for browser in self.browsers:
+                if browser in process_name:
+                    active_browsers.append({
+                        'browser': browser,
+                        'pid': process.pid,
+                        'name': process.name,
+                        'cmdline': process.cmdline,
+                        # CPU real entre ciclos (ticks acumulados), no la primera lectura de psutil
+                        'cpu_percent': round(self.process_table.cpu_percent(process.pid), 2),
+                        'memory_mb': process.rss / 1024 / 1024,
+                        'memory_delta_mb': round(self.process_table.rss_delta(process.pid) / 1024 / 1024, 2)
+                    })
+                    break
         
         return active_browsers
 
     def collect_web_metrics(self):
         """Recopilar todas las métricas web"""
         timestamp = datetime.now().isoformat()
+        timer = self.cycle_timer
+        
+        # Un único recorrido de la tabla de procesos para todo el ciclo
+        with timer.phase('process_lookup'):
+            self.process_table.refresh()
         
         # Obtener conexiones activas
         connections = self.get_active_connections()
         
-        # Obtener estadísticas de red por proceso
-        network_stats = self.get_network_stats_by_process()
-        
         # Obtener navegadores activos
-        browsers = self.get_browser_processes()
+        with timer.phase('process_lookup'):
+            browsers = self.get_browser_processes()
         
         # Agrupar conexiones por dominio
         domain_stats = defaultdict(lambda: {
             'connections': 0,
             'processes': set(),
             'ports': set(),
-            'category': 'other'
+            'category': 'other',
+            'bytes_sent': 0,
+            'bytes_recv': 0,
+            'bytes_by_process': {}
         })
         
-        for conn in connections:
-            domain = conn['domain']
-            domain_stats[domain]['connections'] += 1
-            domain_stats[domain]['processes'].add(conn['process_name'])
-            domain_stats[domain]['ports'].add(conn['remote_port'])
-            domain_stats[domain]['category'] = self.categorize_domain(domain)
+        with timer.phase('aggregation'):
+            for conn in connections:
+                domain = conn['domain']
+                domain_stats[domain]['connections'] += 1
+                domain_stats[domain]['processes'].add(conn['process_name'])
+                domain_stats[domain]['ports'].add(conn['remote_port'])
+                
+                # Bytes movidos desde el ciclo anterior (solo motor netlink)
+                bytes_sent = conn.get('bytes_sent', 0)
+                bytes_recv = conn.get('bytes_recv', 0)
+                if bytes_sent or bytes_recv:
+                    domain_stats[domain]['bytes_sent'] += bytes_sent
+                    domain_stats[domain]['bytes_recv'] += bytes_recv
+                    process_bytes = domain_stats[domain]['bytes_by_process'].setdefault(
+                        conn['process_name'], {'bytes_sent': 0, 'bytes_recv': 0}
+                    )
+                    process_bytes['bytes_sent'] += bytes_sent
+                    process_bytes['bytes_recv'] += bytes_recv
+            
+            # Acumular tráfico de la sesión por dominio
+            for domain, stats in domain_stats.items():
+                session = self.session_data[domain]
+                if session['start_time'] is None:
+                    session['start_time'] = timestamp
+                session['bytes_sent'] += stats['bytes_sent']
+                session['bytes_recv'] += stats['bytes_recv']
+                session['connections'] = stats['connections']
+        
+        # Categorizar una vez por dominio y convertir sets a listas ordenadas (estables entre ciclos)
+        with timer.phase('categorization'):
+            for domain in domain_stats:
+                domain_stats[domain]['category'] = self.categorize_domain(domain)
+                domain_stats[domain]['processes'] = sorted(domain_stats[domain]['processes'])
+                domain_stats[domain]['ports'] = sorted(domain_stats[domain]['ports'])
         
-        # Convertir sets a listas para JSON
-        for domain in domain_stats:
-            domain_stats[domain]['processes'] = list(domain_stats[domain]['processes'])
-            domain_stats[domain]['ports'] = list(domain_stats[domain]['ports'])
+        self.last_connections = connections
         
         # Estructurar datos para Wazuh
-        web_metrics = {
-            'timestamp': timestamp,
-            'agent_id': os.uname().nodename,
-            'total_connections': len(connections),
-            'total_domains': len(domain_stats),
-            'active_browsers': len(browsers),
-            'domain_stats': dict(domain_stats),
-            'browser_processes': browsers,
-            'top_domains': sorted(
-                [(domain, stats['connections']) for domain, stats in domain_stats.items()],
-                key=lambda x: x[1],
-                reverse=True
-            )[:10],
-            'categories_summary': self.get_category_summary(domain_stats)
-        }
-        
-        return web_metrics
-
-    def get_category_summary(self, domain_stats):
-        """Obtener resumen por categorías"""
-        categories = defaultdict(lambda: {'domains': 0, 'connections': 0})
+        with timer.phase('aggregation'):
+            web_metrics = {
+                'timestamp': timestamp,
+                'agent_id': os.uname().nodename,
+                'total_connections': len(connections),
+                'total_domains': len(domain_stats),
+                'total_bytes_sent': sum(stats['bytes_sent'] for stats in domain_stats.values()),
+                'total_bytes_recv': sum(stats['bytes_recv'] for stats in domain_stats.values()),
+                'active_browsers': len(browsers),
+                'domain_stats': dict(domain_stats),
+                'browser_processes': browsers,
+                'top_domains': get_top_domains(domain_stats, 10),
+                'categories_summary': get_category_summary(domain_stats)
+            }
         
-        for domain, stats in domain_stats.items():
-            category = stats['category']
-            categories[category]['domains'] += 1
-            categories[category]['connections'] += stats['connections']
+        # Tiempos por fase de los ciclos anteriores y consumo propio del agente
+        web_metrics['agent_self'] = timer.snapshot()
+        web_metrics['agent_self']['governor'] = self.governor.observe(web_metrics['agent_self'])
         
-        return dict(categories)
+        return web_metrics
 
     def send_to_backend(self, metrics):
         """Enviar métricas al backend ZienShield para Prometheus"""
         try:
-            endpoint = f"{self.backend_url}/agent-metrics"
-            
-            # Enviar métricas al backend
-            response = requests.post(
-                endpoint,
-                json=metrics,
-                headers={'Content-Type': 'application/json'},
-                timeout=10
-            )
+            # Enviar métricas al backend por la conexión persistente
+            response = self.upload_client.post_payload('/agent-metrics', metrics)
             
             if response.status_code == 200:
                 print(f"✅ Métricas enviadas al backend ZienShield")
                 return True
+            elif response.status_code == UNSUPPORTED_FORMAT_STATUS and (self.delta_encoder or self.slim_encoder):
+                # Backend sin decodificador para keyframe/delta o v2: los siguientes envíos van en v1
+                print("⚠️ El backend no admite el formato del payload, se vuelve al formato v1")
+                self.delta_encoder = None
+                self.slim_encoder = None
+                return False
             else:
                 print(f"⚠️ Backend respondió con código {response.status_code}")
                 return False
@@ -238,41 +401,81 @@ class ZienShieldWebMonitor:
             print(f"❌ Error enviando métricas al backend: {e}")
             return False
     
+    def encode_for_backend(self, item):
+        """Payload de un ciclo encolado: métricas completas, v2 compacto o keyframe/delta"""
+        metrics, connections = item
+        if self.slim_encoder:
+            with self.cycle_timer.phase('serialization'):
+                payload = self.slim_encoder.encode(metrics)
+            print(f"📦 Payload v2 #{payload['sequence']} (sesión {payload['session']})")
+            return payload
+        if not self.delta_encoder:
+            return metrics
+        
+        # Codificar al enviar: los ciclos descartados o fusionados no rompen la secuencia
+        with self.cycle_timer.phase('serialization'):
+            payload = self.delta_encoder.encode(metrics, connections)
+        print(f"📦 Payload {payload['type']} #{payload['sequence']}")
+        return payload
+
+    def close_log(self):
+        """Volcar y cerrar el log de Wazuh"""
+        if self.wazuh_log is not None:
+            self.wazuh_log.close()
+
+    def close_exporter(self):
+        """Detener el listener /metrics si está activo"""
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def deliver_to_backend(self, item):
+        """Enviar un ciclo encolado (se ejecuta en el hilo de envío)"""
+        success = timed_upload(self.cycle_timer, self.upload_client, self.send_to_backend,
+                               self.encode_for_backend(item))
+        if not success:
+            self.resync_backend()
+        return success
+
+    def deliver_batch_to_backend(self, items):
+        """Enviar varios ciclos encolados como un único lote (timestamps por ciclo)"""
+        cycles = [self.encode_for_backend(item) for item in items]
+        print(f"📦 Lote de {len(cycles)} ciclos")
+        success = timed_upload(self.cycle_timer, self.upload_client, self.send_to_backend, build_batch(cycles))
+        if not success:
+            self.resync_backend()
+        return success
+
+    def resync_backend(self):
+        """Tras un envío fallido el backend pudo perder un payload con estado"""
+        if self.delta_encoder:
+            # Resincronizar con un keyframe
+            self.delta_encoder.force_keyframe()
+        if self.slim_encoder:
+            # Sesión nueva: datos del host y diccionario de cadenas completos
+            self.slim_encoder.reset()
+
     def send_to_wazuh(self, metrics):
         """Enviar métricas a Wazuh como log estructurado"""
         try:
-            # Formatear como log JSON para Wazuh
-            log_entry = {
-                'zienshield_web_traffic': metrics,
-                'rule_id': 100001,  # ID de regla personalizada
-                'level': 3,
-                'description': 'ZienShield Web Traffic Metrics'
-            }
+            # Evento NDJSON con schema_version (rule_id 100001: regla personalizada)
+            log_entry = build_event(metrics, 'linux', 'ZienShield Web Traffic Metrics')
             
-            # Escribir a syslog o archivo específico que Wazuh monitorea
-            log_message = f"ZienShield-WebTraffic: {json.dumps(log_entry)}"
-            
-            # Opción 1: Syslog
-            try:
-                import syslog
-                syslog.openlog("zienshield-web-monitor")
-                syslog.syslog(syslog.LOG_INFO, log_message)
-                syslog.closelog()
-            except:
-                pass
+            # Opción 1: Syslog (abierto una sola vez al arrancar)
+            if SYSLOG_AVAILABLE:
+                try:
+                    with self.cycle_timer.phase('sink_syslog'):
+                        syslog.syslog(syslog.LOG_INFO, json.dumps(log_entry, separators=(',', ':')))
+                except Exception:
+                    pass
             
-            # Opción 2: Archivo local (recomendado)
-            log_file = "/var/log/zienshield-web-traffic.log"
-            try:
-                with open(log_file, 'a') as f:
-                    f.write(f"{log_message}\n")
-            except:
-                # Fallback a archivo en home si no hay permisos
-                log_file = f"{os.path.expanduser('~')}/zienshield-web-traffic.log"
-                with open(log_file, 'a') as f:
-                    f.write(f"{log_message}\n")
+            # Opción 2: Archivo local (recomendado), /var/log o home si no hay permisos
+            if self.wazuh_log is None:
+                print("❌ Log de Wazuh no disponible")
+                return False
+            with self.cycle_timer.phase('sink_wazuh'):
+                sequence = self.wazuh_log.write(log_entry)
             
-            print(f"✅ Métricas enviadas a {log_file}")
+            print(f"✅ Métricas enviadas a {self.wazuh_log.path} (#{sequence})")
             return True
             
         except Exception as e:
@@ -282,6 +485,7 @@ class ZienShieldWebMonitor:
     def run_monitoring_cycle(self):
         """Ejecutar un ciclo completo de monitoreo"""
         print(f"🔍 Iniciando ciclo de monitoreo web - {datetime.now()}")
+        self.cycle_timer.start_cycle()
         
         try:
             # Recopilar métricas
@@ -291,17 +495,40 @@ class ZienShieldWebMonitor:
             print(f"📊 Conexiones activas: {metrics['total_connections']}")
             print(f"📊 Dominios únicos: {metrics['total_domains']}")
             print(f"📊 Navegadores activos: {metrics['active_browsers']}")
+            cache_stats = self.domain_cache.stats()
+            print(f"📊 Caché DNS: {cache_stats['entries']} entradas, {cache_stats['hits']} aciertos, "
+                  f"{cache_stats['misses']} fallos, {cache_stats['evictions']} expulsiones")
             
             if metrics['top_domains']:
                 print("📊 Top dominios:")
                 for domain, connections in metrics['top_domains'][:5]:
                     print(f"   - {domain}: {connections} conexiones")
             
-            # Enviar a ambos destinos
+            # Wazuh (fichero local) en el ciclo; el backend en el hilo de envío
             wazuh_success = self.send_to_wazuh(metrics)
-            backend_success = self.send_to_backend(metrics)
+            # Las conexiones solo hacen falta para los flujos del delta; sin él no se encolan ni van al spool
+            self.sender.put((metrics, self.last_connections if self.delta_encoder else None))
+            if self.exporter:
+                with self.cycle_timer.phase('sink_prometheus'):
+                    self.exporter.update(metrics)
+            send_stats = self.sender.stats()
+            print(f"📤 Cola de envío: {send_stats['depth']} pendientes, {send_stats['spill_depth']} en spool, "
+                  f"{send_stats['sent']} enviados, {send_stats['replayed']} reenviados, "
+                  f"{send_stats['failed']} fallidos, {send_stats['dropped']} descartados, "
+                  f"{send_stats['requests']} peticiones (último lote {send_stats['last_batch_size']}), "
+                  f"latencia {send_stats['last_latency']:.2f} s")
+            http_stats = self.upload_client.connection_stats()
+            print(f"🔗 HTTP: {http_stats['requests']} peticiones, {http_stats['connections_opened']} conexiones abiertas, "
+                  f"{http_stats['connections_reused']} reutilizadas, codificación {http_stats.get('encoding', 'json')}")
+            
+            self.cycle_timer.end_cycle()
+            print(f"⏱️ Ciclo: {self.cycle_timer.describe_last_cycle()}, "
+                  f"CPU del agente {metrics['agent_self']['cpu_percent']}%, RSS {metrics['agent_self']['rss_mb']} MB")
+            if self.governor.level:
+                print(f"🐢 Presupuesto superado, degradación activa: {self.governor.describe()}")
             
-            return wazuh_success or backend_success
+            self.save_dns_cache()
+            return wazuh_success
             
         except Exception as e:
             print(f"❌ Error en ciclo de monitoreo: {e}")
@@ -309,28 +536,134 @@ class ZienShieldWebMonitor:
 
 def main():
     """Función principal"""
+    parser = argparse.ArgumentParser(description='ZienShield Web Traffic Monitor')
+    parser.add_argument('--once', action='store_true', help='Ejecutar un solo ciclo de monitoreo')
+    parser.add_argument('--engine', choices=['auto', 'netlink', 'proc', 'psutil'], default='auto',
+                        help='Motor de conexiones (netlink: sock_diag con bytes, proc: /proc/net, psutil: multiplataforma)')
+    parser.add_argument('--dns-timeout', type=float, default=5.0, metavar='SEG',
+                        help='Plazo máximo de resolución DNS por ciclo')
+    parser.add_argument('--delta', type=int, metavar='N', default=None,
+                        help='Enviar al backend un keyframe cada N ciclos y deltas entre medias')
+    parser.add_argument('--schema', type=int, choices=[1, 2], default=1,
+                        help='Esquema del payload: 1 completo, 2 compacto (sin agregados derivables, diccionario de cadenas)')
+    parser.add_argument('--data-dir', metavar='DIR', default=None,
+                        help='Directorio de datos locales (caché DNS persistente)')
+    parser.add_argument('--queue-size', type=int, default=10, metavar='N',
+                        help='Ciclos pendientes de envío que se mantienen en memoria')
+    parser.add_argument('--overflow', choices=OVERFLOW_POLICIES, default='drop-oldest',
+                        help='Qué hacer con la cola llena: descartar el más antiguo, fusionar o desbordar a disco')
+    parser.add_argument('--encoding', choices=ENCODINGS, default='gzip',
+                        help='Codificación del payload (el backend acepta JSON y gzip; vuelve a JSON si el servidor la rechaza)')
+    parser.add_argument('--batch', type=int, default=1, metavar='N',
+                        help='Agrupar N ciclos por envío al backend (crece hasta 4N si la cola se acumula)')
+    parser.add_argument('--batch-interval', type=float, default=0, metavar='SEG',
+                        help='Enviar el lote aunque no esté completo cuando su ciclo más antiguo supere SEG segundos '
+                             '(sin --batch, agrupa los ciclos de SEG segundos)')
+    parser.add_argument('--replay-rate', type=float, default=1.0, metavar='N',
+                        help='Ciclos por segundo al reenviar el spool tras una caída del backend')
+    parser.add_argument('--spool-max-mb', type=float, default=64, metavar='MB',
+                        help='Tamaño máximo del spool en disco (se descartan los ciclos más antiguos)')
+    parser.add_argument('--record', metavar='FICHERO', default=None,
+                        help='Grabar las entradas de los colectores (procesos, conexiones, DNS) en FICHERO')
+    parser.add_argument('--record-cycles', type=int, default=10, metavar='N',
+                        help='Ciclos a grabar con --record')
+    parser.add_argument('--replay', metavar='FICHERO', default=None,
+                        help='Reproducir una grabación sin red ni sistema y mostrar los tiempos por ciclo')
+    parser.add_argument('--replay-output', metavar='FICHERO', default=None,
+                        help='Guardar las métricas reproducidas en NDJSON (para comparar reproducciones)')
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PUERTO',
+                        help='Servir /metrics en formato Prometheus en PUERTO')
+    parser.add_argument('--metrics-bind', metavar='DIR', default='127.0.0.1',
+                        help='Dirección del listener /metrics (por defecto solo local)')
+    parser.add_argument('--metrics-max-domains', type=int, default=100, metavar='N',
+                        help='Dominios con etiqueta propia en /metrics; el resto se agrega en __other__')
+    parser.add_argument('--cpu-budget', type=float, default=None, metavar='PCT',
+                        help='CPU media máxima del agente (100 = un núcleo); por encima se degrada por niveles')
+    parser.add_argument('--rss-budget', type=float, default=None, metavar='MB',
+                        help='Memoria residente máxima del agente; por encima se degrada por niveles')
+    args = parser.parse_args()
+    if args.delta and args.schema == 2:
+        parser.error('--delta y --schema 2 son excluyentes')
+    if args.record and args.replay:
+        parser.error('--record y --replay son excluyentes')
+    
+    if args.replay:
+        return replay_recording(args)
+    
     print("🚀 ZienShield Web Traffic Monitor iniciado")
     print("=" * 50)
     
-    monitor = ZienShieldWebMonitor()
+    monitor = ZienShieldWebMonitor(connection_engine=args.engine, delta_keyframe_interval=args.delta,
+                                   dns_cycle_timeout=args.dns_timeout, data_dir=args.data_dir,
+                                   send_queue_size=args.queue_size, send_overflow=args.overflow,
+                                   upload_encoding=args.encoding, batch_cycles=args.batch,
+                                   batch_interval=args.batch_interval, replay_rate=args.replay_rate,
+                                   spool_max_mb=args.spool_max_mb, upload_schema=args.schema,
+                                   metrics_port=args.metrics_port, metrics_bind=args.metrics_bind,
+                                   metrics_max_domains=args.metrics_max_domains,
+                                   cpu_budget=args.cpu_budget, rss_budget_mb=args.rss_budget)
+    print(f"🔌 Motor de conexiones: {monitor.connection_engine}")
+    if monitor.exporter:
+        print(f"📈 Métricas Prometheus en {monitor.exporter.address}")
+    if monitor.governor.enabled:
+        print(f"🎚️ Presupuesto del agente: CPU {args.cpu_budget or '-'}%, RSS {args.rss_budget or '-'} MB")
     
-    if len(sys.argv) > 1 and sys.argv[1] == '--once':
+    recorder = None
+    if args.record:
+        recorder = open_session(args.record, 'record', 'linux', args.record_cycles)
+        monitor.attach_session(recorder)
+        print(f"⏺️ Grabando {args.record_cycles} ciclos en {args.record}")
+    
+    if args.once:
         # Ejecutar una sola vez
         monitor.run_monitoring_cycle()
+        monitor.sender.close(timeout=15)
+        monitor.save_dns_cache(force=True)
+        monitor.close_log()
+        monitor.close_exporter()
     else:
         # Ejecutar continuamente
         print("⏰ Iniciando monitoreo continuo (cada 30 segundos)")
         print("   Presiona Ctrl+C para detener")
         
         try:
+            next_cycle = time.monotonic()
             while True:
                 monitor.run_monitoring_cycle()
                 print("-" * 30)
-                time.sleep(30)
+                if recorder and recorder.done:
+                    print(f"⏹️ Grabación completa: {args.record}")
+                    break
+                # Cadencia fija (doble con el nivel long_interval): la duración del ciclo no se suma
+                next_cycle = max(next_cycle + monitor.governor.interval(30), time.monotonic())
+                time.sleep(max(0, next_cycle - time.monotonic()))
         except KeyboardInterrupt:
             print("\n🛑 Monitoreo detenido por el usuario")
         except Exception as e:
             print(f"❌ Error fatal: {e}")
+        finally:
+            monitor.sender.close(timeout=5)
+            monitor.save_dns_cache(force=True)
+            monitor.close_log()
+            monitor.close_exporter()
+    if recorder:
+        recorder.close()
+
+def replay_recording(args):
+    """Reproducir una grabación por el pipeline completo, sin backend ni log del sistema"""
+    replay = open_session(args.replay, 'replay', 'linux')
+    # Datos y log en un directorio temporal: la reproducción no toca el estado del agente
+    data_dir = tempfile.mkdtemp(prefix='zienshield-replay-')
+    monitor = ZienShieldWebMonitor(connection_engine='psutil', delta_keyframe_interval=args.delta,
+                                   data_dir=data_dir, log_path=os.path.join(data_dir, 'web-traffic.log'),
+                                   upload_encoding=args.encoding, upload_schema=args.schema)
+    monitor.attach_session(replay)
+    try:
+        run_replay(replay, monitor.collect_web_metrics, monitor.replay_sinks(), args.replay_output)
+    finally:
+        monitor.sender.close(timeout=0)
+        monitor.close_log()
+        shutil.rmtree(data_dir, ignore_errors=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
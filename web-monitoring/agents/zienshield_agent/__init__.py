@@ -0,0 +1,4 @@
+"""
+ZienShield Agent - Componentes compartidos
+Módulos comunes a todas las variantes del agente de monitoreo web
+"""
@@ -0,0 +1,38 @@
+"""
+ZienShield Agent - Lotes multiciclo para /agent-metrics
+Varios ciclos en un solo documento, cada uno con su propio timestamp
+"""
+
+BATCH_FORMAT = 'zienshield-batch'
+BATCH_VERSION = 1
+
+
+def build_batch(cycles, agent_id=None):
+    """Documento de lote con los ciclos en orden de recolección"""
+    if not cycles:
+        raise ValueError("Un lote necesita al menos un ciclo")
+    return {
+        'format': BATCH_FORMAT,
+        'version': BATCH_VERSION,
+        'agent_id': agent_id or cycles[0].get('agent_id'),
+        'cycle_count': len(cycles),
+        'first_timestamp': cycles[0].get('timestamp'),
+        'last_timestamp': cycles[-1].get('timestamp'),
+        'cycles': list(cycles)
+    }
+
+
+def is_batch(document):
+    return isinstance(document, dict) and document.get('format') == BATCH_FORMAT
+
+
+def split_batch(document):
+    """Decodificador de referencia: ciclos de un lote (o el propio documento si no lo es)"""
+    if not is_batch(document):
+        return [document]
+    if document.get('version') != BATCH_VERSION:
+        raise ValueError(f"Versión de lote no soportada: {document.get('version')}")
+    cycles = document.get('cycles')
+    if not isinstance(cycles, list) or len(cycles) != document.get('cycle_count'):
+        raise ValueError("Lote incompleto: cycle_count no coincide con los ciclos recibidos")
+    return cycles
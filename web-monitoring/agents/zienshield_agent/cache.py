@@ -0,0 +1,130 @@
+"""
+ZienShield Agent - Caché acotada con TTL y expulsión LRU
+Sustituye a los dict sin límite usados como domain_cache
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Caché LRU con TTL separados para resultados positivos y negativos"""
+
+    def __init__(self, max_entries=10000, ttl=3600, negative_ttl=300, clock=time.monotonic, loader=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        # Carga diferida (p.ej. desde disco) en el primer acceso
+        self.loader = loader
+        self.load_lock = threading.Lock()
+        # clave -> (valor, instante de expiración, es_negativo)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _ensure_loaded(self):
+        if self.loader is None:
+            return
+        with self.load_lock:
+            loader, self.loader = self.loader, None
+            if loader is not None:
+                loader(self)
+
+    def get(self, key, default=None):
+        """Obtener un valor vigente y marcarlo como usado recientemente"""
+        self._ensure_loaded()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[1] <= self.clock():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, negative=False, ttl=None):
+        """Guardar un valor; los negativos (fallos de resolución) caducan antes"""
+        self._ensure_loaded()
+        if ttl is None:
+            ttl = self.negative_ttl if negative else self.ttl
+        with self.lock:
+            self.entries[key] = (value, self.clock() + ttl, negative)
+            self.entries.move_to_end(key)
+            self._evict(self.max_entries)
+
+    def _evict(self, limit):
+        while len(self.entries) > limit:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, max_entries):
+        """Cambiar el límite de entradas, expulsando las menos usadas si sobra"""
+        with self.lock:
+            self.max_entries = max_entries
+            self._evict(max_entries)
+
+    def purge_expired(self):
+        """Eliminar todas las entradas caducadas y devolver cuántas había"""
+        now = self.clock()
+        with self.lock:
+            expired = [key for key, entry in self.entries.items() if entry[1] <= now]
+            for key in expired:
+                del self.entries[key]
+            self.expirations += len(expired)
+            return len(expired)
+
+    def __contains__(self, key):
+        # Consulta sin efectos en contadores ni en el orden LRU
+        self._ensure_loaded()
+        entry = self.entries.get(key)
+        return entry is not None and entry[1] > self.clock()
+
+    def __getitem__(self, key):
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def items(self):
+        """Entradas vigentes como (clave, valor, segundos restantes, es_negativo)"""
+        now = self.clock()
+        with self.lock:
+            return [
+                (key, entry[0], entry[1] - now, entry[2])
+                for key, entry in self.entries.items()
+                if entry[1] > now
+            ]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Contadores de uso de la caché"""
+        with self.lock:
+            negative = sum(1 for entry in self.entries.values() if entry[2])
+            return {
+                'entries': len(self.entries),
+                'negative_entries': negative,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
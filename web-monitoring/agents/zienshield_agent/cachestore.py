@@ -0,0 +1,96 @@
+"""
+ZienShield Agent - Persistencia en disco de la caché DNS
+Guarda la caché inversa en SQLite para arranques en caliente y ejecuciones --once
+"""
+
+import os
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rdns_cache (
+    ip TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    negative INTEGER NOT NULL
+)
+"""
+
+
+class CacheStore:
+    """Almacén SQLite de una TTLCache con carga diferida y volcado periódico"""
+
+    def __init__(self, path, flush_interval=300):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.last_error = None
+        self.loaded_entries = 0
+
+    def attach(self, cache):
+        """Cargar el contenido del disco en el primer acceso a la caché"""
+        cache.loader = self.load
+        return cache
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.execute(SCHEMA)
+        return connection
+
+    def load(self, cache):
+        """Cargar las entradas no caducadas conservando su TTL restante"""
+        if not os.path.exists(self.path):
+            return 0
+        now = time.time()
+        try:
+            connection = self._connect()
+            try:
+                rows = connection.execute(
+                    "SELECT ip, value, expires_at, negative FROM rdns_cache WHERE expires_at > ? ORDER BY rowid",
+                    (now,)
+                ).fetchall()
+            finally:
+                connection.close()
+        except (sqlite3.Error, OSError) as e:
+            self.last_error = str(e)
+            return 0
+
+        for ip, value, expires_at, negative in rows:
+            cache.set(ip, value, negative=bool(negative), ttl=expires_at - now)
+        self.loaded_entries = len(rows)
+        return len(rows)
+
+    def flush(self, cache):
+        """Volcar la caché completa a disco (en orden LRU) en una sola transacción"""
+        now = time.time()
+        rows = [
+            (ip, value, now + remaining, int(negative))
+            for ip, value, remaining, negative in cache.items()
+        ]
+        try:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute("DELETE FROM rdns_cache")
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO rdns_cache (ip, value, expires_at, negative) VALUES (?, ?, ?, ?)",
+                        rows
+                    )
+            finally:
+                connection.close()
+        except (sqlite3.Error, OSError) as e:
+            # Disco lleno o sin permisos: la caché sigue en memoria y se reintenta en el próximo intervalo
+            self.last_error = str(e)
+            return False
+        finally:
+            self.last_flush = time.monotonic()
+
+        self.last_error = None
+        return True
+
+    def maybe_flush(self, cache):
+        """Volcar solo si ha pasado el intervalo de volcado"""
+        if time.monotonic() - self.last_flush < self.flush_interval:
+            return None
+        return self.flush(cache)
@@ -0,0 +1,59 @@
+"""
+ZienShield Agent - Categorización de dominios
+Trie de sufijos por etiquetas compilado desde site_categories
+"""
+
+import threading
+from functools import lru_cache
+
+# Marca de nodo con la categoría asignada al sufijo
+CATEGORY = '$'
+
+
+def compile_category_trie(site_categories):
+    """Trie de etiquetas invertidas; ante sitios repetidos gana la primera categoría"""
+    root = {}
+    for category, sites in site_categories.items():
+        for site in sites:
+            node = root
+            for label in reversed(site.strip().rstrip('.').lower().split('.')):
+                node = node.setdefault(label, {})
+            node.setdefault(CATEGORY, category)
+    return root
+
+
+class CategoryMatcher:
+    """Asigna a un dominio la categoría de su sufijo más específico en frontera de etiqueta
+
+    apple.com encaja con music.apple.com pero no con snapple.com; news.google.com
+    prevalece sobre google.com.
+    """
+
+    def __init__(self, site_categories, default='other', memo_size=65536):
+        self.default = default
+        self.memo_size = memo_size
+        self.lock = threading.Lock()
+        self.compile(site_categories)
+
+    def compile(self, site_categories):
+        """(Re)compilar las categorías y vaciar la memoización"""
+        trie = compile_category_trie(site_categories)
+        with self.lock:
+            self.trie = trie
+            self.match = lru_cache(maxsize=self.memo_size)(self._match)
+
+    def resize_memo(self, memo_size):
+        """Cambiar el tamaño de la memoización (se vacía)"""
+        with self.lock:
+            self.memo_size = memo_size
+            self.match = lru_cache(maxsize=memo_size)(self._match)
+
+    def _match(self, domain):
+        node = self.trie
+        category = self.default
+        for label in reversed(domain.rstrip('.').lower().split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            category = node.get(CATEGORY, category)
+        return category
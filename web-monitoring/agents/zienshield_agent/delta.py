@@ -0,0 +1,177 @@
+"""
+ZienShield Agent - Payloads incrementales (keyframe + delta)
+Codificador del agente y decodificador de referencia para /agent-metrics
+"""
+
+import copy
+
+from zienshield_agent.payload import get_top_domains, get_category_summary
+
+DELTA_FORMAT = 'zienshield-delta'
+DELTA_VERSION = 1
+
+# Campos grandes que viajan como diferencias; top_domains y categories_summary
+# se derivan de domain_stats en el receptor
+STATE_FIELDS = ('domain_stats', 'browser_processes')
+DERIVED_FIELDS = ('top_domains', 'categories_summary')
+
+
+class DeltaSequenceError(ValueError):
+    """Delta recibido sin el keyframe o delta anterior"""
+
+
+def flow_key(conn, protocol='tcp'):
+    """Clave de 5-tupla de una conexión"""
+    return (
+        protocol,
+        conn.get('local_ip', ''),
+        conn.get('local_port', 0),
+        conn['remote_ip'],
+        conn['remote_port']
+    )
+
+
+def build_flow(conn):
+    """Registro compacto de un flujo para el payload"""
+    return {
+        'key': list(flow_key(conn)),
+        'pid': conn.get('pid', 0),
+        'process': conn.get('process_name', 'unknown'),
+        'domain': conn['domain']
+    }
+
+
+def split_metrics(metrics):
+    """Separar campos escalares de los campos de estado"""
+    return {
+        key: value for key, value in metrics.items()
+        if key not in STATE_FIELDS and key not in DERIVED_FIELDS
+    }
+
+
+class DeltaEncoder:
+    """Codificador de métricas en keyframes periódicos y deltas intermedios"""
+
+    def __init__(self, keyframe_interval=10, top_domains_limit=10):
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.top_domains_limit = top_domains_limit
+        self.sequence = 0
+        self.cycles_since_keyframe = None
+        self.flows = {}
+        self.domain_stats = {}
+        self.browser_processes = []
+        self.fields = {}
+
+    def force_keyframe(self):
+        """Forzar un keyframe en el próximo ciclo (p.ej. tras un envío fallido)"""
+        self.cycles_since_keyframe = None
+
+    def encode(self, metrics, connections):
+        """Codificar un ciclo como keyframe o delta según el intervalo"""
+        self.sequence += 1
+        flows = {flow_key(conn): build_flow(conn) for conn in connections}
+        fields = split_metrics(metrics)
+        domain_stats = metrics.get('domain_stats', {})
+        browser_processes = metrics.get('browser_processes', [])
+
+        header = {
+            'format': DELTA_FORMAT,
+            'version': DELTA_VERSION,
+            'sequence': self.sequence,
+            'agent_id': metrics.get('agent_id'),
+            'timestamp': metrics.get('timestamp')
+        }
+
+        if self.cycles_since_keyframe is None or self.cycles_since_keyframe + 1 >= self.keyframe_interval:
+            payload = dict(header, **{
+                'type': 'keyframe',
+                'top_domains_limit': self.top_domains_limit,
+                'fields': fields,
+                'domain_stats': domain_stats,
+                'browser_processes': browser_processes,
+                'flows': list(flows.values())
+            })
+            self.cycles_since_keyframe = 0
+        else:
+            payload = dict(header, **{
+                'type': 'delta',
+                'base_sequence': self.sequence - 1,
+                'fields': {
+                    key: value for key, value in fields.items()
+                    if key not in self.fields or self.fields[key] != value
+                },
+                'domains_changed': {
+                    domain: stats for domain, stats in domain_stats.items()
+                    if self.domain_stats.get(domain) != stats
+                },
+                'domains_removed': [domain for domain in self.domain_stats if domain not in domain_stats],
+                # Flujos nuevos o cuyo proceso/dominio ha cambiado
+                'flows_opened': [flow for key, flow in flows.items() if self.flows.get(key) != flow],
+                'flows_closed': [list(key) for key in self.flows if key not in flows]
+            })
+            if browser_processes != self.browser_processes:
+                payload['browser_processes'] = browser_processes
+            self.cycles_since_keyframe += 1
+
+        # Copia profunda: el agente reutiliza y muta sus estructuras entre ciclos
+        self.flows = flows
+        self.domain_stats = copy.deepcopy(domain_stats)
+        self.browser_processes = copy.deepcopy(browser_processes)
+        self.fields = copy.deepcopy(fields)
+        return payload
+
+
+class DeltaDecoder:
+    """Decodificador de referencia: reconstruye el estado completo (formato v1)"""
+
+    def __init__(self):
+        self.sequence = None
+        self.top_domains_limit = 10
+        self.fields = {}
+        self.domain_stats = {}
+        self.browser_processes = []
+        self.flows = {}
+
+    def apply(self, payload):
+        """Aplicar un keyframe o delta y devolver las métricas completas"""
+        if payload.get('format') != DELTA_FORMAT:
+            raise ValueError(f"Formato de payload no soportado: {payload.get('format')}")
+        if payload.get('version') != DELTA_VERSION:
+            raise ValueError(f"Versión de delta no soportada: {payload.get('version')}")
+
+        if payload['type'] == 'keyframe':
+            self.top_domains_limit = payload.get('top_domains_limit', 10)
+            self.fields = dict(payload['fields'])
+            self.domain_stats = dict(payload['domain_stats'])
+            self.browser_processes = list(payload['browser_processes'])
+            self.flows = {tuple(flow['key']): flow for flow in payload['flows']}
+        elif payload['type'] == 'delta':
+            if self.sequence is None or payload['base_sequence'] != self.sequence:
+                raise DeltaSequenceError(
+                    f"Delta {payload['sequence']} requiere la secuencia {payload['base_sequence']}, "
+                    f"última aplicada: {self.sequence}"
+                )
+            self.fields.update(payload['fields'])
+            for domain in payload['domains_removed']:
+                self.domain_stats.pop(domain, None)
+            self.domain_stats.update(payload['domains_changed'])
+            if 'browser_processes' in payload:
+                self.browser_processes = list(payload['browser_processes'])
+            for key in payload['flows_closed']:
+                self.flows.pop(tuple(key), None)
+            for flow in payload['flows_opened']:
+                self.flows[tuple(flow['key'])] = flow
+        else:
+            raise ValueError(f"Tipo de payload desconocido: {payload['type']}")
+
+        self.sequence = payload['sequence']
+        return self.get_metrics()
+
+    def get_metrics(self):
+        """Métricas completas en el formato v1 de /agent-metrics"""
+        metrics = dict(self.fields)
+        metrics['domain_stats'] = dict(self.domain_stats)
+        metrics['browser_processes'] = list(self.browser_processes)
+        metrics['top_domains'] = get_top_domains(self.domain_stats, self.top_domains_limit)
+        metrics['categories_summary'] = get_category_summary(self.domain_stats)
+        return metrics
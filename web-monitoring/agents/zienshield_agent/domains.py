@@ -0,0 +1,114 @@
+"""
+ZienShield Agent - Extracción del dominio registrable
+Trie de etiquetas invertidas compilado desde la Public Suffix List incluida
+"""
+
+import os
+import threading
+from functools import lru_cache
+
+PSL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'public_suffix_list.dat')
+
+# Marcas de nodo: fin de regla y regla de excepción (!regla)
+RULE = '$'
+EXCEPTION = '!'
+WILDCARD = '*'
+
+
+def parse_rules(lines, include_private=False):
+    """Reglas de la PSL (sección ICANN y opcionalmente la privada) en ASCII/punycode"""
+    in_private = False
+    for line in lines:
+        line = line.strip()
+        if line.startswith('//'):
+            if '===BEGIN PRIVATE DOMAINS===' in line:
+                in_private = True
+            continue
+        if not line or (in_private and not include_private):
+            continue
+        rule = line.split()[0].lower()
+        try:
+            rule.encode('ascii')
+        except UnicodeError:
+            # Reglas IDN: se comparan en punycode, como llegan en los PTR
+            try:
+                rule = rule.encode('idna').decode('ascii')
+            except UnicodeError:
+                continue
+        yield rule
+
+
+def compile_trie(rules):
+    """Compilar las reglas en un trie de dicts indexado por etiquetas en orden inverso"""
+    root = {}
+    for rule in rules:
+        exception = rule.startswith('!')
+        node = root
+        for label in reversed(rule.lstrip('!').split('.')):
+            node = node.setdefault(label, {})
+        node[EXCEPTION if exception else RULE] = True
+    return root
+
+
+class DomainExtractor:
+    """Dominio registrable (sufijo público + 1 etiqueta) con coste O(etiquetas) y memoización"""
+
+    def __init__(self, psl_path=PSL_PATH, include_private=False, memo_size=65536):
+        self.psl_path = psl_path
+        self.include_private = include_private
+        self.trie = None
+        self.lock = threading.Lock()
+        self.registrable_domain = lru_cache(maxsize=memo_size)(self._registrable_domain)
+
+    def _ensure_trie(self):
+        if self.trie is None:
+            with self.lock:
+                if self.trie is None:
+                    with open(self.psl_path, encoding='utf-8') as f:
+                        self.trie = compile_trie(parse_rules(f, self.include_private))
+        return self.trie
+
+    def public_suffix_length(self, labels):
+        """Número de etiquetas del sufijo público; labels va de TLD hacia la izquierda"""
+        node = self._ensure_trie()
+        # Regla por defecto "*": el TLD es sufijo público aunque no esté en la lista
+        suffix = 1
+        for depth, label in enumerate(labels):
+            child = node.get(label)
+            if child is not None and EXCEPTION in child:
+                return depth
+            wildcard = node.get(WILDCARD)
+            if (child is not None and RULE in child) or (wildcard is not None and RULE in wildcard):
+                suffix = depth + 1
+            node = child if child is not None else wildcard
+            if node is None:
+                break
+        return suffix
+
+    def _registrable_domain(self, hostname):
+        hostname = hostname.strip().rstrip('.').lower()
+        labels = hostname.split('.')
+        # IPs sin resolver y nombres de una etiqueta se devuelven tal cual
+        if len(labels) < 2 or labels[-1].isdigit() or ':' in hostname:
+            return hostname
+        labels.reverse()
+        suffix = self.public_suffix_length(labels)
+        if len(labels) <= suffix:
+            return hostname
+        return '.'.join(reversed(labels[:suffix + 1]))
+
+
+_default_extractor = None
+
+
+def get_default_extractor():
+    """Extractor compartido con la PSL incluida en el paquete"""
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = DomainExtractor()
+    return _default_extractor
+
+
+def registrable_domain(hostname):
+    """Dominio registrable de un hostname, p.ej. www.bbc.co.uk -> bbc.co.uk"""
+    return get_default_extractor().registrable_domain(hostname)
@@ -0,0 +1,104 @@
+"""
+ZienShield Agent - Codificación negociada del payload de métricas
+JSON comprimido con gzip y degradación a JSON plano
+"""
+
+import json
+import time
+import zlib
+
+# El backend (express.json) solo descomprime gzip/deflate y solo interpreta JSON:
+# la negociación se limita a JSON plano y JSON con gzip
+ENCODINGS = ('json', 'gzip')
+
+CONTENT_TYPE = 'application/json'
+
+DEFAULT_LEVEL = 6
+
+# Respuestas que indican que el servidor no entiende la codificación
+# (415 de express.json ante Content-Encoding desconocido, 400 al no poder leer el cuerpo)
+REJECTED_STATUS = (400, 415)
+
+
+def serialize(payload):
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def compress(data, level=None):
+    # zlib con cabecera gzip (wbits=31): sin el objeto fichero de gzip.compress
+    compressor = zlib.compressobj(DEFAULT_LEVEL if level is None else level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def encode_payload(payload, encoding='json', level=None):
+    """Codificar un payload y devolver (cuerpo, cabeceras HTTP)"""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Codificación desconocida: {encoding}")
+    body = serialize(payload)
+    headers = {'Content-Type': CONTENT_TYPE}
+    if encoding == 'gzip':
+        body = compress(body, level)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
+
+
+def decode_payload(body, headers):
+    """Operación inversa de encode_payload a partir de las cabeceras"""
+    if headers.get('Content-Encoding') == 'gzip':
+        body = zlib.decompress(body, 47)
+    return json.loads(body)
+
+
+def fallback_chain(preferred):
+    """Codificaciones a probar en orden, terminando siempre en JSON plano"""
+    if preferred not in ENCODINGS:
+        raise ValueError(f"Codificación desconocida: {preferred}")
+    return [preferred] if preferred == 'json' else [preferred, 'json']
+
+
+class PayloadEncoder:
+    """Codificador con la codificación preferida y las rechazadas por el servidor"""
+
+    def __init__(self, preferred='gzip', level=None, retry_after=3600, clock=time.monotonic):
+        self.preferred = preferred
+        self.level = level
+        # Pasado este tiempo se vuelve a intentar una codificación rechazada (backend actualizado)
+        self.retry_after = retry_after
+        self.clock = clock
+        self.chain = fallback_chain(preferred)
+        self.rejected = {}
+        self.stats = {
+            'payloads': 0,
+            'bytes': 0,
+            'encode_time': 0.0,
+            'rejections': 0
+        }
+
+    def candidates(self):
+        """Codificaciones utilizables ahora, de la preferida a JSON plano"""
+        now = self.clock()
+        return [
+            name for name in self.chain
+            if name == 'json' or now - self.rejected.get(name, -self.retry_after) >= self.retry_after
+        ]
+
+    @property
+    def current(self):
+        return self.candidates()[0]
+
+    def encode(self, payload, encoding=None):
+        encoding = encoding or self.current
+        start = time.perf_counter()
+        body, headers = encode_payload(payload, encoding, self.level)
+        self.stats['encode_time'] += time.perf_counter() - start
+        self.stats['payloads'] += 1
+        self.stats['bytes'] += len(body)
+        return body, headers
+
+    def reject(self, encoding):
+        """Marcar una codificación como no soportada por el servidor"""
+        if encoding == 'json':
+            return
+        self.rejected[encoding] = self.clock()
+        self.stats['rejections'] += 1
+        print(f"⚠️ El servidor no acepta la codificación '{encoding}', usando '{self.current}'")
@@ -0,0 +1,239 @@
+"""
+ZienShield Agent - Formato de eventos NDJSON del log de Wazuh
+Un objeto JSON compacto por línea con schema_version, común a todas las
+variantes, y lector/validador en streaming para backfill y pruebas
+"""
+
+import argparse
+import gzip
+import json
+import os
+import time
+from collections import Counter
+
+from .logwriter import list_segments, segment_first_sequence
+
+SCHEMA_VERSION = 1
+EVENT_TYPE = 'web_traffic'
+DATA_FIELD = 'zienshield_web_traffic'
+SOURCES = ('linux', 'lite', 'windows')
+
+# Campos obligatorios de un evento y su tipo
+REQUIRED_FIELDS = {
+    'seq': int,
+    'schema_version': int,
+    'event': str,
+    'source': str,
+    'rule_id': int,
+    'level': int,
+    DATA_FIELD: dict
+}
+REQUIRED_METRICS = {
+    'timestamp': str,
+    'agent_id': str,
+    'domain_stats': dict
+}
+
+SEQ_PREFIX = b'{"seq":'
+
+
+def build_event(metrics, source, description, rule_id=100001, level=3):
+    """Evento para RotatingLogWriter.write (que antepone 'seq'), sin prefijo de texto"""
+    return {
+        'schema_version': SCHEMA_VERSION,
+        'event': EVENT_TYPE,
+        'source': source,
+        'rule_id': rule_id,
+        'level': level,
+        'description': description,
+        DATA_FIELD: metrics
+    }
+
+
+def validate_event(event):
+    """Lista de problemas de un evento (vacía si es válido)"""
+    if not isinstance(event, dict):
+        return ['el evento no es un objeto JSON']
+    problems = []
+    for field, expected in REQUIRED_FIELDS.items():
+        if field not in event:
+            problems.append(f"falta '{field}'")
+        elif not isinstance(event[field], expected) or isinstance(event[field], bool):
+            problems.append(f"'{field}' debería ser {expected.__name__}")
+    if problems:
+        return problems
+    if event['schema_version'] > SCHEMA_VERSION:
+        problems.append(f"schema_version {event['schema_version']} no soportada")
+    if event['event'] != EVENT_TYPE:
+        problems.append(f"tipo de evento desconocido: {event['event']}")
+    if event['source'] not in SOURCES:
+        problems.append(f"origen desconocido: {event['source']}")
+    metrics = event[DATA_FIELD]
+    for field, expected in REQUIRED_METRICS.items():
+        if not isinstance(metrics.get(field), expected):
+            problems.append(f"'{DATA_FIELD}.{field}' ausente o no es {expected.__name__}")
+    return problems
+
+
+def open_log(path):
+    """Abrir un log o segmento rotado (.gz) en binario"""
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+
+def log_files(path):
+    """Segmentos rotados de un log seguidos del log activo, en orden de secuencia"""
+    files = list_segments(path)
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def iter_lines(f, chunk_size=4 * 1024 * 1024):
+    """Líneas (bytes, sin salto) leyendo en bloques grandes"""
+    pending = b''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def quick_sequence(line):
+    """Secuencia de una línea NDJSON sin decodificar el JSON (None si no empieza por seq)"""
+    if not line.startswith(SEQ_PREFIX):
+        return None
+    end = line.find(b',', len(SEQ_PREFIX))
+    try:
+        return int(line[len(SEQ_PREFIX):end])
+    except ValueError:
+        return None
+
+
+def parse_line(line, legacy=True):
+    """Decodificar una línea: NDJSON o, con legacy, el formato antiguo 'Prefijo: {json}'"""
+    start = 0
+    if not line.startswith(b'{'):
+        if not legacy:
+            raise ValueError('línea sin JSON')
+        start = line.find(b'{')
+        if start < 0:
+            raise ValueError('línea sin JSON')
+    return json.loads(line[start:])
+
+
+def read_events(path, from_sequence=None, legacy=True, errors='skip'):
+    """Eventos de un log (y sus segmentos rotados si path es el log activo)
+
+    from_sequence salta los segmentos rotados anteriores y, sin decodificar,
+    las líneas con secuencia menor.
+    errors='raise' propaga las líneas ilegibles en lugar de saltarlas.
+    """
+    files = log_files(path) if not path.endswith('.gz') else [path]
+    if from_sequence is not None and len(files) > 1:
+        # Los segmentos se nombran por su primera secuencia: saltar los que terminan antes
+        starts = [segment_first_sequence(path, name) for name in files[1:]]
+        skip = sum(1 for start in starts if start and start <= from_sequence)
+        files = files[skip:]
+    for name in files:
+        with open_log(name) as f:
+            for line in iter_lines(f):
+                if not line.strip():
+                    continue
+                if from_sequence is not None:
+                    sequence = quick_sequence(line)
+                    if sequence is not None and sequence < from_sequence:
+                        continue
+                try:
+                    yield parse_line(line, legacy)
+                except ValueError:
+                    if errors == 'raise':
+                        raise
+
+
+def validate_log(path, legacy=True, max_errors=20):
+    """Validar un log completo en streaming y devolver un resumen"""
+    summary = {
+        'files': 0,
+        'bytes': 0,
+        'lines': 0,
+        'valid': 0,
+        'invalid': 0,
+        'legacy': 0,
+        'first_seq': None,
+        'last_seq': None,
+        'gaps': 0,
+        'out_of_order': 0,
+        'schema_versions': Counter(),
+        'errors': []
+    }
+    start = time.perf_counter()
+    files = log_files(path) if not path.endswith('.gz') else [path]
+    last_sequence = None
+    for name in files:
+        summary['files'] += 1
+        with open_log(name) as f:
+            for line_number, line in enumerate(iter_lines(f), 1):
+                summary['bytes'] += len(line) + 1
+                if not line.strip():
+                    continue
+                summary['lines'] += 1
+                try:
+                    if not line.startswith(b'{'):
+                        summary['legacy'] += 1
+                    event = parse_line(line, legacy)
+                    if line.startswith(b'{'):
+                        problems = validate_event(event)
+                    else:
+                        # Formato antiguo: solo se comprueba que el JSON sea un objeto
+                        problems = [] if isinstance(event, dict) else ['el evento no es un objeto JSON']
+                except ValueError as e:
+                    event, problems = None, [f"JSON inválido: {e}"]
+                if problems:
+                    summary['invalid'] += 1
+                    if len(summary['errors']) < max_errors:
+                        summary['errors'].append((name, line_number, problems))
+                    continue
+                summary['valid'] += 1
+                summary['schema_versions'][event.get('schema_version', 0)] += 1
+                sequence = event.get('seq')
+                if isinstance(sequence, int):
+                    if summary['first_seq'] is None:
+                        summary['first_seq'] = sequence
+                    if last_sequence is not None:
+                        if sequence <= last_sequence:
+                            summary['out_of_order'] += 1
+                        elif sequence > last_sequence + 1:
+                            summary['gaps'] += 1
+                    last_sequence = sequence
+                    summary['last_seq'] = sequence
+    summary['elapsed'] = time.perf_counter() - start
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validar logs NDJSON de ZienShield')
+    parser.add_argument('paths', nargs='+', help='Log activo (incluye sus segmentos rotados) o segmento .gz')
+    parser.add_argument('--strict', action='store_true', help='No aceptar líneas con prefijo de texto (formato antiguo)')
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.paths:
+        summary = validate_log(path, legacy=not args.strict)
+        speed = summary['bytes'] / 1024 / 1024 / summary['elapsed'] if summary['elapsed'] else 0
+        print(f"📄 {path}: {summary['files']} ficheros, {summary['lines']} líneas, {summary['valid']} válidas, "
+              f"{summary['invalid']} inválidas, {summary['legacy']} con formato antiguo")
+        print(f"   secuencia {summary['first_seq']}-{summary['last_seq']}, huecos: {summary['gaps']}, "
+              f"desordenadas: {summary['out_of_order']}, esquemas: {dict(summary['schema_versions'])}, "
+              f"{speed:.0f} MB/s")
+        for name, line_number, problems in summary['errors']:
+            print(f"   ❌ {name}:{line_number}: {'; '.join(problems)}")
+        failed = failed or bool(summary['invalid'])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,188 @@
+"""
+ZienShield Agent - Endpoint /metrics para Prometheus
+Listener HTTP ligero que sirve los contadores de dominios y categorías del
+último ciclo y las métricas propias del agente en formato de texto; la
+exposición se genera una vez por ciclo y cada scrape solo copia bytes
+"""
+
+import gzip
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OTHER_LABEL = '__other__'
+
+
+def escape_label(value):
+    """Valor de etiqueta escapado según el formato de texto de Prometheus"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class Exposition:
+    """Acumulador de familias de métricas (HELP/TYPE una vez por familia)"""
+
+    def __init__(self, prefix='zienshield_agent'):
+        self.prefix = prefix
+        self.lines = []
+        self.series = 0
+
+    def family(self, name, kind, help_text, samples):
+        """samples: iterable de (etiquetas, valor)"""
+        name = f"{self.prefix}_{name}"
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+            self.series += 1
+
+    def render(self):
+        return ('\n'.join(self.lines) + '\n').encode('utf-8')
+
+
+def capped_domains(domain_stats, max_domains):
+    """Los max_domains dominios con más conexiones; el resto se agrega en __other__"""
+    ranked = sorted(domain_stats.items(), key=lambda item: (-item[1].get('connections', 0), item[0]))
+    kept = ranked[:max_domains]
+    folded = ranked[max_domains:]
+    if folded:
+        other = {'category': OTHER_LABEL, 'connections': 0, 'bytes_sent': 0, 'bytes_recv': 0}
+        for _, stats in folded:
+            for key in ('connections', 'bytes_sent', 'bytes_recv'):
+                other[key] += stats.get(key, 0)
+        kept.append((OTHER_LABEL, other))
+    return kept, len(folded)
+
+
+def render_metrics(metrics, source, max_domains=100, max_categories=32, totals=None):
+    """Exposición de texto de un ciclo; totals acumula los contadores entre ciclos"""
+    totals = totals if totals is not None else {}
+    out = Exposition()
+    domain_stats = metrics.get('domain_stats', {})
+    agent = {'agent_id': metrics.get('agent_id', 'unknown'), 'source': source}
+
+    out.family('info', 'gauge', 'Agent identity', [(agent, 1)])
+    out.family('cycles_total', 'counter', 'Monitoring cycles completed', [({}, totals.get('cycles', 0))])
+    out.family('connections', 'gauge', 'Established connections in the last cycle',
+               [({}, metrics.get('total_connections', 0))])
+    out.family('domains', 'gauge', 'Unique domains in the last cycle', [({}, len(domain_stats))])
+    out.family('active_browsers', 'gauge', 'Browser processes in the last cycle',
+               [({}, metrics.get('active_browsers', 0))])
+
+    domains, folded = capped_domains(domain_stats, max_domains)
+    out.family('domain_connections', 'gauge', f'Connections per domain in the last cycle (top {max_domains})',
+               [({'domain': domain, 'category': stats.get('category', 'other')}, stats.get('connections', 0))
+                for domain, stats in domains])
+    if 'total_bytes_sent' in metrics:
+        out.family('domain_bytes_sent', 'gauge', 'Bytes sent per domain in the last cycle',
+                   [({'domain': domain}, stats.get('bytes_sent', 0)) for domain, stats in domains])
+        out.family('domain_bytes_recv', 'gauge', 'Bytes received per domain in the last cycle',
+                   [({'domain': domain}, stats.get('bytes_recv', 0)) for domain, stats in domains])
+        out.family('bytes_sent_total', 'counter', 'Bytes sent to web domains since the agent started',
+                   [({}, totals.get('bytes_sent', 0))])
+        out.family('bytes_recv_total', 'counter', 'Bytes received from web domains since the agent started',
+                   [({}, totals.get('bytes_recv', 0))])
+    out.family('domains_folded', 'gauge', f'Domains aggregated into domain="{OTHER_LABEL}" by the label cap',
+               [({}, folded)])
+
+    summary = metrics.get('categories_summary') or metrics.get('category_summary') or {}
+    categories = sorted(summary.items(), key=lambda item: (-item[1].get('connections', 0), item[0]))
+    categories = categories[:max_categories]
+    out.family('category_connections', 'gauge', 'Connections per category in the last cycle',
+               [({'category': category}, stats.get('connections', 0)) for category, stats in categories])
+    out.family('category_domains', 'gauge', 'Domains per category in the last cycle',
+               [({'category': category}, stats.get('domains', 0)) for category, stats in categories])
+
+    agent_self = metrics.get('agent_self')
+    if agent_self:
+        phases = [
+            ({'phase': phase, 'stat': stat}, histogram[stat])
+            for phase, histogram in sorted(agent_self.get('phases_ms', {}).items()) if histogram.get('count')
+            for stat in ('p50', 'p95', 'max')
+        ]
+        out.family('phase_milliseconds', 'gauge', 'Cycle time per phase over the recent cycles', phases)
+        out.family('cpu_percent', 'gauge', 'CPU used by the agent since the previous cycle (100 = one core)',
+                   [({}, agent_self.get('cpu_percent', 0.0))])
+        out.family('cpu_seconds_total', 'counter', 'CPU time used by the agent',
+                   [({}, agent_self.get('cpu_time_s', 0.0))])
+        out.family('rss_bytes', 'gauge', 'Resident memory of the agent',
+                   [({}, int(agent_self.get('rss_mb', 0) * 1024 * 1024))])
+        governor = agent_self.get('governor')
+        if governor:
+            out.family('degradation_level', 'gauge',
+                       'Budget degradation level (0 none, 1 no cmdline, 2 browser-only rDNS, '
+                       '3 longer interval, 4 smaller caches)',
+                       [({}, governor['level'])])
+    out.family('exposition_series', 'gauge', 'Series in this exposition (label cardinality)',
+               [({}, out.series + 1)])
+    return out.render()
+
+
+class MetricsExporter:
+    """Servidor /metrics en un hilo propio; update() una vez por ciclo"""
+
+    def __init__(self, port, source, host='127.0.0.1', max_domains=100, max_categories=32):
+        self.source = source
+        self.max_domains = max_domains
+        self.max_categories = max_categories
+        self.totals = {'cycles': 0, 'bytes_sent': 0, 'bytes_recv': 0}
+        self.stats = {'scrapes': 0, 'renders': 0, 'last_size': 0}
+        # (cuerpo, cuerpo gzip): se sustituye entero, los scrapes no necesitan bloqueo
+        self.body = (b'', b'')
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                plain, compressed = exporter.body
+                use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+                body = compressed if use_gzip else plain
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                if use_gzip:
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                exporter.stats['scrapes'] += 1
+
+            def log_message(self, format, *args):
+                # Sin una línea de consola por scrape
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='zienshield-metrics', daemon=True)
+        self.thread.start()
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def update(self, metrics):
+        """Generar la exposición del ciclo (texto y gzip) y publicarla"""
+        self.totals['cycles'] += 1
+        self.totals['bytes_sent'] += metrics.get('total_bytes_sent', 0)
+        self.totals['bytes_recv'] += metrics.get('total_bytes_recv', 0)
+        plain = render_metrics(metrics, self.source, self.max_domains, self.max_categories, self.totals)
+        self.body = (plain, gzip.compress(plain, 6))
+        self.stats['renders'] += 1
+        self.stats['last_size'] = len(plain)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
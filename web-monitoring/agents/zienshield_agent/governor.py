@@ -0,0 +1,144 @@
+"""
+ZienShield Agent - Presupuesto de CPU y memoria del propio agente
+Compara la CPU y el RSS de cada ciclo (bloque agent_self) con los
+presupuestos configurados y, si se superan, degrada el agente por niveles:
+sin cmdline, rDNS solo para navegadores, intervalo más largo y cachés menores
+"""
+
+# Niveles acumulativos: cada uno mantiene las degradaciones de los anteriores
+LEVELS = ('normal', 'skip_cmdline', 'browser_dns', 'long_interval', 'small_caches')
+
+
+class BudgetGovernor:
+    """Sube un nivel tras escalate_after ciclos seguidos por encima del presupuesto
+    y baja uno tras relax_after ciclos seguidos por debajo de relax_ratio del mismo
+
+    Sin presupuestos (None) no degrada nunca y solo informa del consumo. El
+    margen de relax_ratio evita oscilar al alargar el intervalo, que por sí solo
+    reduce la CPU media.
+    """
+
+    def __init__(self, cpu_budget=None, rss_budget_mb=None, escalate_after=2, relax_after=10,
+                 relax_ratio=0.5, interval_factor=2, cache_factor=0.25):
+        self.cpu_budget = cpu_budget
+        self.rss_budget_mb = rss_budget_mb
+        self.escalate_after = escalate_after
+        self.relax_after = relax_after
+        self.relax_ratio = relax_ratio
+        self.interval_factor = interval_factor
+        self.cache_factor = cache_factor
+        self.level = 0
+        self.over = 0
+        self.under = 0
+        self.changes = 0
+        self.last = {'cpu_percent': 0.0, 'rss_mb': 0.0}
+        self.process_table = None
+        self.caches = []
+
+    @property
+    def enabled(self):
+        return self.cpu_budget is not None or self.rss_budget_mb is not None
+
+    @property
+    def name(self):
+        return LEVELS[self.level]
+
+    @property
+    def skip_cmdline(self):
+        return self.level >= 1
+
+    @property
+    def browser_dns_only(self):
+        return self.level >= 2
+
+    def interval(self, base):
+        """Intervalo entre ciclos para el nivel activo"""
+        return base * self.interval_factor if self.level >= 3 else base
+
+    def cache_size(self, base):
+        """Tamaño de caché para el nivel activo"""
+        return max(1, int(base * self.cache_factor)) if self.level >= 4 else base
+
+    def attach(self, process_table=None, domain_cache=None, category_matcher=None):
+        """Objetos sobre los que actúan los niveles (cualquiera puede faltar)"""
+        self.process_table = process_table
+        self.caches = []
+        if domain_cache is not None:
+            self.caches.append((domain_cache.resize, domain_cache.max_entries))
+        if category_matcher is not None:
+            self.caches.append((category_matcher.resize_memo, category_matcher.memo_size))
+
+    def _apply(self):
+        if self.process_table is not None:
+            self.process_table.set_read_cmdline(not self.skip_cmdline)
+        for resize, base in self.caches:
+            resize(self.cache_size(base))
+
+    def _ratio(self, value, budget):
+        return value / budget if budget else 0.0
+
+    def observe(self, agent_self):
+        """Evaluar el consumo del ciclo y devolver el bloque governor para agent_self"""
+        cpu_percent = agent_self.get('cpu_percent', 0.0)
+        rss_mb = agent_self.get('rss_mb', 0.0)
+        self.last = {'cpu_percent': cpu_percent, 'rss_mb': rss_mb}
+        if self.enabled:
+            usage = max(self._ratio(cpu_percent, self.cpu_budget), self._ratio(rss_mb, self.rss_budget_mb))
+            if usage > 1.0:
+                self.over += 1
+                self.under = 0
+            elif usage <= self.relax_ratio:
+                self.under += 1
+                self.over = 0
+            else:
+                self.over = self.under = 0
+
+            # Como mucho un nivel por ciclo, en cualquiera de los dos sentidos
+            if self.over >= self.escalate_after and self.level < len(LEVELS) - 1:
+                self.level += 1
+                self.over = 0
+                self.changes += 1
+                self._apply()
+            elif self.under >= self.relax_after and self.level > 0:
+                self.level -= 1
+                self.under = 0
+                self.changes += 1
+                self._apply()
+        return self.snapshot()
+
+    def snapshot(self):
+        return {
+            'level': self.level,
+            'name': self.name,
+            'cpu_budget_percent': self.cpu_budget,
+            'rss_budget_mb': self.rss_budget_mb,
+            'over_budget_cycles': self.over,
+            'changes': self.changes
+        }
+
+    def describe(self):
+        """Texto corto del nivel activo, para la consola"""
+        return f"nivel {self.level} ({self.name})"
+
+
+def is_browser_connection(conn, browsers):
+    # process_info: 'pid/nombre' de netstat en el agente Lite
+    name = (conn.get('process_name') or conn.get('process_info') or '').lower()
+    return any(browser in name for browser in browsers)
+
+
+def dns_targets(connections, governor, browsers):
+    """IPs del ciclo que se resuelven; con browser_dns solo las de procesos de navegador
+
+    Las conexiones sin proceso conocido cuentan como no navegador.
+    """
+    if not governor.browser_dns_only:
+        return [conn['remote_ip'] for conn in connections]
+    return [conn['remote_ip'] for conn in connections if is_browser_connection(conn, browsers)]
+
+
+def assign_domains(connections, domains, cache):
+    """Dominio de cada conexión: resuelto en el ciclo, si no el de la caché, si no la IP"""
+    for conn in connections:
+        ip = conn['remote_ip']
+        conn['domain'] = domains.get(ip) or cache.get(ip) or ip
@@ -0,0 +1,245 @@
+"""
+ZienShield Agent - Escritor persistente del log que monitoriza Wazuh
+Fichero abierto entre ciclos, volcado periódico, rotación por tamaño/edad
+con compresión gzip de los segmentos cerrados y número de secuencia por línea
+"""
+
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+
+
+def line_sequence(line):
+    """Secuencia de una línea de log (con o sin prefijo de texto), o None"""
+    start = line.find(b'{')
+    if start < 0:
+        return None
+    try:
+        sequence = json.loads(line[start:]).get('seq')
+    except (ValueError, AttributeError):
+        return None
+    return sequence if isinstance(sequence, int) else None
+
+
+def read_last_sequence(path, tail_bytes=65536):
+    """Última secuencia escrita en un log (0 si no hay ninguna)"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - tail_bytes))
+            lines = f.read().splitlines()
+    except OSError:
+        return 0
+    for line in reversed(lines):
+        sequence = line_sequence(line)
+        if sequence is not None:
+            return sequence
+    return 0
+
+
+def segment_first_sequence(path, name):
+    """Primera secuencia de un segmento rotado '<log>.<secuencia>[.gz]' (0 si no lo es)"""
+    suffix = name[len(path) + 1:]
+    if suffix.endswith('.gz'):
+        suffix = suffix[:-3]
+    return int(suffix) if suffix.isdigit() else 0
+
+
+def list_segments(path):
+    """Segmentos rotados de un log, del más antiguo al más reciente"""
+    return sorted(
+        (name for name in glob.glob(glob.escape(path) + '.*') if segment_first_sequence(path, name)),
+        key=lambda name: segment_first_sequence(path, name)
+    )
+
+
+def read_first_sequence(path):
+    """Primera secuencia de un log (0 si no hay ninguna)"""
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                sequence = line_sequence(line)
+                if sequence is not None:
+                    return sequence
+    except OSError:
+        pass
+    return 0
+
+
+class RotatingLogWriter:
+    """Log de una línea JSON por evento con secuencia creciente entre rotaciones y reinicios
+
+    Los segmentos rotados se llaman '<log>.<primera secuencia>' (y '.gz' una
+    vez comprimidos), de modo que un lector que conoce su última secuencia
+    sabe en qué segmento continuar.
+    """
+
+    def __init__(self, path, fallback_path=None, max_bytes=50 * 1024 * 1024, max_age=24 * 3600,
+                 backups=5, compress=True, flush_interval=5.0, buffer_size=64 * 1024, clock=time.time):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.handle = None
+        self.flush_timer = None
+        self.last_flush = self.clock()
+        self.counters = {
+            'lines': 0,
+            'bytes': 0,
+            'flushes': 0,
+            'rotations': 0,
+            'errors': 0
+        }
+
+        # Ruta preferida (p.ej. /var/log) y alternativa si no hay permisos
+        self.path = None
+        for candidate in [path, fallback_path]:
+            if candidate and self._open(candidate):
+                break
+        if self.handle is None:
+            raise OSError(f"No se puede abrir el log en {path} ni en {fallback_path}")
+        # La secuencia continúa tras reinicios aunque el log activo esté recién rotado
+        state = self._load_state()
+        self.sequence = max(read_last_sequence(self.path), state.get('sequence', 0))
+        if self.size and state.get('created_at'):
+            self.opened_at = state['created_at']
+        else:
+            self._save_state()
+
+    def _state_path(self):
+        return self.path + '.state'
+
+    def _load_state(self):
+        try:
+            with open(self._state_path(), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        # Creación del segmento activo y última secuencia del segmento anterior
+        try:
+            with open(self._state_path() + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'sequence': self.sequence, 'created_at': self.opened_at}, f)
+            os.replace(self._state_path() + '.tmp', self._state_path())
+        except OSError:
+            self.counters['errors'] += 1
+
+    def _open(self, path):
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.handle = open(path, 'a', encoding='utf-8', buffering=self.buffer_size)
+        except OSError:
+            return False
+        self.path = path
+        self.size = self.handle.tell()
+        self.opened_at = self.clock()
+        self.first_sequence = None
+        return True
+
+    def write(self, entry, prefix=None):
+        """Escribir un evento con la siguiente secuencia; devuelve la secuencia asignada"""
+        with self.lock:
+            sequence = self.sequence + 1
+            line = json.dumps(dict({'seq': sequence}, **entry), separators=(',', ':'))
+            if prefix:
+                line = f"{prefix}: {line}"
+            line += '\n'
+            encoded_size = len(line.encode('utf-8'))
+            if self.size and (self.size + encoded_size > self.max_bytes or
+                              self.clock() - self.opened_at >= self.max_age):
+                self._rotate()
+            try:
+                self.handle.write(line)
+            except OSError:
+                self.counters['errors'] += 1
+                raise
+            self.sequence = sequence
+            if self.first_sequence is None:
+                self.first_sequence = sequence
+            self.size += encoded_size
+            self.counters['lines'] += 1
+            self.counters['bytes'] += encoded_size
+            self._schedule_flush()
+            return self.sequence
+
+    def _schedule_flush(self):
+        remaining = self.last_flush + self.flush_interval - self.clock()
+        if remaining <= 0:
+            self._flush()
+        elif self.flush_timer is None:
+            # Volcado diferido: una línea nunca queda en el búfer más de flush_interval
+            self.flush_timer = threading.Timer(remaining, self.flush)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
+
+    def _flush(self):
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        if self.handle is not None:
+            self.handle.flush()
+            self.counters['flushes'] += 1
+        self.last_flush = self.clock()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _rotate(self):
+        self._flush()
+        self.handle.close()
+        first_sequence = self.first_sequence or read_first_sequence(self.path) or self.sequence
+        rotated = f"{self.path}.{first_sequence:012d}"
+        os.replace(self.path, rotated)
+        self._open(self.path)
+        self._save_state()
+        self.counters['rotations'] += 1
+        if self.compress:
+            threading.Thread(target=self._compress_and_prune, args=(rotated,), daemon=True).start()
+        else:
+            self._prune()
+
+    def _compress_and_prune(self, rotated):
+        try:
+            with open(rotated, 'rb') as source, gzip.open(rotated + '.gz.tmp', 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.replace(rotated + '.gz.tmp', rotated + '.gz')
+            os.remove(rotated)
+        except OSError:
+            self.counters['errors'] += 1
+        with self.lock:
+            self._prune()
+
+    def _prune(self):
+        for segment in list_segments(self.path)[:-self.backups or None]:
+            try:
+                os.remove(segment)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['sequence'] = self.sequence
+            stats['path'] = self.path
+            stats['size'] = self.size
+            return stats
+
+    def close(self):
+        with self.lock:
+            if self.handle is not None:
+                self._flush()
+                self.handle.close()
+                self.handle = None
@@ -0,0 +1,26 @@
+"""
+ZienShield Agent - Rutas de datos locales
+Directorio data/ del agente instalado o alternativa por usuario
+"""
+
+import os
+import platform
+
+INSTALL_DATA_DIRS = {
+    'Windows': os.path.join(os.environ.get('PROGRAMFILES', 'C:\\Program Files'), 'ZienShield', 'data'),
+    'default': '/opt/zienshield/data'
+}
+
+
+def get_data_dir(preferred=None):
+    """Directorio de datos: el indicado, el de instalación si es escribible o uno por usuario"""
+    if preferred:
+        return preferred
+
+    install_dir = INSTALL_DATA_DIRS.get(platform.system(), INSTALL_DATA_DIRS['default'])
+    if os.path.isdir(install_dir) and os.access(install_dir, os.W_OK):
+        return install_dir
+
+    if platform.system() == 'Windows':
+        return os.path.join(os.path.expanduser('~'), 'Documents', 'ZienShield', 'data')
+    return os.path.join(os.path.expanduser('~'), '.zienshield', 'data')
@@ -0,0 +1,29 @@
+"""
+ZienShield Agent - Utilidades de payload
+Agregados derivables de domain_stats, compartidos por agentes y decodificadores
+"""
+
+from collections import defaultdict
+
+# Respuesta de /agent-metrics a un formato de payload que el backend no decodifica
+UNSUPPORTED_FORMAT_STATUS = 422
+
+
+def get_top_domains(domain_stats, limit=10):
+    """Top dominios por número de conexiones (desempate alfabético)"""
+    return sorted(
+        [(domain, stats['connections']) for domain, stats in domain_stats.items()],
+        key=lambda x: (-x[1], x[0])
+    )[:limit]
+
+
+def get_category_summary(domain_stats):
+    """Resumen de dominios y conexiones por categoría"""
+    categories = defaultdict(lambda: {'domains': 0, 'connections': 0})
+
+    for domain, stats in domain_stats.items():
+        category = stats['category']
+        categories[category]['domains'] += 1
+        categories[category]['connections'] += stats['connections']
+
+    return dict(categories)
@@ -0,0 +1,226 @@
+"""
+ZienShield Agent - Instantánea de la tabla de procesos
+Un recorrido por ciclo (/proc o psutil) consultable por PID, con caché de
+nombre y cmdline entre ciclos por (pid, create_time)
+"""
+
+import os
+import time
+from collections import namedtuple
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# cpu_time: segundos de CPU acumulados (usuario + sistema); rss en bytes
+ProcessEntry = namedtuple('ProcessEntry', [
+    'pid', 'create_time', 'name', 'cmdline', 'rss', 'cpu_time'
+])
+
+
+def read_boot_time(proc_root='/proc'):
+    """Instante de arranque del sistema (btime de /proc/stat)"""
+    try:
+        with open(os.path.join(proc_root, 'stat'), 'r') as f:
+            for line in f:
+                if line.startswith('btime'):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    return 0.0
+
+
+def parse_proc_stat(data):
+    """Nombre y campos numéricos de /proc/[pid]/stat (el nombre puede contener espacios)"""
+    start = data.index('(')
+    end = data.rindex(')')
+    return data[start + 1:end], data[end + 2:].split()
+
+
+class CpuSampler:
+    """CPU % y variación de RSS por proceso entre dos instantáneas, sin esperas bloqueantes
+
+    Conserva el último cpu_time acumulado de cada (pid, create_time); como
+    psutil, 100% equivale a un núcleo completo.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        # (pid, create_time) -> (cpu_time, rss, instante)
+        self.samples = {}
+        self.cpu_percent = {}
+        self.rss_delta = {}
+
+    def update(self, processes):
+        """Calcular los deltas respecto a la instantánea anterior y olvidar los procesos terminados"""
+        now = self.clock()
+        samples = {}
+        cpu_percent = {}
+        rss_delta = {}
+        for pid, entry in processes.items():
+            key = (pid, entry.create_time)
+            previous = self.samples.get(key)
+            if previous is not None and now > previous[2]:
+                cpu_percent[pid] = max(0.0, (entry.cpu_time - previous[0]) / (now - previous[2]) * 100)
+                rss_delta[pid] = entry.rss - previous[1]
+            samples[key] = (entry.cpu_time, entry.rss, now)
+
+        self.samples = samples
+        self.cpu_percent = cpu_percent
+        self.rss_delta = rss_delta
+
+
+class ProcessTable:
+    """Tabla de procesos del ciclo actual; refresh() una vez por ciclo y consultas por PID"""
+
+    def __init__(self, proc_root='/proc', max_args=3):
+        self.proc_root = proc_root
+        self.max_args = max_args
+        # Sin cmdline (presupuesto superado) se usa el nombre del proceso
+        self.read_cmdline = True
+        self.use_proc = os.path.exists(os.path.join(proc_root, 'self', 'stat'))
+        if self.use_proc:
+            self.clock_ticks = os.sysconf('SC_CLK_TCK')
+            self.page_size = os.sysconf('SC_PAGE_SIZE')
+            self.boot_time = read_boot_time(proc_root)
+        self.processes = {}
+        # (pid, create_time) -> (nombre, cmdline): solo se leen para procesos nuevos
+        self.static_info = {}
+        self.cpu_sampler = CpuSampler()
+        self.stats = {'processes': 0, 'new': 0, 'cached': 0}
+
+    def refresh(self):
+        """Tomar la instantánea del ciclo"""
+        processes = self.snapshot()
+
+        # Olvidar los procesos que ya no existen (o cuyo PID se ha reutilizado)
+        alive = {(entry.pid, entry.create_time) for entry in processes.values()}
+        for key in [key for key in self.static_info if key not in alive]:
+            del self.static_info[key]
+
+        self.processes = processes
+        self.cpu_sampler.update(processes)
+        self.stats['processes'] = len(processes)
+        return processes
+
+    def set_read_cmdline(self, enabled):
+        """Activar o no la lectura de cmdline de los procesos nuevos"""
+        if enabled and not self.read_cmdline:
+            # Los procesos vistos sin cmdline se vuelven a leer una vez
+            self.static_info.clear()
+        self.read_cmdline = enabled
+
+    def snapshot(self):
+        """Recorrido de procesos sin actualizar la tabla ({pid: ProcessEntry})"""
+        if self.use_proc:
+            return self._snapshot_proc()
+        if PSUTIL_AVAILABLE:
+            return self._snapshot_psutil()
+        return {}
+
+    def _static_info(self, key, read):
+        info = self.static_info.get(key)
+        if info is None:
+            info = self.static_info[key] = read()
+            self.stats['new'] += 1
+        else:
+            self.stats['cached'] += 1
+        return info
+
+    def _snapshot_proc(self):
+        processes = {}
+        try:
+            names = os.listdir(self.proc_root)
+        except OSError:
+            return processes
+
+        for name in names:
+            if not name.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.proc_root, name, 'stat'), 'r') as f:
+                    comm, fields = parse_proc_stat(f.read())
+            except (OSError, ValueError):
+                # Proceso terminado durante el recorrido
+                continue
+
+            pid = int(name)
+            # Campos 14/15 (utime, stime), 22 (starttime) y 24 (rss) de proc(5)
+            create_time = self.boot_time + int(fields[19]) / self.clock_ticks
+            process_name, cmdline = self._static_info(
+                (pid, create_time), lambda: self._read_proc_static(pid, comm)
+            )
+            processes[pid] = ProcessEntry(
+                pid, create_time, process_name, cmdline,
+                int(fields[21]) * self.page_size,
+                (int(fields[11]) + int(fields[12])) / self.clock_ticks
+            )
+        return processes
+
+    def _read_proc_static(self, pid, comm):
+        if not self.read_cmdline:
+            return comm, comm
+        try:
+            with open(os.path.join(self.proc_root, str(pid), 'cmdline'), 'rb') as f:
+                args = f.read().rstrip(b'\0').split(b'\0')
+            cmdline = ' '.join(arg.decode('utf-8', 'replace') for arg in args[:self.max_args])
+        except OSError:
+            cmdline = ''
+        return comm, cmdline or comm
+
+    def _snapshot_psutil(self):
+        processes = {}
+        # process_iter con atributos usa oneshot() internamente
+        for proc in psutil.process_iter(['pid', 'create_time', 'memory_info', 'cpu_times']):
+            info = proc.info
+            if info['create_time'] is None:
+                continue
+            process_name, cmdline = self._static_info(
+                (info['pid'], info['create_time']), lambda: self._read_psutil_static(proc)
+            )
+            cpu_times = info['cpu_times']
+            processes[info['pid']] = ProcessEntry(
+                info['pid'], info['create_time'], process_name, cmdline,
+                info['memory_info'].rss if info['memory_info'] else 0,
+                cpu_times.user + cpu_times.system if cpu_times else 0.0
+            )
+        return processes
+
+    def _read_psutil_static(self, proc):
+        try:
+            with proc.oneshot():
+                name = proc.name()
+                try:
+                    cmdline = ' '.join(proc.cmdline()[:self.max_args]) if self.read_cmdline else ''
+                except psutil.AccessDenied:
+                    cmdline = ''
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return 'unknown', 'unknown'
+        return name, cmdline or name
+
+    def get(self, pid):
+        """Entrada del proceso en la instantánea actual o None"""
+        return self.processes.get(pid)
+
+    def describe(self, pid):
+        """(nombre, cmdline) del proceso o None si no está en la instantánea"""
+        entry = self.processes.get(pid)
+        if entry is None:
+            return None
+        return entry.name, entry.cmdline
+
+    def cpu_percent(self, pid):
+        """CPU % desde la instantánea anterior (0.0 en la primera en que aparece el proceso)"""
+        return self.cpu_sampler.cpu_percent.get(pid, 0.0)
+
+    def rss_delta(self, pid):
+        """Variación de RSS en bytes desde la instantánea anterior"""
+        return self.cpu_sampler.rss_delta.get(pid, 0)
+
+    def values(self):
+        return self.processes.values()
+
+    def __len__(self):
+        return len(self.processes)
@@ -0,0 +1,312 @@
+"""
+ZienShield Agent - Grabación y reproducción de ciclos
+Graba las entradas de los colectores de N ciclos (tabla de procesos,
+conexiones, salida de netstat/ss/ps/tasklist y respuestas DNS) en un NDJSON
+comprimido y las reproduce por el pipeline completo sin red ni sistema
+"""
+
+import gzip
+import json
+import statistics
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+from .processes import ProcessEntry
+
+RECORDING_FORMAT = 'zienshield-recording'
+RECORDING_VERSION = 1
+
+# Campos de las métricas que dependen del host o del reloj: la reproducción usa los grabados
+STAMP_FIELDS = ('timestamp', 'agent_id', 'hostname', 'username', 'os_info')
+
+
+class ReplayError(ValueError):
+    """La grabación no contiene la entrada que pide el agente (pipeline distinto o fichero dañado)"""
+
+
+class CycleRecorder:
+    """Graba las entradas de cada ciclo; una línea JSON por ciclo tras una cabecera
+
+    La cabecera se escribe al cerrar el primer ciclo, con los datos fijos del
+    host (fact) que el agente haya consultado al enlazar la sesión.
+    """
+
+    mode = 'record'
+
+    def __init__(self, path, variant, cycles=10):
+        self.path = path
+        self.variant = variant
+        self.cycles = cycles
+        self.facts = {}
+        self.inputs = []
+        self.cycle = 0
+        self.active = set()
+        self.header_written = False
+        self.handle = gzip.open(path, 'wt', encoding='utf-8')
+
+    @property
+    def done(self):
+        return self.cycle >= self.cycles
+
+    def fact(self, name, value):
+        """Guardar un dato fijo del host (p.ej. memoria total) y devolverlo"""
+        self.facts[name] = value
+        return value
+
+    def record(self, source, value):
+        self.inputs.append([source, value])
+
+    def call(self, source, function, args, kwargs, encode=None, decode=None):
+        # Una llamada anidada a la misma fuente (resolve -> resolve_many) se graba una vez
+        if source in self.active:
+            return function(*args, **kwargs)
+        self.active.add(source)
+        try:
+            value = function(*args, **kwargs)
+        finally:
+            self.active.discard(source)
+        self.record(source, encode(value) if encode else value)
+        return value
+
+    def stamp(self, metrics, fields=STAMP_FIELDS):
+        """Cerrar el ciclo con los campos dependientes del host de sus métricas"""
+        if self.done:
+            return metrics
+        if not self.header_written:
+            self._write({
+                'format': RECORDING_FORMAT,
+                'version': RECORDING_VERSION,
+                'variant': self.variant,
+                'created': datetime.now().isoformat(),
+                'facts': self.facts
+            })
+            self.header_written = True
+        self.cycle += 1
+        self._write({
+            'cycle': self.cycle,
+            'stamp': {field: metrics[field] for field in fields if field in metrics},
+            'inputs': self.inputs
+        })
+        self.inputs = []
+        if self.done:
+            self.close()
+        return metrics
+
+    def discard(self):
+        """Olvidar las entradas de un ciclo que ha fallado antes de terminar"""
+        self.inputs = []
+
+    def _write(self, document):
+        self.handle.write(json.dumps(document, separators=(',', ':')) + '\n')
+        self.handle.flush()
+
+    def close(self):
+        if not self.handle.closed:
+            self.handle.close()
+
+
+class CycleReplay:
+    """Entrega las entradas grabadas en el mismo orden en que el agente las pidió"""
+
+    mode = 'replay'
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = gzip.open(path, 'rt', encoding='utf-8')
+        header = json.loads(self.handle.readline() or '{}')
+        if header.get('format') != RECORDING_FORMAT:
+            self.handle.close()
+            raise ReplayError(f"{path} no es una grabación de ZienShield")
+        if header.get('version') != RECORDING_VERSION:
+            self.handle.close()
+            raise ReplayError(f"Versión de grabación no soportada: {header.get('version')}")
+        self.variant = header['variant']
+        self.created = header.get('created')
+        self.facts = header.get('facts', {})
+        self.cycle = 0
+        self.stamp_fields = {}
+        self.pending = {}
+
+    def fact(self, name, value):
+        return self.facts.get(name, value)
+
+    def next_cycle(self):
+        """Cargar el siguiente ciclo; False al terminar la grabación"""
+        line = self.handle.readline()
+        if not line:
+            self.handle.close()
+            return False
+        document = json.loads(line)
+        self.cycle = document['cycle']
+        self.stamp_fields = document['stamp']
+        self.pending = defaultdict(deque)
+        for source, value in document['inputs']:
+            self.pending[source].append(value)
+        return True
+
+    def take(self, source):
+        queue = self.pending.get(source)
+        if not queue:
+            raise ReplayError(f"Ciclo {self.cycle}: la grabación no tiene más entradas de '{source}'")
+        return queue.popleft()
+
+    def unused(self):
+        """Fuentes con entradas sin consumir en el ciclo (el pipeline se ha desviado)"""
+        return {source: len(queue) for source, queue in self.pending.items() if queue}
+
+    def call(self, source, function, args, kwargs, encode=None, decode=None):
+        value = self.take(source)
+        return decode(value) if decode else value
+
+    def stamp(self, metrics, fields=STAMP_FIELDS):
+        metrics.update(self.stamp_fields)
+        return metrics
+
+    def discard(self):
+        pass
+
+    def close(self):
+        self.handle.close()
+
+
+def open_session(path, mode, variant=None, cycles=10):
+    """CycleRecorder ('record') o CycleReplay ('replay') sobre path"""
+    if mode == 'record':
+        return CycleRecorder(path, variant, cycles)
+    replay = CycleReplay(path)
+    if variant and replay.variant != variant:
+        replay.close()
+        raise ReplayError(f"La grabación es del agente '{replay.variant}', no de '{variant}'")
+    return replay
+
+
+def instrument(session, obj, attribute, source, encode=None, decode=None):
+    """Sustituir obj.attribute por una versión que graba o reproduce su resultado"""
+    original = getattr(obj, attribute)
+
+    def instrumented(*args, **kwargs):
+        return session.call(source, original, args, kwargs, encode, decode)
+
+    setattr(obj, attribute, instrumented)
+
+
+def instrument_metrics(session, obj, attribute, fields=STAMP_FIELDS):
+    """El método que recopila las métricas marca el final de cada ciclo"""
+    original = getattr(obj, attribute)
+
+    def collect(*args, **kwargs):
+        try:
+            metrics = original(*args, **kwargs)
+        except Exception:
+            session.discard()
+            raise
+        return session.stamp(metrics, fields)
+
+    setattr(obj, attribute, collect)
+
+
+def encode_processes(processes):
+    return [list(entry) for entry in processes.values()]
+
+
+def decode_processes(rows):
+    return {row[0]: ProcessEntry(*row) for row in rows}
+
+
+def instrument_process_table(session, table):
+    """Instantánea de procesos y reloj del muestreador de CPU (CPU % idéntico al reproducir)"""
+    instrument(session, table, 'snapshot', 'processes', encode_processes, decode_processes)
+    instrument(session, table.cpu_sampler, 'clock', 'clock')
+
+
+class RecordedStream:
+    """Salida grabada de un comando con la interfaz de CommandStream"""
+
+    def __init__(self, cmd, lines, returncode):
+        self.cmd = cmd
+        self.lines = lines
+        self.recorded_returncode = returncode
+        self.returncode = None
+        self.timed_out = False
+
+    def __iter__(self):
+        yield from self.lines
+        self.returncode = self.recorded_returncode
+
+
+class RecordingStream:
+    """CommandStream que guarda las líneas leídas y el código de salida al terminar"""
+
+    def __init__(self, session, source, stream):
+        self.session = session
+        self.source = source
+        self.stream = stream
+
+    @property
+    def returncode(self):
+        return self.stream.returncode
+
+    @property
+    def timed_out(self):
+        return self.stream.timed_out
+
+    def __iter__(self):
+        lines = []
+        try:
+            for line in self.stream:
+                lines.append(line)
+                yield line
+        finally:
+            self.session.record(self.source, [lines, self.stream.returncode])
+
+
+def command_stream(session, stream_class):
+    """Sustituto de CommandStream que graba o reproduce la salida de cada comando"""
+    def factory(cmd, *args, **kwargs):
+        source = 'command:' + ' '.join(cmd)
+        if session.mode == 'replay':
+            lines, returncode = session.take(source)
+            return RecordedStream(cmd, lines, returncode)
+        return RecordingStream(session, source, stream_class(cmd, *args, **kwargs))
+    return factory
+
+
+def run_replay(replay, collect, sinks=(), output=None):
+    """Reproducir todos los ciclos: collect() y cada sink(metrics), con tiempos por etapa
+
+    Devuelve {etapa: [segundos por ciclo]}; output guarda las métricas de cada
+    ciclo en NDJSON para comparar dos reproducciones.
+    """
+    timings = defaultdict(list)
+    out = open(output, 'w', encoding='utf-8') if output else None
+    print(f"▶️ Reproduciendo {replay.path} (agente {replay.variant}, grabada {replay.created})")
+    try:
+        while replay.next_cycle():
+            start = time.perf_counter()
+            metrics = collect()
+            stages = {'recolección': time.perf_counter() - start}
+            for name, sink in sinks:
+                start = time.perf_counter()
+                sink(metrics)
+                stages[name] = time.perf_counter() - start
+            for name, elapsed in stages.items():
+                timings[name].append(elapsed)
+            unused = replay.unused()
+            if unused:
+                print(f"⚠️ Ciclo {replay.cycle}: entradas grabadas sin usar {unused}")
+            detail = ', '.join(f"{name} {elapsed * 1000:.1f} ms" for name, elapsed in stages.items())
+            print(f"   Ciclo {replay.cycle}: {metrics.get('total_connections', 0)} conexiones, "
+                  f"{metrics.get('total_domains', 0)} dominios - {detail}")
+            if out:
+                out.write(json.dumps(metrics, sort_keys=True, separators=(',', ':')) + '\n')
+    finally:
+        if out:
+            out.close()
+
+    if timings:
+        print(f"⏱️ {len(timings['recolección'])} ciclos reproducidos (ms por ciclo: mín / mediana / máx)")
+        for name, values in timings.items():
+            print(f"   {name:<14} {min(values) * 1000:8.2f} {statistics.median(values) * 1000:8.2f} "
+                  f"{max(values) * 1000:8.2f}")
+    return timings
@@ -0,0 +1,149 @@
+"""
+ZienShield Agent - Resolución inversa de DNS concurrente
+Resuelve las IPs de un ciclo en paralelo con plazos por consulta y por ciclo
+"""
+
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+
+def gethostbyaddr_lookup(ip):
+    """Consulta PTR bloqueante del sistema"""
+    return socket.gethostbyaddr(ip)[0]
+
+
+class ReverseResolver:
+    """Pool acotado de resolución inversa que nunca bloquea el ciclo más allá de su plazo
+
+    cache debe ofrecer la interfaz de zienshield_agent.cache.TTLCache.
+    """
+
+    def __init__(self, cache, transform=None, lookup=None, max_workers=8,
+                 lookup_timeout=2.0, cycle_timeout=5.0, max_pending=1024):
+        self.cache = cache
+        self.transform = transform or (lambda hostname: hostname)
+        self.lookup = lookup or gethostbyaddr_lookup
+        self.max_workers = max_workers
+        self.lookup_timeout = lookup_timeout
+        self.cycle_timeout = cycle_timeout
+        self.max_pending = max_pending
+
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.pending = {}
+        self.started = {}
+        self.workers = []
+        self.stats = {
+            'resolved': 0,
+            'failed': 0,
+            'deadline_misses': 0,
+            'skipped': 0
+        }
+
+    def _ensure_workers(self):
+        # Hilos daemon: una consulta colgada nunca retrasa la salida del agente
+        while len(self.workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"zienshield-rdns-{len(self.workers)}",
+                daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def _worker_loop(self):
+        while True:
+            ip, future = self.requests.get()
+            self.started[ip] = time.monotonic()
+            try:
+                value = self.transform(self.lookup(ip))
+                key = 'resolved'
+            except Exception:
+                # Sin PTR o error de resolución: se reporta la IP tal cual
+                value = ip
+                key = 'failed'
+
+            # Los fallos se cachean con el TTL negativo (más corto)
+            self.cache.set(ip, value, negative=(key == 'failed'))
+            with self.lock:
+                self.stats[key] += 1
+                self.pending.pop(ip, None)
+                self.started.pop(ip, None)
+            future.set_result(value)
+
+    def submit(self, ip):
+        """Encolar una IP sin esperar; devuelve el Future o None si ya está en caché"""
+        with self.lock:
+            future = self.pending.get(ip)
+            if future is not None:
+                return future
+            if ip in self.cache:
+                return None
+            if len(self.pending) >= self.max_pending:
+                self.stats['skipped'] += 1
+                return None
+
+            self._ensure_workers()
+            future = Future()
+            self.pending[ip] = future
+            self.requests.put((ip, future))
+            return future
+
+    def resolve_many(self, ips):
+        """Resolver un conjunto de IPs respetando los plazos; las pendientes se devuelven en bruto"""
+        results = {}
+        futures = {}
+        cycle_deadline = time.monotonic() + self.cycle_timeout
+
+        for ip in set(ips):
+            cached = self.cache.get(ip)
+            if cached is not None:
+                results[ip] = cached
+                continue
+            future = self.submit(ip)
+            if future is None:
+                results[ip] = self.cache.get(ip) or ip
+            else:
+                futures[future] = ip
+
+        not_done = set(futures)
+        while not_done:
+            now = time.monotonic()
+
+            # Abandonar (sin cancelar) las consultas que superan su plazo individual
+            expiries = [cycle_deadline]
+            for future in list(not_done):
+                started = self.started.get(futures[future])
+                if started is None:
+                    continue
+                if now - started >= self.lookup_timeout:
+                    not_done.discard(future)
+                else:
+                    expiries.append(started + self.lookup_timeout)
+
+            if not not_done or now >= cycle_deadline:
+                break
+
+            done, not_done = wait(not_done, timeout=max(0.0, min(expiries) - now),
+                                  return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+
+        # Las que no llegaron a tiempo se siguen resolviendo en segundo plano
+        for future, ip in futures.items():
+            if ip not in results:
+                if future.done():
+                    results[ip] = future.result()
+                else:
+                    results[ip] = ip
+                    with self.lock:
+                        self.stats['deadline_misses'] += 1
+
+        return results
+
+    def resolve(self, ip):
+        """Resolver una única IP con los mismos plazos"""
+        return self.resolve_many([ip])[ip]
@@ -0,0 +1,222 @@
+"""
+ZienShield Agent - Tiempos por fase del ciclo y métricas propias
+Cronómetro monotónico por fase (enumeración, procesos, DNS, categorización,
+agregación, serialización y cada salida) con histogramas de los últimos N
+ciclos, más CPU y RSS del propio agente, resumidos en el bloque agent_self
+"""
+
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+SELF_VERSION = 1
+
+# Límites superiores de los buckets en ms (el último bucket recoge lo que los supera)
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def windows_working_set():
+    """Working set del propio proceso con GetProcessMemoryInfo (Windows sin psutil)"""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage'
+            )
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32 = ctypes.windll.kernel32
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters),
+                                                     counters.cb):
+        return 0
+    return counters.WorkingSetSize
+
+
+def current_rss():
+    """RSS del propio proceso en bytes (0 si no se puede leer)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if PSUTIL_AVAILABLE:
+        try:
+            return psutil.Process().memory_info().rss
+        except psutil.Error:
+            pass
+    if os.name == 'nt':
+        try:
+            return windows_working_set()
+        except (OSError, AttributeError):
+            pass
+    return 0
+
+
+class RollingHistogram:
+    """Últimas `window` muestras (ms) con percentiles y recuento por bucket"""
+
+    def __init__(self, window=120, buckets=BUCKETS_MS):
+        self.samples = deque(maxlen=window)
+        self.buckets = buckets
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def summary(self):
+        if not self.samples:
+            return {'count': 0}
+        ordered = sorted(self.samples)
+        counts = [0] * (len(self.buckets) + 1)
+        for value in self.samples:
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+
+        def percentile(fraction):
+            # Rango más cercano: sin interpolar, siempre una muestra real
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+        return {
+            'count': len(ordered),
+            'last': round(self.samples[-1], 2),
+            'p50': round(percentile(0.5), 2),
+            'p95': round(percentile(0.95), 2),
+            'max': round(ordered[-1], 2),
+            'counts': counts
+        }
+
+
+class CycleTimer:
+    """Tiempo propio de cada fase del ciclo en curso e histogramas de los últimos ciclos
+
+    Las fases anidadas no se cuentan dos veces: la fase externa solo suma el
+    tiempo que no pasa en las internas. Lo medido fuera del hilo del ciclo (p.ej.
+    el hilo de envío) entra directamente en el histograma de su fase.
+    """
+
+    def __init__(self, window=120, clock=time.perf_counter, cpu_clock=time.process_time):
+        self.window = window
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.histograms = {}
+        self.cpu_histogram = RollingHistogram(window)
+        self.current = None
+        self.cycle_thread = None
+        self.cycle_start = None
+        self.cycle_cpu_start = None
+        self.last_cycle = {}
+        self.cycles = 0
+        self.started = clock()
+        self.cpu_started = cpu_clock()
+        # Referencia del bloque anterior: la CPU se reporta desde entonces
+        self.last_snapshot = (self.started, self.cpu_started)
+
+    def _observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = RollingHistogram(self.window)
+        histogram.add(seconds * 1000)
+
+    def add(self, name, seconds):
+        """Sumar tiempo a una fase (al ciclo en curso si se mide desde su hilo)"""
+        with self.lock:
+            if self.current is not None and threading.get_ident() == self.cycle_thread:
+                self.current[name] = self.current.get(name, 0.0) + seconds
+            else:
+                self._observe(name, seconds)
+
+    @contextmanager
+    def phase(self, name):
+        """Medir un bloque como parte de la fase name"""
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        stack.append(0.0)
+        start = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.add(name, elapsed - nested)
+
+    def start_cycle(self):
+        with self.lock:
+            self.current = {}
+            self.cycle_thread = threading.get_ident()
+            self.cycle_start = self.clock()
+            self.cycle_cpu_start = self.cpu_clock()
+
+    def end_cycle(self):
+        """Cerrar el ciclo: cada fase (y el total) entra en su histograma"""
+        with self.lock:
+            if self.current is None:
+                return {}
+            self.current['cycle'] = self.clock() - self.cycle_start
+            for name, seconds in self.current.items():
+                self._observe(name, seconds)
+            self.cpu_histogram.add((self.cpu_clock() - self.cycle_cpu_start) * 1000)
+            self.last_cycle = {name: round(seconds * 1000, 2) for name, seconds in self.current.items()}
+            self.current = None
+            self.cycles += 1
+            return self.last_cycle
+
+    def describe_last_cycle(self):
+        """Texto corto con los ms por fase del último ciclo, para la consola"""
+        phases = ', '.join(f"{name} {ms:.1f}" for name, ms in self.last_cycle.items() if name != 'cycle')
+        return f"{self.last_cycle.get('cycle', 0.0):.1f} ms ({phases})"
+
+    def snapshot(self):
+        """Bloque agent_self: histogramas de los ciclos completos y consumo del agente"""
+        with self.lock:
+            now, cpu_now = self.clock(), self.cpu_clock()
+            wall = now - self.last_snapshot[0]
+            cpu_used = cpu_now - self.last_snapshot[1]
+            self.last_snapshot = (now, cpu_now)
+            return {
+                'version': SELF_VERSION,
+                'window': self.window,
+                'cycles': self.cycles,
+                'buckets_ms': list(BUCKETS_MS),
+                'last_cycle_ms': dict(self.last_cycle),
+                'phases_ms': {name: histogram.summary() for name, histogram in self.histograms.items()},
+                'cycle_cpu_ms': self.cpu_histogram.summary(),
+                # CPU del agente (todos los hilos) desde el bloque anterior; 100% = un núcleo
+                'cpu_percent': round(cpu_used / wall * 100, 2) if wall > 0 else 0.0,
+                'cpu_time_s': round(cpu_now - self.cpu_started, 3),
+                'rss_mb': round(current_rss() / 1024 / 1024, 2)
+            }
+
+
+def timed_upload(timer, upload_client, send, payload):
+    """send(payload) separando la codificación del cuerpo (serialization) del envío (sink_backend)"""
+    encoder = upload_client.encoder
+    encoded_before = encoder.stats['encode_time'] if encoder else 0.0
+    start = timer.clock()
+    try:
+        return send(payload)
+    finally:
+        elapsed = timer.clock() - start
+        encoded = encoder.stats['encode_time'] - encoded_before if encoder else 0.0
+        timer.add('serialization', encoded)
+        timer.add('sink_backend', elapsed - encoded)
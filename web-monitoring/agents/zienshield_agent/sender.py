@@ -0,0 +1,279 @@
+"""
+ZienShield Agent - Envío en segundo plano
+Cola acotada entre la recolección y el envío al backend, con política de
+desbordamiento, lotes multiciclo adaptativos, spool en disco con reenvío
+y contadores de profundidad y latencia
+"""
+
+import threading
+import time
+from collections import deque
+
+from .spool import Spool
+
+OVERFLOW_POLICIES = ('drop-oldest', 'coalesce', 'spill')
+
+
+def keep_newest(older, newer):
+    """Fusión por defecto: el ciclo más reciente sustituye al encolado"""
+    return newer
+
+
+class BackgroundSender:
+    """Hilo de envío alimentado por una cola acotada; la recolección nunca espera a la red
+
+    send(payload) devuelve True si el envío tuvo éxito. on_loss(payload) se
+    invoca con cada payload descartado o cuyo envío falló (p.ej. para forzar
+    un keyframe).
+
+    Con spool_dir, lo que no se puede enviar (fallo o cola llena con la
+    política 'spill') se guarda en un Spool en disco y se reenvía en orden
+    cuando el backend vuelve, a un máximo de replay_rate ciclos por segundo
+    y con espera exponencial entre reintentos fallidos.
+
+    Con send_batch(payloads) los ciclos se agrupan: el lote sale al reunir
+    batch_size ciclos o cuando el más antiguo supera batch_interval segundos.
+    Si la cola ha crecido (backend lento o caído) el lote se amplía hasta
+    max_batch para vaciarla con menos peticiones. Con solo batch_interval
+    (batch_size 1 o None) el tamaño no dispara el envío: el lote sale al
+    vencer el intervalo, al reunir max_batch ciclos (por defecto, los que
+    caben en la cola), con flush() o al detenerse.
+    """
+
+    def __init__(self, send, max_queue=10, overflow='drop-oldest', spool_dir=None,
+                 coalesce=keep_newest, on_loss=None, name='zienshield-sender',
+                 send_batch=None, batch_size=1, batch_interval=0, max_batch=None,
+                 spool_max_bytes=64 * 1024 * 1024, replay_rate=1.0, retry_delay=5.0, max_retry_delay=300.0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de desbordamiento no soportada: {overflow}")
+        if overflow == 'spill' and not spool_dir:
+            raise ValueError("La política 'spill' requiere spool_dir")
+
+        self.send = send
+        self.send_batch = send_batch
+        self.batch_interval = batch_interval
+        if batch_interval and (batch_size or 1) <= 1:
+            # Solo intervalo: un lote de 1 saldría en cada ciclo, el límite de tamaño es max_batch
+            self.max_batch = max(1, max_batch or max_queue)
+            self.batch_size = self.max_batch
+        else:
+            self.batch_size = max(1, batch_size or 1)
+            self.max_batch = max(self.batch_size, max_batch or self.batch_size * 4)
+        # La cola debe poder reunir un lote completo antes de aplicar la política de desbordamiento
+        self.max_queue = max(1, max_queue, self.max_batch if send_batch else 1)
+        self.overflow = overflow
+        self.spool = Spool(spool_dir, max_bytes=spool_max_bytes) if spool_dir else None
+        self.replay_rate = replay_rate
+        self.base_retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.retry_delay = retry_delay
+        # Instante (monotónico) a partir del cual se puede volver a leer del spool
+        self.resume_at = 0.0
+        self.coalesce = coalesce
+        self.on_loss = on_loss
+        self.name = name
+
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.in_flight = 0
+        self.flush_requests = 0
+        self.stopping = False
+        self.counters = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'requests': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'dropped': 0,
+            'coalesced': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'retries': 0,
+            'max_depth': 0,
+            'last_latency': 0.0,
+            'max_latency': 0.0,
+            'total_latency': 0.0,
+            'last_send_time': 0.0
+        }
+        if self.spool is not None and len(self.spool):
+            # Pendientes de una ejecución anterior: empezar a reenviarlos ya
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stopping = False
+            self.thread = threading.Thread(target=self._worker_loop, name=self.name, daemon=True)
+            self.thread.start()
+
+    def put(self, payload):
+        """Encolar un payload sin bloquear, aplicando la política si la cola está llena"""
+        lost = None
+        with self.condition:
+            item = (time.time(), payload)
+            if self.spool is not None and (len(self.spool) or
+                                           (self.overflow == 'spill' and len(self.queue) >= self.max_queue)):
+                # Mientras haya pendientes en disco, lo nuevo va detrás de ellos para conservar
+                # el orden; al desbordar, la cola entera pasa al spool por delante
+                for enqueued_at, queued in list(self.queue) + [item]:
+                    self.spool.append(queued, enqueued_at)
+                    self.counters['spilled'] += 1
+                self.queue.clear()
+                item = None
+            elif len(self.queue) >= self.max_queue:
+                if self.overflow == 'coalesce':
+                    enqueued_at, older = self.queue.pop()
+                    item = (enqueued_at, self.coalesce(older, payload))
+                    self.counters['coalesced'] += 1
+                else:
+                    _, lost = self.queue.popleft()
+                    self.counters['dropped'] += 1
+
+            if item is not None:
+                self.queue.append(item)
+            self.counters['enqueued'] += 1
+            self.counters['max_depth'] = max(self.counters['max_depth'], len(self.queue))
+            self._ensure_thread()
+            self.condition.notify_all()
+
+        if lost is not None and self.on_loss:
+            self.on_loss(lost)
+
+    def _batch_wait(self):
+        """Segundos hasta que el lote esté listo (<= 0: listo; None: esperar a más ciclos)"""
+        if not self.send_batch or self.stopping or self.flush_requests or len(self.queue) >= self.batch_size:
+            return 0
+        if not self.batch_interval:
+            return None
+        return self.queue[0][0] + self.batch_interval - time.time()
+
+    def _next_items(self):
+        """Siguiente envío: (elementos, posición en el spool o None); (None, None) al detenerse"""
+        with self.condition:
+            while True:
+                # La cola en memoria siempre es anterior a lo que hay en el spool
+                if self.queue:
+                    wait = self._batch_wait()
+                    if wait is not None and wait <= 0:
+                        # Con la cola por encima del objetivo (contrapresión) el lote crece hasta max_batch
+                        count = min(len(self.queue), self.max_batch) if self.send_batch else 1
+                        self.in_flight = count
+                        return [self.queue.popleft() for _ in range(count)], None
+                elif self.spool is not None and len(self.spool):
+                    if self.stopping:
+                        # Lo pendiente ya está en disco: se reenviará en el próximo arranque
+                        return None, None
+                    wait = self.resume_at - time.monotonic()
+                    if wait <= 0:
+                        records, position, consumed = self.spool.read(self.max_batch if self.send_batch else 1)
+                        if not records:
+                            # Solo registros corruptos o caducados: retirarlos y seguir
+                            self.spool.ack(position, consumed)
+                            continue
+                        # Siguen contando en el spool hasta el ack
+                        return records, (position, consumed)
+                elif self.stopping:
+                    return None, None
+                else:
+                    wait = None
+                self.condition.wait(wait)
+
+    def _worker_loop(self):
+        while True:
+            items, replay = self._next_items()
+            if items is None:
+                return
+            payloads = [payload for _, payload in items]
+
+            start = time.time()
+            try:
+                if self.send_batch:
+                    success = bool(self.send_batch(payloads))
+                else:
+                    success = bool(self.send(payloads[0]))
+            except Exception:
+                success = False
+            finished = time.time()
+
+            lost = []
+            with self.condition:
+                self.in_flight = 0
+                self.counters['sent' if success else 'failed'] += len(items)
+                self.counters['requests'] += 1
+                self.counters['last_batch_size'] = len(items)
+                self.counters['max_batch_size'] = max(self.counters['max_batch_size'], len(items))
+                # Latencia del ciclo más antiguo del lote
+                latency = finished - items[0][0]
+                self.counters['last_latency'] = latency
+                self.counters['max_latency'] = max(self.counters['max_latency'], latency)
+                self.counters['total_latency'] += sum(finished - enqueued_at for enqueued_at, _ in items)
+                self.counters['last_send_time'] = finished - start
+
+                if success:
+                    self.retry_delay = self.base_retry_delay
+                    if replay is not None:
+                        self.spool.ack(*replay)
+                        self.counters['replayed'] += len(items)
+                        # Reenvío a ritmo limitado para no saturar un backend que se recupera
+                        self.resume_at = time.monotonic() + len(items) / self.replay_rate
+                elif self.spool is not None:
+                    if replay is None:
+                        # Conservar el orden: lo fallido y lo que esperaba en cola pasan al spool
+                        for enqueued_at, payload in list(items) + list(self.queue):
+                            self.spool.append(payload, enqueued_at)
+                            self.counters['spilled'] += 1
+                        self.queue.clear()
+                    self.counters['retries'] += 1
+                    self.resume_at = time.monotonic() + self.retry_delay
+                    self.retry_delay = min(self.retry_delay * 2, self.max_retry_delay)
+                else:
+                    lost = payloads
+                self.condition.notify_all()
+
+            if self.on_loss:
+                for payload in lost:
+                    self.on_loss(payload)
+
+    def depth(self):
+        """Payloads pendientes (en memoria y en el spool)"""
+        return len(self.queue) + len(self.spool or ()) + self.in_flight
+
+    def flush(self, timeout=30):
+        """Esperar a que la cola se vacíe; devuelve False si vence el plazo"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            # Los lotes incompletos salen sin esperar a batch_size ni a batch_interval
+            self.flush_requests += 1
+            self.condition.notify_all()
+            try:
+                while self.queue or self.in_flight or len(self.spool or ()):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self.thread is None or not self.thread.is_alive():
+                        return False
+                    self.condition.wait(remaining)
+            finally:
+                self.flush_requests -= 1
+        return True
+
+    def close(self, timeout=30):
+        """Vaciar la cola (con plazo) y detener el hilo"""
+        drained = self.flush(timeout)
+        with self.condition:
+            self.stopping = True
+            if self.spool is not None:
+                self.spool.sync()
+            self.condition.notify_all()
+        return drained
+
+    def stats(self):
+        """Contadores de cola y latencia (encolado -> enviado)"""
+        with self.condition:
+            counters = dict(self.counters)
+            counters['depth'] = len(self.queue) + self.in_flight
+            counters['spill_depth'] = len(self.spool or ())
+            if self.spool is not None:
+                counters['spool'] = self.spool.stats()
+            delivered = counters['sent'] + counters['failed']
+            counters['avg_latency'] = counters['total_latency'] / delivered if delivered else 0.0
+            return counters
@@ -0,0 +1,240 @@
+"""
+ZienShield Agent - Payload compacto v2 para /agent-metrics
+Sin agregados derivables, datos estáticos del host una vez por sesión y
+cadenas (dominios, procesos, categorías) codificadas con un diccionario de
+sesión; expansor de referencia al formato v1
+"""
+
+import copy
+import os
+
+from zienshield_agent.payload import get_top_domains, get_category_summary
+
+SLIM_FORMAT = 'zienshield-slim'
+SLIM_VERSION = 2
+
+# Datos del host que no cambian entre ciclos: solo viajan al empezar la sesión o si cambian
+HOST_FIELDS = ('hostname', 'username', 'os_info', 'monitor_version')
+
+# Agregados que el receptor recalcula; solo se omiten si el recálculo da exactamente lo mismo
+DERIVED_FIELDS = ('top_domains', 'categories_summary', 'category_summary', 'total_domains',
+                  'total_bytes_sent', 'total_bytes_recv', 'active_browsers', 'browser_types')
+
+# Columnas de domain_stats/browser_processes cuyas cadenas viajan como índices del diccionario
+STRING_COLUMNS = ('category', 'browser', 'name', 'cmdline')
+STRING_LIST_COLUMNS = ('processes',)
+STRING_KEY_COLUMNS = ('bytes_by_process',)
+
+
+class SlimSessionError(ValueError):
+    """Payload de una sesión o secuencia que el expansor no ha seguido desde el inicio"""
+
+
+def derived_value(field, domain_stats, browser_processes, top_domains_limit=10):
+    """Valor v1 de un agregado derivable a partir de domain_stats y browser_processes"""
+    if field == 'top_domains':
+        return get_top_domains(domain_stats, top_domains_limit)
+    if field in ('categories_summary', 'category_summary'):
+        return get_category_summary(domain_stats)
+    if field == 'total_domains':
+        return len(domain_stats)
+    if field in ('total_bytes_sent', 'total_bytes_recv'):
+        key = field[len('total_'):]
+        return sum(stats.get(key, 0) for stats in domain_stats.values())
+    if field == 'active_browsers':
+        # Windows agrega los procesos por navegador en process_count
+        if browser_processes and all('process_count' in browser for browser in browser_processes):
+            return sum(browser['process_count'] for browser in browser_processes)
+        return len(browser_processes)
+    if field == 'browser_types':
+        return len(browser_processes)
+    raise KeyError(field)
+
+
+def is_index(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def encode_value(key, value, intern):
+    if key in STRING_COLUMNS and isinstance(value, str):
+        return intern(value)
+    if key in STRING_LIST_COLUMNS and isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return [intern(v) for v in value]
+    if key in STRING_KEY_COLUMNS and isinstance(value, dict):
+        return [[intern(k), v] for k, v in value.items()]
+    return value
+
+
+def decode_value(key, value, strings):
+    if key in STRING_COLUMNS and is_index(value):
+        return strings[value]
+    if key in STRING_LIST_COLUMNS and isinstance(value, list) and all(is_index(v) for v in value):
+        return [strings[v] for v in value]
+    if key in STRING_KEY_COLUMNS and isinstance(value, list):
+        return {strings[k]: v for k, v in value}
+    return value
+
+
+def encode_rows(rows, intern):
+    """Lista de dicts en columnas; 'missing' indica las filas que no tienen un campo"""
+    columns = {}
+    missing = {}
+    for index, row in enumerate(rows):
+        for key in columns:
+            if key not in row:
+                columns[key].append(None)
+                missing.setdefault(key, []).append(index)
+        for key, value in row.items():
+            if key not in columns:
+                columns[key] = [None] * index
+                if index:
+                    missing[key] = list(range(index))
+            columns[key].append(encode_value(key, value, intern))
+    encoded = {'count': len(rows), 'columns': columns}
+    if missing:
+        encoded['missing'] = missing
+    return encoded
+
+
+def decode_rows(encoded, strings):
+    missing = {key: set(indexes) for key, indexes in encoded.get('missing', {}).items()}
+    rows = []
+    for index in range(encoded['count']):
+        rows.append({
+            key: decode_value(key, column[index], strings)
+            for key, column in encoded['columns'].items()
+            if index not in missing.get(key, ())
+        })
+    return rows
+
+
+class SlimEncoder:
+    """Codificador de métricas v1 en payloads v2 dentro de una sesión
+
+    El diccionario de cadenas crece con la sesión: cada payload añade solo
+    las cadenas nuevas. Tras un envío fallido, reset() obliga a empezar una
+    sesión nueva para que el receptor no dependa de un payload perdido.
+    """
+
+    def __init__(self, top_domains_limit=10, host_fields=HOST_FIELDS, max_strings=16384):
+        self.top_domains_limit = top_domains_limit
+        self.host_fields = host_fields
+        self.max_strings = max_strings
+        self.session = None
+        self.sequence = 0
+        self.strings = []
+        self.index = {}
+        self.host = None
+
+    def reset(self):
+        """Empezar una sesión nueva en el próximo ciclo (host y diccionario completos)"""
+        self.session = None
+
+    def _start_session(self):
+        self.session = os.urandom(4).hex()
+        self.sequence = 0
+        self.strings = []
+        self.index = {}
+        self.host = None
+
+    def encode(self, metrics):
+        """Codificar un ciclo de métricas v1 como payload v2"""
+        if self.session is None or len(self.strings) >= self.max_strings:
+            # Diccionario lleno: sesión nueva para que no crezca sin límite
+            self._start_session()
+        self.sequence += 1
+        base = len(self.strings)
+
+        def intern(value):
+            index = self.index.get(value)
+            if index is None:
+                index = self.index[value] = len(self.strings)
+                self.strings.append(value)
+            return index
+
+        domain_stats = metrics.get('domain_stats', {})
+        browser_processes = metrics.get('browser_processes', [])
+        host = {field: metrics[field] for field in self.host_fields if field in metrics}
+        derived = [
+            field for field in DERIVED_FIELDS
+            if field in metrics and
+            metrics[field] == derived_value(field, domain_stats, browser_processes, self.top_domains_limit)
+        ]
+        skipped = set(host) | set(derived) | {'timestamp', 'agent_id', 'domain_stats', 'browser_processes'}
+
+        payload = {
+            'format': SLIM_FORMAT,
+            'version': SLIM_VERSION,
+            'session': self.session,
+            'sequence': self.sequence,
+            'agent_id': metrics.get('agent_id'),
+            'timestamp': metrics.get('timestamp'),
+            'fields': {key: value for key, value in metrics.items() if key not in skipped},
+            'derived': derived
+        }
+        if 'top_domains' in derived:
+            payload['top_domains_limit'] = self.top_domains_limit
+        if host != self.host:
+            payload['host'] = host
+            self.host = copy.deepcopy(host)
+        if 'domain_stats' in metrics:
+            payload['domains'] = dict(
+                encode_rows(list(domain_stats.values()), intern),
+                keys=[intern(domain) for domain in domain_stats]
+            )
+        if 'browser_processes' in metrics:
+            payload['browsers'] = encode_rows(browser_processes, intern)
+        payload['strings'] = {'base': base, 'add': self.strings[base:]}
+        return payload
+
+
+class SlimExpander:
+    """Expansor de referencia: reconstruye las métricas v1 a partir de payloads v2"""
+
+    def __init__(self):
+        self.session = None
+        self.sequence = None
+        self.strings = []
+        self.host = {}
+
+    def expand(self, payload):
+        """Aplicar un payload v2 y devolver las métricas en formato v1"""
+        if payload.get('format') != SLIM_FORMAT:
+            raise ValueError(f"Formato de payload no soportado: {payload.get('format')}")
+        if payload.get('version') != SLIM_VERSION:
+            raise ValueError(f"Versión de payload compacto no soportada: {payload.get('version')}")
+
+        strings = payload['strings']
+        if payload['session'] != self.session:
+            if payload['sequence'] != 1 or strings['base'] != 0:
+                raise SlimSessionError(
+                    f"Sesión {payload['session']} recibida a partir de la secuencia {payload['sequence']}"
+                )
+            self.session = payload['session']
+            self.strings = []
+            self.host = {}
+        elif payload['sequence'] != self.sequence + 1 or strings['base'] != len(self.strings):
+            raise SlimSessionError(
+                f"Payload {payload['sequence']} de la sesión {self.session} tras la secuencia {self.sequence}"
+            )
+        self.strings.extend(strings['add'])
+        self.sequence = payload['sequence']
+        if 'host' in payload:
+            self.host = dict(payload['host'])
+
+        metrics = {'timestamp': payload['timestamp'], 'agent_id': payload['agent_id']}
+        metrics.update(self.host)
+        metrics.update(payload['fields'])
+        domain_stats = {}
+        browser_processes = []
+        if 'domains' in payload:
+            keys = [self.strings[index] for index in payload['domains']['keys']]
+            domain_stats = dict(zip(keys, decode_rows(payload['domains'], self.strings)))
+            metrics['domain_stats'] = domain_stats
+        if 'browsers' in payload:
+            browser_processes = decode_rows(payload['browsers'], self.strings)
+            metrics['browser_processes'] = browser_processes
+        limit = payload.get('top_domains_limit', 10)
+        for field in payload['derived']:
+            metrics[field] = derived_value(field, domain_stats, browser_processes, limit)
+        return metrics
@@ -0,0 +1,175 @@
+"""
+ZienShield Agent - Colector netlink sock_diag (INET_DIAG)
+Vuelca los sockets TCP establecidos con tcp_info (bytes enviados/recibidos)
+"""
+
+import os
+import socket
+import struct
+from collections import namedtuple
+
+from zienshield_agent import procnet
+
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 0x2
+NLMSG_DONE = 0x3
+
+INET_DIAG_INFO = 2
+TCP_ESTABLISHED = 1
+
+NLMSG_HEADER = struct.Struct('=IHHII')
+INET_DIAG_REQ_V2 = struct.Struct('=BBBxI48s')
+INET_DIAG_MSG_HEAD = struct.Struct('=BBBB')
+INET_DIAG_MSG_PORTS = struct.Struct('>HH')
+INET_DIAG_MSG_TAIL = struct.Struct('=IIIII')
+INET_DIAG_MSG_SIZE = 72
+RTATTR_HEADER = struct.Struct('=HH')
+
+# Desplazamientos de tcpi_bytes_acked / tcpi_bytes_received en struct tcp_info
+TCPI_BYTES = struct.Struct('=QQ')
+TCPI_BYTES_OFFSET = 120
+
+RECV_BUFFER = 1 << 20
+
+# Fila de la tabla de sockets con contadores de bytes acumulados
+DiagEntry = namedtuple('DiagEntry', [
+    'family', 'local_ip', 'local_port', 'remote_ip', 'remote_port', 'uid', 'inode',
+    'cookie', 'bytes_acked', 'bytes_received'
+])
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def is_available():
+    """Comprobar si el kernel acepta sockets NETLINK_SOCK_DIAG"""
+    if not hasattr(socket, 'AF_NETLINK'):
+        return False
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG)
+    except OSError:
+        return False
+    sock.close()
+    return True
+
+
+def build_request(family, sequence):
+    """Construir un mensaje SOCK_DIAG_BY_FAMILY de volcado para una familia"""
+    payload = INET_DIAG_REQ_V2.pack(
+        family,
+        socket.IPPROTO_TCP,
+        1 << (INET_DIAG_INFO - 1),
+        1 << TCP_ESTABLISHED,
+        b'\0' * 48
+    )
+    header = NLMSG_HEADER.pack(
+        NLMSG_HEADER.size + len(payload),
+        SOCK_DIAG_BY_FAMILY,
+        NLM_F_REQUEST | NLM_F_DUMP,
+        sequence,
+        0
+    )
+    return header + payload
+
+
+def parse_diag_message(data, offset, length):
+    """Decodificar un inet_diag_msg y su atributo INET_DIAG_INFO"""
+    family, state, _timer, _retrans = INET_DIAG_MSG_HEAD.unpack_from(data, offset)
+    sport, dport = INET_DIAG_MSG_PORTS.unpack_from(data, offset + 4)
+    address_size = 4 if family == socket.AF_INET else 16
+    src = socket.inet_ntop(family, data[offset + 8:offset + 8 + address_size])
+    dst = socket.inet_ntop(family, data[offset + 24:offset + 24 + address_size])
+    cookie = data[offset + 44:offset + 52]
+    _expires, _rqueue, _wqueue, uid, inode = INET_DIAG_MSG_TAIL.unpack_from(data, offset + 52)
+
+    bytes_acked = bytes_received = 0
+    attr_offset = offset + INET_DIAG_MSG_SIZE
+    end = offset + length
+    while attr_offset + RTATTR_HEADER.size <= end:
+        attr_length, attr_type = RTATTR_HEADER.unpack_from(data, attr_offset)
+        if attr_length < RTATTR_HEADER.size:
+            break
+        payload_length = attr_length - RTATTR_HEADER.size
+        if attr_type == INET_DIAG_INFO and payload_length >= TCPI_BYTES_OFFSET + TCPI_BYTES.size:
+            bytes_acked, bytes_received = TCPI_BYTES.unpack_from(
+                data, attr_offset + RTATTR_HEADER.size + TCPI_BYTES_OFFSET
+            )
+        attr_offset += _align(attr_length)
+
+    return DiagEntry(family, src, sport, dst, dport, uid, inode, cookie, bytes_acked, bytes_received)
+
+
+def dump_tcp_sockets(families=(socket.AF_INET, socket.AF_INET6)):
+    """Volcar los sockets TCP establecidos (una petición de volcado por familia)"""
+    entries = []
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG)
+    try:
+        for sequence, family in enumerate(families, start=1):
+            sock.send(build_request(family, sequence))
+            done = False
+            while not done:
+                data = sock.recv(RECV_BUFFER)
+                if not data:
+                    break
+                offset = 0
+                while offset + NLMSG_HEADER.size <= len(data):
+                    msg_length, msg_type, _flags, msg_seq, _pid = NLMSG_HEADER.unpack_from(data, offset)
+                    if msg_length < NLMSG_HEADER.size:
+                        done = True
+                        break
+                    if msg_type == NLMSG_DONE:
+                        done = True
+                        break
+                    if msg_type == NLMSG_ERROR:
+                        error = struct.unpack_from('=i', data, offset + NLMSG_HEADER.size)[0]
+                        raise OSError(-error, os.strerror(-error))
+                    if msg_type == SOCK_DIAG_BY_FAMILY and msg_seq == sequence:
+                        entries.append(parse_diag_message(
+                            data, offset + NLMSG_HEADER.size, msg_length - NLMSG_HEADER.size
+                        ))
+                    offset += _align(msg_length)
+    finally:
+        sock.close()
+
+    return entries
+
+
+class SockDiagCollector:
+    """Colector de conexiones con contadores de bytes por socket vía netlink"""
+
+    def __init__(self, proc_root='/proc', process_table=None):
+        self.proc_root = proc_root
+        self.process_table = process_table
+        # Últimos contadores vistos por socket (cookie -> (acked, received))
+        self.byte_counters = {}
+        self.primed = False
+
+    def collect(self):
+        """Obtener conexiones establecidas con los bytes movidos desde el ciclo anterior"""
+        entries = [entry for entry in dump_tcp_sockets() if entry.remote_port]
+        connections = procnet.attach_processes(entries, self.proc_root, self.process_table)
+
+        counters = {}
+        for entry, connection_info in zip(entries, connections):
+            counters[entry.cookie] = (entry.bytes_acked, entry.bytes_received)
+            previous = self.byte_counters.get(entry.cookie)
+            if previous is not None:
+                sent = entry.bytes_acked - previous[0]
+                recv = entry.bytes_received - previous[1]
+            elif self.primed:
+                # Socket abierto desde el ciclo anterior: todo su tráfico es nuevo
+                sent, recv = entry.bytes_acked, entry.bytes_received
+            else:
+                # Primer ciclo: solo establecer la línea base
+                sent = recv = 0
+            connection_info['bytes_sent'] = max(sent, 0)
+            connection_info['bytes_recv'] = max(recv, 0)
+
+        # Los sockets cerrados desaparecen de la tabla de contadores
+        self.byte_counters = counters
+        self.primed = True
+        return connections
@@ -0,0 +1,259 @@
+"""
+ZienShield Agent - Spool en disco para almacenar y reenviar
+Segmentos de solo escritura al final con checksum por registro, fsync por
+lotes, cuota de tamaño/antigüedad y cursor de lectura persistente
+"""
+
+import json
+import os
+import time
+import zlib
+
+SEGMENT_SUFFIX = '.seg'
+CURSOR_FILE = 'cursor.json'
+
+
+def encode_record(written_at, payload):
+    """Registro '<crc32 hex> <json>\\n'; el CRC cubre el JSON completo"""
+    data = json.dumps([written_at, payload], separators=(',', ':')).encode('utf-8')
+    return b'%08x ' % zlib.crc32(data) + data + b'\n'
+
+
+def decode_record(line):
+    """Devolver (written_at, payload) o None si el registro está truncado o corrupto"""
+    if len(line) < 10 or not line.endswith(b'\n') or line[8:9] != b' ':
+        return None
+    data = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(data):
+            return None
+        written_at, payload = json.loads(data)
+    except ValueError:
+        return None
+    return written_at, payload
+
+
+class Spool:
+    """Cola persistente en orden: append() escribe, read()/ack() consumen"""
+
+    def __init__(self, directory, segment_bytes=1024 * 1024, max_bytes=64 * 1024 * 1024,
+                 max_age=7 * 24 * 3600, fsync_interval=2.0, fsync_records=50, clock=time.time):
+        self.directory = directory
+        self.segment_bytes = min(segment_bytes, max(1, max_bytes // 4))
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.fsync_interval = fsync_interval
+        self.fsync_records = fsync_records
+        self.clock = clock
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+        self.sizes = {seq: os.path.getsize(self._segment_path(seq)) for seq in self.segments}
+        self.cursor = self._load_cursor()
+
+        # Siempre un segmento nuevo al arrancar: el último pudo quedar con un registro a medias
+        self.writer = None
+        self.write_seq = (self.segments[-1] if self.segments else 0) + 1
+        self.pending = self._count_pending()
+        # La cuota descartó registros pendientes: una lectura en curso pudo incluirlos
+        self.recount = False
+        self.unsynced = 0
+        self.last_sync = self.clock()
+        self.counters = {
+            'appended': 0,
+            'acked': 0,
+            'corrupted': 0,
+            'expired': 0,
+            'evicted': 0,
+            'fsyncs': 0
+        }
+
+    def _segment_path(self, seq):
+        return os.path.join(self.directory, f"{seq:010d}{SEGMENT_SUFFIX}")
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE), 'r', encoding='utf-8') as f:
+                seq, offset = json.load(f)
+        except (OSError, ValueError, TypeError):
+            return (self.segments[0] if self.segments else 0, 0)
+        if seq not in self.sizes:
+            # Segmento del cursor ya eliminado: continuar por el siguiente que exista
+            later = [s for s in self.segments if s > seq]
+            return (later[0] if later else seq, 0)
+        return (seq, offset)
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(list(self.cursor), f)
+        os.replace(path + '.tmp', path)
+
+    def _count_pending(self):
+        if self.writer is not None:
+            self.writer.flush()
+        seq, offset = self.cursor
+        return sum(self._count_records(s, offset if s == seq else 0) for s in self.segments if s >= seq)
+
+    def _count_records(self, seq, offset=0):
+        try:
+            with open(self._segment_path(seq), 'rb') as f:
+                f.seek(offset)
+                return sum(1 for _ in f)
+        except OSError:
+            return 0
+
+    def _open_writer(self):
+        self.writer = open(self._segment_path(self.write_seq), 'ab')
+        self.segments.append(self.write_seq)
+        self.sizes[self.write_seq] = 0
+
+    def _rotate(self):
+        self.sync()
+        self.writer.close()
+        self.writer = None
+        self.write_seq += 1
+
+    def append(self, payload, written_at=None):
+        """Añadir un registro al final del spool"""
+        record = encode_record(self.clock() if written_at is None else written_at, payload)
+        if self.writer is not None and self.sizes[self.write_seq] and \
+                self.sizes[self.write_seq] + len(record) > self.segment_bytes:
+            self._rotate()
+        if self.writer is None:
+            self._open_writer()
+        self.writer.write(record)
+        self.sizes[self.write_seq] += len(record)
+        self.pending += 1
+        self.unsynced += 1
+        self.counters['appended'] += 1
+        self.maybe_sync()
+        self.enforce_quota()
+
+    def maybe_sync(self):
+        """fsync por lotes: cada fsync_records registros o fsync_interval segundos"""
+        if self.unsynced and (self.unsynced >= self.fsync_records or
+                              self.clock() - self.last_sync >= self.fsync_interval):
+            self.sync()
+
+    def sync(self):
+        if self.writer is not None and self.unsynced:
+            self.writer.flush()
+            os.fsync(self.writer.fileno())
+            self.counters['fsyncs'] += 1
+        self.unsynced = 0
+        self.last_sync = self.clock()
+
+    def read(self, max_records=1):
+        """Leer desde el cursor sin consumir: devuelve (registros, posición, consumidos)
+
+        Los registros corruptos o caducados se saltan, pero cuentan en
+        'consumidos' para que ack() los retire junto con los válidos.
+        """
+        if self.writer is not None:
+            self.writer.flush()
+        records = []
+        consumed = 0
+        seq, offset = self.cursor
+        if seq not in self.sizes:
+            # Segmento del cursor descartado por cuota: seguir por el siguiente
+            later = [s for s in self.segments if s > seq]
+            if later:
+                seq, offset = later[0], 0
+        expire_before = self.clock() - self.max_age
+        while len(records) < max_records and seq in self.sizes:
+            with open(self._segment_path(seq), 'rb') as f:
+                f.seek(offset)
+                while len(records) < max_records:
+                    line = f.readline()
+                    if not line:
+                        break
+                    if not line.endswith(b'\n') and seq == self.write_seq:
+                        break
+                    offset += len(line)
+                    consumed += 1
+                    record = decode_record(line)
+                    if record is None:
+                        self.counters['corrupted'] += 1
+                    elif record[0] < expire_before:
+                        self.counters['expired'] += 1
+                    else:
+                        records.append(record)
+            if len(records) >= max_records or seq == self.write_seq:
+                break
+            # Segmento cerrado leído hasta el final: pasar al siguiente
+            later = [s for s in self.segments if s > seq]
+            if not later:
+                break
+            seq, offset = later[0], 0
+        return records, (seq, offset), consumed
+
+    def ack(self, position, consumed):
+        """Confirmar la lectura hasta position y eliminar los segmentos ya enviados"""
+        if position[0] not in self.sizes:
+            # Segmento descartado por cuota durante el envío: seguir por el siguiente
+            later = [s for s in self.segments if s > position[0]]
+            position = (later[0], 0) if later else position
+        self.cursor = position
+        if self.recount:
+            # Parte de lo consumido ya se descontó al descartarlo: recontar lo que queda
+            self.pending = self._count_pending()
+            self.recount = False
+        else:
+            self.pending = max(0, self.pending - consumed)
+        self.counters['acked'] += consumed
+        for seq in [s for s in self.segments if s < position[0]]:
+            self._remove_segment(seq)
+        self._save_cursor()
+
+    def _remove_segment(self, seq):
+        try:
+            os.remove(self._segment_path(seq))
+        except OSError:
+            pass
+        self.segments.remove(seq)
+        del self.sizes[seq]
+
+    def _evict_oldest(self, reason):
+        seq = self.segments[0]
+        if seq >= self.cursor[0]:
+            lost = self._count_records(seq, self.cursor[1] if seq == self.cursor[0] else 0)
+            self.pending = max(0, self.pending - lost)
+            self.counters[reason] += lost
+            self.recount = True
+        self._remove_segment(seq)
+        if self.cursor[0] <= seq:
+            self.cursor = (self.segments[0], 0)
+            self._save_cursor()
+
+    def enforce_quota(self):
+        """Descartar los segmentos más antiguos por tamaño total o antigüedad"""
+        while len(self.segments) > 1 and sum(self.sizes.values()) > self.max_bytes:
+            self._evict_oldest('evicted')
+        expire_before = self.clock() - self.max_age
+        while len(self.segments) > 1:
+            try:
+                if os.path.getmtime(self._segment_path(self.segments[0])) >= expire_before:
+                    break
+            except OSError:
+                pass
+            self._evict_oldest('expired')
+
+    def __len__(self):
+        return self.pending
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['pending'] = self.pending
+        stats['segments'] = len(self.segments)
+        stats['bytes'] = sum(self.sizes.values())
+        return stats
+
+    def close(self):
+        self.sync()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
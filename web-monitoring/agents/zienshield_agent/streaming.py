@@ -0,0 +1,163 @@
+"""
+ZienShield Agent - Lectura en streaming de comandos del sistema
+Filtra la salida de netstat/ss/ps/tasklist línea a línea con memoria acotada
+"""
+
+import csv
+import os
+import re
+import signal
+import subprocess
+import threading
+
+
+class CommandStream:
+    """Itera la salida de un comando sin acumularla; returncode queda disponible al terminar"""
+
+    def __init__(self, cmd, timeout=None, encoding=None, errors='replace'):
+        self.cmd = cmd
+        self.timeout = timeout
+        self.encoding = encoding
+        self.errors = errors
+        self.returncode = None
+        self.timed_out = False
+
+    def _kill(self, process, timed_out=True):
+        self.timed_out = timed_out
+        try:
+            if os.name == 'posix':
+                # Grupo completo: un hijo que herede stdout mantendría abierta la tubería
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except OSError:
+            pass
+
+    def __iter__(self):
+        process = subprocess.Popen(
+            self.cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            encoding=self.encoding,
+            errors=self.errors,
+            start_new_session=(os.name == 'posix')
+        )
+        timer = None
+        if self.timeout:
+            # Un comando colgado no debe bloquear el ciclo: se mata al vencer el plazo
+            timer = threading.Timer(self.timeout, self._kill, (process,))
+            timer.daemon = True
+            timer.start()
+        try:
+            for line in process.stdout:
+                yield line
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                self._kill(process, self.timed_out)
+            self.returncode = process.wait()
+            if timer:
+                timer.cancel()
+
+
+def stream_records(stream, parser):
+    """Aplicar parser a cada línea y producir solo los registros válidos (no None)"""
+    for line in stream:
+        record = parser(line)
+        if record is not None:
+            yield record
+
+
+def split_host_port(address):
+    """Separar 'ip:puerto', '[ipv6]:puerto' o 'ipv6:puerto'; None si no es válido"""
+    if address.startswith('['):
+        host, _, port = address[1:].partition(']:')
+    else:
+        host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        return None
+    return host, int(port)
+
+
+def build_connection(local_addr, remote_addr, process_info='unknown'):
+    remote = split_host_port(remote_addr)
+    if remote is None:
+        return None
+    local = split_host_port(local_addr) or (local_addr, 0)
+    return {
+        'local_addr': local_addr,
+        'local_ip': local[0],
+        'local_port': local[1],
+        'remote_ip': remote[0],
+        'remote_port': remote[1],
+        'process_info': process_info
+    }
+
+
+def parse_ss_line(line):
+    """Línea de `ss -tnp`: State Recv-Q Send-Q Local Peer [Process]"""
+    if not line.startswith('ESTAB'):
+        return None
+    parts = line.split()
+    if len(parts) < 5:
+        return None
+    return build_connection(parts[3], parts[4], parts[5] if len(parts) > 5 else 'unknown')
+
+
+def parse_netstat_line(line):
+    """Línea de `netstat -tnp` (Linux): Proto Recv-Q Send-Q Local Foreign State [PID/Programa]"""
+    if 'ESTABLISHED' not in line:
+        return None
+    parts = line.split()
+    if len(parts) < 6 or parts[5] != 'ESTABLISHED':
+        return None
+    return build_connection(parts[3], parts[4], parts[6] if len(parts) > 6 else 'unknown')
+
+
+def parse_windows_netstat_line(line):
+    """Línea de `netstat -an` (Windows): Proto Local Remota Estado"""
+    if 'ESTABLISHED' not in line:
+        return None
+    parts = line.split()
+    if len(parts) < 4 or parts[0] != 'TCP' or parts[3] != 'ESTABLISHED':
+        return None
+    return build_connection(parts[1], parts[2])
+
+
+def parse_ps_aux_line(line):
+    """Línea de `ps aux`: USER PID %CPU %MEM VSZ RSS TTY STAT START TIME COMMAND"""
+    parts = line.rstrip('\n').split(None, 10)
+    if len(parts) < 11:
+        return None
+    try:
+        return {
+            'user': parts[0],
+            'pid': int(parts[1]),
+            'cpu_percent': float(parts[2]),
+            'memory_percent': float(parts[3]),
+            'command': parts[10]
+        }
+    except ValueError:
+        # Cabecera u otra línea no numérica
+        return None
+
+
+def parse_tasklist_csv_line(line):
+    """Línea de `tasklist /FO CSV`: "Nombre","PID","Sesión","Núm. sesión","Memoria" """
+    if not line.strip():
+        return None
+    try:
+        row = next(csv.reader([line]))
+    except (csv.Error, StopIteration):
+        return None
+    if len(row) < 5 or not row[1].isdigit():
+        # Cabecera (localizada según el idioma de Windows)
+        return None
+    # Memoria tipo "1,234 K" o "1.234 K" según la configuración regional
+    memory_digits = re.sub(r'\D', '', row[4])
+    return {
+        'name': row[0],
+        'pid': int(row[1]),
+        'memory_kb': int(memory_digits) if memory_digits else 0
+    }
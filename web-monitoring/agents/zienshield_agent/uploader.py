@@ -0,0 +1,118 @@
+"""
+ZienShield Agent - Cliente HTTP persistente para el envío de métricas
+Sesión requests con keep-alive y pool acotado, compartida por las variantes del agente
+"""
+
+import json
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .encoding import PayloadEncoder, REJECTED_STATUS
+
+
+class UploadClient:
+    """Cliente de subida con conexiones reutilizadas entre ciclos y métricas de reutilización"""
+
+    def __init__(self, base_url, timeout=10, user_agent='ZienShield-Agent/1.0',
+                 pool_connections=1, pool_maxsize=2, encoding=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        # Un único host de destino y un hilo de envío: un pool pequeño basta
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.session.headers.update({
+            'User-Agent': user_agent,
+            'Connection': 'keep-alive'
+        })
+        # Codificación negociada del payload (None: JSON plano sin negociar)
+        self.encoder = PayloadEncoder(encoding) if encoding else None
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'connections_opened': 0,
+            'connections_reused': 0,
+            'total_time': 0.0,
+            'last_time': 0.0
+        }
+
+    def url_for(self, path):
+        return path if path.startswith(('http://', 'https://')) else f"{self.base_url}{path}"
+
+    def _opened_connections(self):
+        # Conexiones abiertas en total por los pools de urllib3 de este adaptador
+        try:
+            pools = self.adapter.poolmanager.pools
+            return sum(pools[key].num_connections for key in pools.keys())
+        except Exception:
+            return None
+
+    def post(self, path, data, headers=None):
+        """POST de un cuerpo ya codificado; las excepciones de requests se propagan"""
+        url = self.url_for(path)
+        opened_before = self._opened_connections()
+        start = time.perf_counter()
+        try:
+            response = self.session.post(url, data=data, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            self.stats['errors'] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats['requests'] += 1
+            self.stats['total_time'] += elapsed
+            self.stats['last_time'] = elapsed
+
+        opened_after = self._opened_connections()
+        if opened_before is not None and opened_after is not None:
+            opened = opened_after - opened_before
+            self.stats['connections_opened'] += opened
+            if not opened:
+                self.stats['connections_reused'] += 1
+        return response
+
+    def post_json(self, path, payload, headers=None):
+        """POST de un objeto como JSON compacto"""
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        all_headers = {'Content-Type': 'application/json'}
+        all_headers.update(headers or {})
+        return self.post(path, body, all_headers)
+
+    def post_payload(self, path, payload, headers=None):
+        """POST con la codificación negociada; si el servidor la rechaza se reintenta con la siguiente"""
+        if self.encoder is None:
+            return self.post_json(path, payload, headers)
+        rejected = []
+        for encoding in self.encoder.candidates():
+            body, all_headers = self.encoder.encode(payload, encoding)
+            all_headers.update(headers or {})
+            response = self.post(path, body, all_headers)
+            if response.status_code in REJECTED_STATUS and encoding != 'json':
+                rejected.append(encoding)
+                continue
+            # Solo se descarta una codificación si otra sí fue aceptada:
+            # un 400 por payload inválido no debe degradar la negociación
+            if response.ok:
+                for name in rejected:
+                    self.encoder.reject(name)
+            return response
+        return response
+
+    def get(self, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(self.url_for(path), **kwargs)
+
+    def connection_stats(self):
+        """Contadores de peticiones y reutilización de conexiones"""
+        stats = dict(self.stats)
+        stats['reuse_ratio'] = stats['connections_reused'] / stats['requests'] if stats['requests'] else 0.0
+        if self.encoder is not None:
+            stats['encoding'] = self.encoder.current
+            stats['encoded_bytes'] = self.encoder.stats['bytes']
+        return stats
+
+    def close(self):
+        self.session.close()